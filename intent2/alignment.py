@@ -2,10 +2,13 @@
 Module to hold all the logic for heuristic alignment
 """
 import os
+from collections import namedtuple, OrderedDict
+from itertools import islice
 
 from intent2.model import Instance, Word
-from intent2.processing import process_trans_if_needed, load_spacy
-from typing import List, Tuple
+from intent2.processing import process_trans_if_needed, load_spacy, assign_trans_vectors, PROFILE_LEMMA, PROFILE_PARSE
+from intent2.vectors import VectorTable, VECTORS
+from typing import List, Tuple, Iterable, Union
 from spacy.tokens import Token, Doc
 import yaml
 from yaml.loader import SafeLoader
@@ -60,38 +63,107 @@ def gloss_to_morph_align(inst: Instance):
 # -------------------------------------------
 
 
-def find_matches(trans_w: Word, gloss_parts: List[Tuple[float, Token]], match_func):
+# Alignments are pairs of a translation word index, and either a lang/gloss word
+# index or a gloss subword's (word index, subword index) address.
+GlossIndex = Union[int, Tuple[int, int]]
+
+# The analysis of one period-or-slash-delineated portion of a gloss.
+# "lower" and "lemma" are both lowercased, for comparison.
+GlossPart = namedtuple('GlossPart', ['text', 'lower', 'lemma'])
+
+class GlossPartTable(dict):
+    """
+    A table mapping the strings of gloss parts to their
+    analyses, so that gloss parts that repeat across instances
+    (e.g. "1SG", "PST", "go") are only analyzed once.
+
+    If the table is given a maximum size, the parts that have gone
+    the longest without being asked for are dropped once it is full.
+    """
+    def __init__(self, max_entries: int = None):
+        super().__init__()
+        self.max_entries = max_entries
+
+    def add_strings(self, strings: Iterable[str], spacy_profile=PROFILE_LEMMA):
+        """
+        Analyze any of the given strings not already in the table,
+        lemmatizing them together in a single batch.
+        """
+        strings = list(OrderedDict.fromkeys(strings))
+        new_strings = [s for s in strings if s not in self]
+
+        # Keep the strings asked for as the most recently used.
+        if self.max_entries is not None:
+            for s in strings:
+                if s in self:
+                    self[s] = self.pop(s)
+
+        if new_strings:
+            spacy_eng = load_spacy(spacy_profile)
+            for token in Doc(spacy_eng.vocab, words=new_strings): # type: Token
+                self[token.text] = GlossPart(token.text, token.text.lower(), token.lemma_.lower())
+
+        if self.max_entries is not None:
+            # (The strings just asked for are never dropped.)
+            num_to_drop = min(len(self) - self.max_entries, len(self) - len(strings))
+            for s in list(islice(self, max(num_to_drop, 0))):
+                del self[s]
+
+    def add_instances(self, instances: Iterable[Instance], spacy_profile=PROFILE_LEMMA):
+        """
+        Add the gloss parts of every instance in a corpus to the table.
+        """
+        self.add_strings((part
+                          for inst in instances if inst.gloss
+                          for gloss_w in inst.gloss
+                          for index, part in gloss_w.subword_parts),
+                         spacy_profile=spacy_profile)
+
+    @classmethod
+    def from_instances(cls, instances: Iterable[Instance], spacy_profile=PROFILE_LEMMA):
+        """
+        Build the table from the gloss parts of every
+        instance in a corpus.
+
+        :rtype: GlossPartTable
+        """
+        table = cls()
+        table.add_instances(instances, spacy_profile=spacy_profile)
+        return table
+
+
+def find_matches(trans_w: Word, gloss_parts: List[Tuple[Tuple[int, int], GlossPart]], match_func):
     """
     Given a translation word to match, a target phrase on which to iterate, and
     a matching function, return a list of indices that match.
 
-    :rtype: List[Tuple[float, Token]]
+    :rtype: List[Tuple[Tuple[int, int], GlossPart]]
     """
     matches = [gloss_part for gloss_part in gloss_parts if match_func(trans_w, gloss_part)]
     return matches
 
 
-def exact_match(trans_w: Word, gloss_part: Tuple[float, Token]):
-    return trans_w.string.lower() == gloss_part[1].text.lower()
+def exact_match(trans_w: Word, gloss_part: Tuple[Tuple[int, int], GlossPart]):
+    return trans_w.string.lower() == gloss_part[1].lower
 
-def lemma_match(trans_w: Word, gloss_part: Tuple[float, Token]):
+def lemma_match(trans_w: Word, gloss_part: Tuple[Tuple[int, int], GlossPart]):
     """
     See if stemming the gloss portion and the translation word
     results in a match
     """
     assert trans_w.lemma is not None
-    return trans_w.lemma.lower() == gloss_part[1].lemma_.lower()
+    return trans_w.lemma.lower() == gloss_part[1].lemma
 
-def gram_match(trans_w: Word, gloss_part: Tuple[float, Token]):
+def gram_match(trans_w: Word, gloss_part: Tuple[Tuple[int, int], GlossPart]):
     """
     See if the rendering of the translation word might instead be
     compactly represented by inflectional information in the gloss
     line. For instance, "we" might not be expressed explicitly in
     the gloss, but instead implicit as "1pl"
     """
-    return trans_w.string.lower() in gramdict.get(gloss_part[1].text.lower(), [])
+    return trans_w.string.lower() in gramdict.get(gloss_part[1].lower, [])
 
-def substring_match(trans_w: Word, gloss_part: Tuple[float, Token]):
+def substring_match(trans_w: Word, gloss_part: Tuple[Tuple[int, int], GlossPart]):
     """
     Is either one of the translation words an exact substring of
     one of the glosses, or one of the glosses an exact substring
@@ -99,12 +171,16 @@ def substring_match(trans_w: Word, gloss_part: Tuple[float, Token]):
     """
     minimum_length = 3
     trans_str = trans_w.string.lower()
-    gloss_str = gloss_part[1].text.lower()
+    gloss_str = gloss_part[1].lower
 
     return (len(trans_str) >= minimum_length and trans_str in gloss_str or
             len(gloss_str) >= minimum_length and gloss_str in trans_str)
 
-def vector_match(trans_w: Word, gloss_part: Tuple[float, Token]):
+# The cosine similarity at or above which a translation word
+# and a gloss part are taken to match by their vectors.
+VECTOR_MATCH_THRESHOLD = 0.7
+
+class VectorMatcher(object):
     """
     Use spaCy's word embeddings to calculate similarity between
     a translation word and part of a gloss with the idea that this
@@ -112,14 +188,38 @@ def vector_match(trans_w: Word, gloss_part: Tuple[float, Token]):
 
     Note that this risks picking up related, but not synonymous terms,
     like "second :: fifth" or "money :: stocks"
+
+    The similarities between every translation word and gloss part of
+    an instance are computed up front, in a single matrix product over
+    their rows of the vector table.
     """
-    raise Exception('Not fully implemented yet')
-    print(trans_w.string, gloss_part[1].text)
-    print(gloss_part[1].similarity(trans_w.spacy_token))
+    # Named like the other match functions, for logging.
+    __name__ = 'vector_match'
+
+    def __init__(self, inst: Instance, gloss_parts: List[Tuple[Tuple[int, int], GlossPart]],
+                 spacy_profile=PROFILE_PARSE, vectors: VectorTable = None,
+                 threshold: float = VECTOR_MATCH_THRESHOLD):
+        """
+        :param spacy_profile: The spaCy loading profile to take the vectors
+                              from (the one the translation line was processed with).
+        :param vectors: The table to keep the vectors in (the shared
+                        intent2.vectors.VECTORS by default).
+        """
+        vectors = VECTORS if vectors is None else vectors
+        assign_trans_vectors(inst.trans, spacy_profile=spacy_profile, vectors=vectors)
+
+        gloss_strs = list(OrderedDict.fromkeys(gloss_part.lower for index, gloss_part in gloss_parts))
+        gloss_rows = vectors.add_from_vocab(gloss_strs, load_spacy(spacy_profile).vocab)
+        self._columns = {gloss_str: j for j, gloss_str in enumerate(gloss_strs)}
+        self._similarities = vectors.similarities([trans_w.vector_row for trans_w in inst.trans], gloss_rows)
+        self.threshold = threshold
+
+    def __call__(self, trans_w: Word, gloss_part: Tuple[Tuple[int, int], GlossPart]):
+        return self._similarities[trans_w.index, self._columns[gloss_part[1].lower]] >= self.threshold
 
 
 # -------------------------------------------
-heur_map = {'vec':vector_match,
+heur_map = {'vec':VectorMatcher,
             'exact':exact_match,
             'lemma':lemma_match,
             'gram':gram_match,
@@ -130,10 +230,14 @@ with open(os.path.join(os.path.dirname(__file__), 'gram_dict.yml')) as gram_dict
 
 
 
-def heuristic_alignment(inst: Instance, heur_list = None):
+def heuristic_alignment(inst: Instance, heur_list = None, spacy_profile=PROFILE_LEMMA,
+                        gloss_table: GlossPartTable = None):
     """
     Implement the alignment between words
 
+    :param spacy_profile: The spaCy loading profile used to analyze the gloss parts.
+    :param gloss_table: A table of gloss part analyses shared between instances. Any
+                        gloss parts of this instance not yet in the table are added to it.
     :type inst: Instance
     """
     ALIGN_LOG.info('Attempting heuristic alignment for instance "{}"'.format(inst.id))
@@ -156,20 +260,19 @@ def heuristic_alignment(inst: Instance, heur_list = None):
             trans_w.remove_alignment(alignment)
 
     # We don't need to store the sub-sub-word information that we will use to perform
-    # alignment, but we want to get things like the lemmas and vector representations
-    # of the period-separated portions, so let's get those here.
+    # alignment, but we want to get things like the lemmas of the period-separated
+    # portions, so let's look those up in the gloss part table here.
     gloss_parts = []
     for gloss_w in inst.gloss:
         gloss_parts.extend(gloss_w.subword_parts)
 
-    spacy_eng = load_spacy()
-    gloss_part_doc = Doc(spacy_eng.vocab, words=[part[1] for part in gloss_parts])
-    # spacy_eng.tagger(gloss_part_doc)
-    # spacy_eng.parser(gloss_part_doc)
+    if gloss_table is None:
+        gloss_table = GlossPartTable()
+    gloss_table.add_strings([part[1] for part in gloss_parts], spacy_profile=spacy_profile)
 
     # Form the "gloss_parts" list consisting of tuples of subword indices and their analyzed components,
     # so that we can make comparisons yet still retrieve the word and subword for alignment purposes.
-    gloss_parts = list(zip([p[0] for p in gloss_parts], gloss_part_doc)) # type: List[Tuple[float, Token]]
+    gloss_parts = [(index, gloss_table[part]) for index, part in gloss_parts] # type: List[Tuple[Tuple[int, int], GlossPart]]
 
 
     # Let's also define a local function to look for matches between translation words
@@ -178,9 +281,9 @@ def heuristic_alignment(inst: Instance, heur_list = None):
         align_strs = []
         alignments = []
         for trans_w in inst.trans:
-            for gloss_part_index, token in find_matches(trans_w, gloss_parts, match_func):
+            for gloss_part_index, gloss_part in find_matches(trans_w, gloss_parts, match_func):
                 alignments.append((trans_w.index, gloss_part_index))
-                align_strs.append('{0}[{1}]--[{3}]{4}'.format(trans_w.string, trans_w.index, token, gloss_part_index, inst.gloss[gloss_part_index].word))
+                align_strs.append('{0}[{1}]--[{3}]{4}'.format(trans_w.string, trans_w.index, gloss_part.text, gloss_part_index, inst.gloss[gloss_part_index].word))
 
         # Output debug of results of the alignment
         if alignments:
@@ -221,6 +324,10 @@ def heuristic_alignment(inst: Instance, heur_list = None):
         if match_func is None:
             raise Exception('Invalid match method "{}" passed to heuristic alignment.'.format(heur_str))
 
+        # The vector similarities are computed for the whole instance at once.
+        if match_func is VectorMatcher:
+            match_func = VectorMatcher(inst, gloss_parts)
+
         # 1) Obtain the alignments
         new_alignments = alignment_pass(match_func)
 
@@ -244,14 +351,39 @@ def heuristic_alignment(inst: Instance, heur_list = None):
     return existing_alignments
 
 
-def get_alignment_words(alignments: List[Tuple[int, float]]):
+def heuristic_alignment_corpus(corpus: Iterable[Instance], heur_list=None, spacy_profile=PROFILE_LEMMA):
+    """
+    Perform heuristic alignment on every instance in the corpus,
+    analyzing the gloss parts of all the instances up front in
+    a single shared table.
+
+    :return: A list of the alignments for each instance, or None for
+             the instances that could not be aligned.
+    :rtype: List[Set[Tuple[int, GlossIndex]]]
+    """
+    corpus = list(corpus)
+    gloss_table = GlossPartTable.from_instances(corpus, spacy_profile=spacy_profile)
+
+    corpus_alignments = []
+    for inst in corpus:
+        try:
+            corpus_alignments.append(heuristic_alignment(inst, heur_list=heur_list,
+                                                         spacy_profile=spacy_profile,
+                                                         gloss_table=gloss_table))
+        except AlignException as ae:
+            ALIGN_LOG.warning('Alignment failed for instance "{}": {}'.format(inst.id, ae))
+            corpus_alignments.append(None)
+    return corpus_alignments
+
+
+def get_alignment_words(alignments: List[Tuple[int, GlossIndex]]):
     return {word_index for word_index, gloss_index in alignments}
 
-def get_alignment_glosses(alignments: List[Tuple[int, float]]):
+def get_alignment_glosses(alignments: List[Tuple[int, GlossIndex]]):
     return {gloss_index for word_index, gloss_index in alignments}
 
-def remove_conflicting_alignments(existing_alignments: List[Tuple[int, float]],
-                                  new_alignments: List[Tuple[int, float]],
+def remove_conflicting_alignments(existing_alignments: List[Tuple[int, GlossIndex]],
+                                  new_alignments: List[Tuple[int, GlossIndex]],
                                   allow_multiple_alignments=True):
     """
     Remove any newly proposed alignments that overlap with already
@@ -280,7 +412,7 @@ def remove_conflicting_alignments(existing_alignments: List[Tuple[int, float]],
             ALIGN_LOG.debug('Alignment exists for gloss {1}, but word {0} has no other candidates. Alinging ({0},{1}).'.format(
                 word_index, gloss_index))
             align=True
-        elif gloss_index not in aligned_glosses and num_alignments(gloss_index) == 1:
+        elif gloss_index not in aligned_glosses and num_alignments(gloss_index, type='gloss') == 1:
             ALIGN_LOG.debug('Alignment exists for word {0}, but gloss {1} has no other candidates. Aligning ({0},{1})'.format(
                 word_index, gloss_index))
             align=True
@@ -290,7 +422,7 @@ def remove_conflicting_alignments(existing_alignments: List[Tuple[int, float]],
     return returned_alignments
 
 
-def alignments_to_dict(alignments: List[Tuple[int, float]], key_is_gloss=True):
+def alignments_to_dict(alignments: List[Tuple[int, GlossIndex]], key_is_gloss=True):
     """:rtype: dict[list]"""
     ret_alignments = {}
 
@@ -301,14 +433,14 @@ def alignments_to_dict(alignments: List[Tuple[int, float]], key_is_gloss=True):
         ret_alignments[aligned_index] = sorted([a[key_index] for a in alignments if a[compare_index] == aligned_index])
     return ret_alignments
 
-def handle_multiple_alignments(alignments: List[Tuple[int, float]]):
+def handle_multiple_alignments(alignments: List[Tuple[int, GlossIndex]]):
     """
     Check for multiple alignments between potential gloss tokens and translations.
 
     Candidate tokens are aligned left to right monotonically, with any remaining
     tokens assigned to the last aligned token.
 
-    :rtype: List[Tuple[int, float]]
+    :rtype: List[Tuple[int, GlossIndex]]
     """
     final_alignments = set([])
 
@@ -346,6 +478,8 @@ def handle_multiple_alignments(alignments: List[Tuple[int, float]]):
 # Alignment Testcases
 # -------------------------------------------
 from unittest import TestCase
+import numpy as np
+from intent2.processing import assign_trans_analysis
 class MultipleAlignmentTests(TestCase):
 
     def test_many_to_many_alignments(self):
@@ -374,4 +508,63 @@ class MultipleAlignmentTests(TestCase):
         self.assertListEqual(aln, handle_multiple_alignments(aln))
 
     def test_no_alignments(self):
-        self.assertListEqual([], handle_multiple_alignments([]))
\ No newline at end of file
+        self.assertListEqual([], handle_multiple_alignments([]))
+
+class ConflictingAlignmentTests(TestCase):
+    def test_unaligned_pairs(self):
+        new_aln = [(1, (1, 0)), (2, (2, 0))]
+        self.assertListEqual(new_aln, remove_conflicting_alignments([(0, (0, 0))], new_aln))
+
+    def test_single_word_candidate(self):
+        # Gloss (0, 0) is aligned, but word 1 has no other candidate.
+        new_aln = [(1, (0, 0))]
+        self.assertListEqual(new_aln, remove_conflicting_alignments([(0, (0, 0))], new_aln))
+
+    def test_single_gloss_candidate(self):
+        # Word 0 is aligned, and gloss (1, 0) has no other candidate,
+        # while gloss (2, 0) has two.
+        new_aln = [(0, (1, 0)), (0, (2, 0)), (1, (2, 0))]
+        self.assertListEqual([(0, (1, 0)), (1, (2, 0))],
+                             remove_conflicting_alignments([(0, (0, 0))], new_aln))
+
+class HeuristicMatchTests(TestCase):
+    def setUp(self):
+        self.table = GlossPartTable()
+        self.table.add_strings(['House', 'go', '1PL', 'House'])
+
+    def test_table(self):
+        self.assertEqual(len(self.table), 3)
+        self.assertEqual(self.table['House'].lower, 'house')
+
+    def test_max_entries(self):
+        table = GlossPartTable(max_entries=3)
+        table.add_strings(['House', 'go', '1PL'])
+        table.add_strings(['House', 'PST'])
+        self.assertListEqual(list(table), ['1PL', 'House', 'PST'])
+
+        # The strings asked for are kept, even beyond the maximum.
+        table.add_strings(['a', 'b', 'c', 'd'])
+        self.assertListEqual(list(table), ['a', 'b', 'c', 'd'])
+
+    def test_matches(self):
+        self.assertTrue(exact_match(Word('house'), (0.0, self.table['House'])))
+        self.assertFalse(exact_match(Word('go'), (0.0, self.table['House'])))
+        self.assertTrue(substring_match(Word('houses'), (0.0, self.table['House'])))
+        self.assertTrue(gram_match(Word('we'), (0.0, self.table['1PL'])))
+
+    def test_vector_match(self):
+        vocab = load_spacy(PROFILE_LEMMA).vocab
+        for string, vector in [('hill', [1.0, 0.1]), ('mountain', [0.9, 0.2]), ('fifth', [0.0, 1.0])]:
+            vocab.set_vector(string, np.array(vector, dtype='float32'))
+        self.addCleanup(vocab.reset_vectors, shape=(0, 0))
+
+        inst = Instance.from_strings(['ni iya', 'mountain fifth', 'the hill'])
+        assign_trans_analysis(inst, [('DET', 'the', 1, 'det'), ('NOUN', 'hill', 1, 'ROOT')],
+                              trans_doc=Doc(vocab, words=['the', 'hill']))
+        table = GlossPartTable()
+        table.add_strings(['mountain', 'fifth'])
+        gloss_parts = [(index, table[part]) for gloss_w in inst.gloss for index, part in gloss_w.subword_parts]
+
+        match = VectorMatcher(inst, gloss_parts, spacy_profile=PROFILE_LEMMA, vectors=VectorTable())
+        self.assertListEqual([[match(trans_w, gloss_part) for gloss_part in gloss_parts] for trans_w in inst.trans],
+                             [[False, False], [True, False]])
@@ -0,0 +1,322 @@
+"""
+Timing harnesses for the core INTENT2 operations, run
+over a synthetic corpus.
+
+spaCy is not used: translation lines are given the analyses
+from the synthetic lemma and POS tables, and gloss parts are
+lemmatized with the same lemma table.
+"""
+import gc
+import platform
+import statistics
+import time
+import tracemalloc
+from collections import OrderedDict
+from typing import Callable, Dict, List
+
+from xigt.model import XigtCorpus, Igt
+
+from intent2.alignment import heuristic_alignment, AlignException, GlossPartTable, GlossPart
+from intent2.benchmarks.memory import token_memory, GCPauses
+from intent2.columnar import ColumnarPhrase
+from intent2.benchmarks.synthetic import generate_xigt_corpus, trans_analysis, LEMMA_TABLE
+from intent2.model import Corpus, DependencyException
+from intent2.processing import assign_trans_analysis
+from intent2.projection import project_pos, project_ds
+from intent2.serialize.consts import LANG_KEY, GLOSS_KEY, TRANS_KEY
+from intent2.serialize.exporters import instance_to_xigt, corpus_to_xigt, tier_to_xigt
+from intent2.serialize.importers import parse_xigt_corpus
+from intent2.serialize.snapshot import dumps_snapshot, loads_snapshot
+import xigt.codecs.xigtxml
+
+import logging
+BENCH_LOG = logging.getLogger('benchmark')
+
+
+# -------------------------------------------
+# Corpus preparation
+# -------------------------------------------
+def lemma_table_gloss_parts(corp: Corpus, lemma_table: Dict[str, str] = None) -> GlossPartTable:
+    """
+    Build a table of the gloss parts in the corpus,
+    lemmatized with a lookup table rather than spaCy.
+    """
+    lemma_table = LEMMA_TABLE if lemma_table is None else lemma_table
+    gloss_table = GlossPartTable()
+    for inst in corp:
+        for gloss_w in inst.gloss:
+            for index, part in gloss_w.subword_parts:
+                lower = part.lower()
+                gloss_table[part] = GlossPart(part, lower, lemma_table.get(lower, lower))
+    return gloss_table
+
+
+def parsed_corpus(xc: XigtCorpus) -> Corpus:
+    """
+    Import the corpus, and analyze its translation lines.
+    """
+    corp = parse_xigt_corpus(xc)
+    for inst in corp:
+        assign_trans_analysis(inst, trans_analysis([tw.string for tw in inst.trans]), tag=True, parse=True)
+        inst.trans._processed = True
+    return corp
+
+
+def aligned_corpus(xc: XigtCorpus) -> Corpus:
+    """
+    Import the corpus, analyze its translation lines,
+    and heuristically align the instances.
+    """
+    corp = parsed_corpus(xc)
+    gloss_table = lemma_table_gloss_parts(corp)
+    for inst in corp:
+        try:
+            heuristic_alignment(inst, gloss_table=gloss_table)
+        except AlignException:
+            pass
+    return corp
+
+
+def release_corpora(*objs):
+    """
+    Release the corpora among a benchmark's setup data or
+    results (also within tuples), once they are done with.
+    """
+    for obj in objs:
+        if isinstance(obj, Corpus):
+            obj.release()
+        elif isinstance(obj, tuple):
+            release_corpora(*obj)
+
+
+# -------------------------------------------
+# Benchmarks
+#
+# Each benchmark has a setup function, which is given
+# the synthetic Xigt corpus and is not timed, and a run
+# function, which is given the result of the setup.
+# Any corpus a run function creates should be returned,
+# so that it can be released outside of the timing.
+# -------------------------------------------
+BENCHMARKS = OrderedDict()  # type: Dict[str, tuple]
+
+def benchmark(name: str, setup: Callable):
+    def register(run: Callable):
+        BENCHMARKS[name] = (setup, run)
+        return run
+    return register
+
+
+@benchmark('parse_xigt_corpus', setup=lambda xc: xc)
+def bench_parse_xigt_corpus(xc: XigtCorpus):
+    return parse_xigt_corpus(xc)
+
+
+@benchmark('xigtxml.loads+parse_xigt_corpus', setup=xigt.codecs.xigtxml.dumps)
+def bench_load_xigt(xml: str):
+    return parse_xigt_corpus(xigt.codecs.xigtxml.loads(xml))
+
+
+def _snapshot_setup(xc: XigtCorpus) -> bytes:
+    corp = aligned_corpus(xc)
+    data = dumps_snapshot(corp)
+    corp.release()
+    return data
+
+@benchmark('loads_snapshot', setup=_snapshot_setup)
+def bench_load_snapshot(data: bytes):
+    return loads_snapshot(data)
+
+
+def _alignment_setup(xc: XigtCorpus):
+    corp = parsed_corpus(xc)
+    return corp, lemma_table_gloss_parts(corp)
+
+@benchmark('heuristic_alignment', setup=_alignment_setup)
+def bench_heuristic_alignment(corp_and_table):
+    corp, gloss_table = corp_and_table
+    for inst in corp:
+        try:
+            heuristic_alignment(inst, gloss_table=gloss_table)
+        except AlignException:
+            pass
+
+
+@benchmark('project_pos', setup=aligned_corpus)
+def bench_project_pos(corp: Corpus):
+    for inst in corp:
+        if inst.trans.alignments:
+            project_pos(inst)
+
+
+@benchmark('project_ds', setup=aligned_corpus)
+def bench_project_ds(corp: Corpus):
+    for inst in corp:
+        if inst.trans.alignments:
+            try:
+                project_ds(inst)
+            except DependencyException:
+                pass
+
+
+def _linked_corpus(xc: XigtCorpus) -> Corpus:
+    """
+    A parsed corpus whose translation dependency structures
+    have been converted to their set-of-links form.
+    """
+    corp = parsed_corpus(xc)
+    for inst in corp:
+        inst.trans.dependency_structure
+    return corp
+
+@benchmark('DependencyStructure.depth', setup=_linked_corpus)
+def bench_depth(corp: Corpus):
+    for inst in corp:
+        ds = inst.trans.dependency_structure
+        for link in ds:
+            ds.depth(link)
+
+
+def _phrases(xc: XigtCorpus) -> list:
+    return [phrase for inst in parse_xigt_corpus(xc) for phrase in (inst.lang, inst.gloss)]
+
+def _columnar_phrases(xc: XigtCorpus) -> list:
+    return [ColumnarPhrase.from_phrase(phrase) for phrase in _phrases(xc)]
+
+@benchmark('Phrase.tags+subwords', setup=_phrases)
+def bench_phrase_scan(phrases: list):
+    for phrase in phrases:
+        phrase.tags
+        [sw.hyphenated for sw in phrase.subwords]
+
+
+@benchmark('ColumnarPhrase.tags+subwords', setup=_columnar_phrases)
+def bench_columnar_scan(phrases: list):
+    for phrase in phrases:
+        phrase.tags
+        phrase.subwords_hyphenated
+
+
+@benchmark('derived_properties', setup=parsed_corpus)
+def bench_derived_properties(corp: Corpus):
+    """
+    Read the derived string properties of each token, and of
+    its phrase, as the per-token loops of alignment, projection,
+    and export do.
+    """
+    for inst in corp:
+        ds = inst.trans.dependency_structure
+        for phrase in (inst.lang, inst.gloss, inst.trans):
+            for word in phrase:
+                phrase.hyphenated, phrase.subwords, word.hyphenated, word.string
+                for subword in word:
+                    list(subword.parts)
+                word in ds.words
+
+
+@benchmark('tier_to_xigt', setup=aligned_corpus)
+def bench_tier_to_xigt(corp: Corpus):
+    for inst in corp:
+        igt = Igt(id=inst.id)
+        for phrase, phrase_type in ((inst.lang, LANG_KEY), (inst.gloss, GLOSS_KEY), (inst.trans, TRANS_KEY)):
+            tier_to_xigt(igt, phrase, phrase_type)
+
+
+@benchmark('instance_to_xigt', setup=aligned_corpus)
+def bench_instance_to_xigt(corp: Corpus):
+    for inst in corp:
+        instance_to_xigt(inst)
+
+
+@benchmark('corpus_to_xigt', setup=aligned_corpus)
+def bench_corpus_to_xigt(corp: Corpus):
+    corpus_to_xigt(corp)
+
+
+# -------------------------------------------
+# Running the benchmarks
+# -------------------------------------------
+def run_benchmark(name: str, xc: XigtCorpus, repeat: int = 3) -> dict:
+    """
+    Time a single benchmark over the corpus.
+
+    Each repetition is timed against a freshly set-up corpus, along
+    with the time spent in garbage collection during it. The peak
+    memory is the peak of Python allocations during one further,
+    untimed run, as measured by tracemalloc.
+    """
+    setup, run = BENCHMARKS[name]
+
+    times = []  # type: List[float]
+    gc_pauses = []  # type: List[GCPauses]
+    for i in range(repeat):
+        data = setup(xc)
+        gc.collect()
+        with GCPauses() as pauses:
+            start = time.perf_counter()
+            result = run(data)
+            times.append(time.perf_counter() - start)
+        gc_pauses.append(pauses)
+        release_corpora(data, result)
+
+    data = setup(xc)
+    gc.collect()
+    tracemalloc.start()
+    result = run(data)
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    release_corpora(data, result)
+
+    median = statistics.median(times)
+    return OrderedDict([('instances', len(xc)),
+                        ('times_s', times),
+                        ('min_s', min(times)),
+                        ('median_s', median),
+                        ('instances_per_s', len(xc) / median if median else None),
+                        ('gc_pause_s', statistics.median(pauses.total for pauses in gc_pauses)),
+                        ('max_gc_pause_s', max(pauses.longest for pauses in gc_pauses)),
+                        ('peak_memory_bytes', peak)])
+
+
+def run_benchmarks(names: List[str] = None, repeat: int = 3, **corpus_params) -> dict:
+    """
+    Generate a synthetic corpus with the given parameters (see
+    intent2.benchmarks.synthetic.generate_xigt_corpus), and run the
+    named benchmarks (or all of them) over it.
+
+    The bytes used by each token object are reported as well.
+
+    :return: The results, ready to be written out as JSON.
+    """
+    names = list(BENCHMARKS.keys()) if names is None else names
+    xc = generate_xigt_corpus(**corpus_params)
+
+    results = OrderedDict()
+    for name in names:
+        BENCH_LOG.info('Running benchmark "{}"'.format(name))
+        results[name] = run_benchmark(name, xc, repeat=repeat)
+
+    return OrderedDict([('python', platform.python_version()),
+                        ('corpus', corpus_params),
+                        ('repeat', repeat),
+                        ('benchmarks', results),
+                        ('token_bytes', token_memory())])
+
+
+# -------------------------------------------
+# Test Cases
+# -------------------------------------------
+from unittest import TestCase
+
+
+class BenchmarkHarnessTests(TestCase):
+    def test_run_all(self):
+        results = run_benchmarks(repeat=1, num_instances=10, seed=0)
+        self.assertListEqual(list(results['benchmarks'].keys()), list(BENCHMARKS.keys()))
+        for name, result in results['benchmarks'].items():
+            self.assertEqual(result['instances'], 10)
+            self.assertGreater(result['peak_memory_bytes'], 0)
+
+    def test_alignment_without_spacy(self):
+        corp = aligned_corpus(generate_xigt_corpus(num_instances=10, seed=0))
+        self.assertTrue(all(inst.trans.alignments for inst in corp))
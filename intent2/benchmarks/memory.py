@@ -0,0 +1,91 @@
+"""
+Measure the memory taken by the token objects
+of the INTENT2 data model, and the time spent
+in the garbage collector.
+"""
+import gc
+import sys
+import time
+import tracemalloc
+from collections import OrderedDict
+from typing import Callable, List
+
+from intent2.model import Word, SubWord
+
+
+def bytes_per_object(factory: Callable[[int], object], count: int) -> float:
+    """
+    Return the average number of bytes allocated by each
+    call to the factory, as measured by tracemalloc.
+    """
+    gc.collect()
+    tracemalloc.start()
+    objs = [factory(i) for i in range(count)]
+    allocated, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return (allocated - sys.getsizeof(objs)) / count
+
+
+class GCPauses(object):
+    """
+    Record the duration of each garbage collection
+    made within a with-block.
+    """
+    def __init__(self):
+        self.pauses = []  # type: List[float]
+        self._start = None
+
+    def _callback(self, phase: str, info: dict):
+        if phase == 'start':
+            self._start = time.perf_counter()
+        elif self._start is not None:
+            self.pauses.append(time.perf_counter() - self._start)
+            self._start = None
+
+    def __enter__(self):
+        gc.callbacks.append(self._callback)
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        gc.callbacks.remove(self._callback)
+
+    @property
+    def total(self) -> float:
+        return sum(self.pauses)
+
+    @property
+    def longest(self) -> float:
+        return max(self.pauses, default=0.0)
+
+
+def _subword(i: int) -> SubWord:
+    return SubWord('run', index=0, id_='sw')
+
+def _tagged_subword(i: int) -> SubWord:
+    sw = _subword(i)
+    sw.pos = 'VERB'
+    sw.lemma = 'run'
+    return sw
+
+def _word(i: int) -> Word:
+    return Word(subwords=[_subword(i)], id_='w')
+
+def _tagged_word(i: int) -> Word:
+    w = Word(subwords=[_tagged_subword(i)], id_='w')
+    w.pos = 'VERB'
+    return w
+
+
+def token_memory(count: int = 100000) -> dict:
+    """
+    Return the bytes used by each SubWord, and by each Word
+    with a single SubWord, both as constructed and once tagged
+    and lemmatized.
+
+    The strings are shared between the tokens, so that only the
+    token objects themselves are counted.
+    """
+    return OrderedDict([('SubWord', bytes_per_object(_subword, count)),
+                        ('SubWord (tagged)', bytes_per_object(_tagged_subword, count)),
+                        ('Word', bytes_per_object(_word, count)),
+                        ('Word (tagged)', bytes_per_object(_tagged_word, count))])
@@ -0,0 +1,147 @@
+"""
+Generate synthetic IGT corpora in Xigt-XML for benchmarking.
+
+The generated instances have normalized ODIN L/G/T lines.
+The gloss line is made up of stems and grams whose English
+renderings appear in the translation line, so that heuristic
+alignment and projection have work to do.
+"""
+import random
+from typing import Dict, List, Tuple
+
+from xigt.model import XigtCorpus, Igt, Tier, Item
+
+# (gloss stem, translation word form, lemma, POS)
+# The POS tags are limited to those in intent2.projection.precedence.
+STEMS = [('walk', 'walked', 'walk', 'VERB'), ('see', 'saw', 'see', 'VERB'),
+         ('eat', 'eats', 'eat', 'VERB'), ('give', 'gave', 'give', 'VERB'),
+         ('make', 'make', 'make', 'VERB'), ('run', 'running', 'run', 'VERB'),
+         ('sleep', 'slept', 'sleep', 'VERB'), ('take', 'took', 'take', 'VERB'),
+         ('dog', 'dogs', 'dog', 'NOUN'), ('man', 'men', 'man', 'NOUN'),
+         ('woman', 'woman', 'woman', 'NOUN'), ('boat', 'boats', 'boat', 'NOUN'),
+         ('house', 'houses', 'house', 'NOUN'), ('child', 'children', 'child', 'NOUN'),
+         ('fish', 'fish', 'fish', 'NOUN'), ('water', 'water', 'water', 'NOUN'),
+         ('tree', 'trees', 'tree', 'NOUN'), ('village', 'village', 'village', 'NOUN'),
+         ('big', 'big', 'big', 'ADJ'), ('small', 'smaller', 'small', 'ADJ'),
+         ('old', 'old', 'old', 'ADJ'), ('good', 'best', 'good', 'ADJ'),
+         ('quickly', 'quickly', 'quickly', 'ADV'), ('here', 'here', 'here', 'ADV')]
+
+# (gram, translation word form, POS), with forms drawn from gram_dict.yml
+GRAMS = [('1SG', 'i', 'PRON'), ('3SG', 'he', 'PRON'), ('1PL', 'we', 'PRON'),
+         ('3PL', 'they', 'PRON'), ('NEG', 'not', 'PART'), ('FUT', 'will', 'VERB'),
+         ('DEF', 'the', 'DET'), ('INDEF', 'a', 'DET'), ('CAUS', 'made', 'VERB'),
+         ('PST', None, None), ('NOM', None, None), ('ACC', None, None)]
+
+# Translation words with no counterpart on the gloss line.
+FILLERS = [('of', 'ADP'), ('to', 'ADP'), ('and', 'CCONJ'), ('in', 'ADP'), ('that', 'ADP')]
+
+SYLLABLES = [c + v for c in 'ptkmnslrwy' for v in 'aeiou']
+
+# The lemma of each translation word form, standing in
+# for spaCy's lemmatizer.
+LEMMA_TABLE = {form: lemma for stem, form, lemma, pos in STEMS}  # type: Dict[str, str]
+
+# The POS tag of each translation word form, standing in
+# for spaCy's tagger.
+POS_TABLE = {form: pos for stem, form, lemma, pos in STEMS}  # type: Dict[str, str]
+POS_TABLE.update({form: pos for gram, form, pos in GRAMS if form})
+POS_TABLE.update(dict(FILLERS))
+
+
+def _lang_morph(rand: random.Random) -> str:
+    return ''.join(rand.choice(SYLLABLES) for i in range(rand.randint(1, 3)))
+
+
+def generate_lines(rand: random.Random, words_per_line: int,
+                   morphs_per_word: int, trans_length: int) -> Tuple[str, str, str]:
+    """
+    Generate one set of lang, gloss, and translation lines.
+    """
+    lang_words, gloss_words, trans_words = [], [], []
+    for i in range(words_per_line):
+        stem, stem_form, lemma, pos = rand.choice(STEMS)
+        grams = [rand.choice(GRAMS) for j in range(morphs_per_word - 1)]
+
+        lang_words.append('-'.join(_lang_morph(rand) for j in range(morphs_per_word)))
+        gloss_words.append('-'.join([stem] + [gram for gram, form, gram_pos in grams]))
+        trans_words.extend([form for gram, form, gram_pos in grams if form] + [stem_form])
+
+    # Pad (or trim) the translation line to the requested length.
+    trans_words = trans_words[:trans_length]
+    while len(trans_words) < trans_length:
+        trans_words.insert(rand.randint(0, len(trans_words)), rand.choice(FILLERS)[0])
+
+    return ' '.join(lang_words), ' '.join(gloss_words), ' '.join(trans_words)
+
+
+def generate_xigt_corpus(num_instances: int = 1000, words_per_line: int = 6,
+                         morphs_per_word: int = 2, trans_length: int = 8,
+                         duplication_rate: float = 0.1, seed: int = 0) -> XigtCorpus:
+    """
+    Generate a corpus of synthetic instances.
+
+    :param duplication_rate: The proportion of instances whose lines
+                             repeat those of an earlier instance.
+    :param seed: The seed for the random generator, so that the
+                 same parameters always produce the same corpus.
+    """
+    rand = random.Random(seed)
+    xc = XigtCorpus()
+    seen_lines = []  # type: List[Tuple[str, str, str]]
+    for i in range(num_instances):
+        if seen_lines and rand.random() < duplication_rate:
+            lines = rand.choice(seen_lines)
+        else:
+            lines = generate_lines(rand, words_per_line, morphs_per_word, trans_length)
+            seen_lines.append(lines)
+
+        items = [Item(id='n{}'.format(line_no),
+                      attributes={'line': str(line_no), 'tag': tag},
+                      text=line)
+                 for line_no, (tag, line) in enumerate(zip('LGT', lines), start=1)]
+        odin_tier = Tier(id='n', type='odin', attributes={'state': 'normalized'}, items=items)
+        xc.append(Igt(id='igt{}'.format(i + 1), tiers=[odin_tier]))
+    return xc
+
+
+def trans_analysis(words: List[str]) -> List[Tuple[str, str, int, str]]:
+    """
+    Return an analysis of a synthetic translation line
+    in the form produced by intent2.processing.doc_to_analysis,
+    using the lemma and POS tables in place of spaCy.
+
+    The first word is the root, and the remaining words form a
+    balanced tree beneath it.
+    """
+    return [(POS_TABLE.get(word, 'X'),
+             LEMMA_TABLE.get(word, word),
+             (i - 1) // 2 if i else 0,
+             'dep' if i else 'ROOT')
+            for i, word in enumerate(words)]
+
+
+# -------------------------------------------
+# Test Cases
+# -------------------------------------------
+from unittest import TestCase
+
+
+class SyntheticCorpusTests(TestCase):
+    def test_parameters(self):
+        xc = generate_xigt_corpus(num_instances=20, words_per_line=4,
+                                  morphs_per_word=3, trans_length=10,
+                                  duplication_rate=0.5, seed=1)
+        self.assertEqual(len(xc), 20)
+        lang, gloss, trans = [item.value() for item in xc[0][0]]
+        self.assertEqual(len(lang.split()), 4)
+        self.assertTrue(all(len(gw.split('-')) == 3 for gw in gloss.split()))
+        self.assertEqual(len(trans.split()), 10)
+
+        lines = {tuple(item.value() for item in igt[0]) for igt in xc}
+        self.assertLess(len(lines), 20)
+
+    def test_reproducible(self):
+        xc_a = generate_xigt_corpus(num_instances=5, seed=3)
+        xc_b = generate_xigt_corpus(num_instances=5, seed=3)
+        self.assertListEqual([igt[0][2].value() for igt in xc_a],
+                             [igt[0][2].value() for igt in xc_b])
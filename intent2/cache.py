@@ -0,0 +1,247 @@
+"""
+Module for caching the analyses of translation lines
+on disk, so that repeated translation lines (and reruns
+over the same data) do not need to be parsed again.
+"""
+import hashlib
+import json
+import sqlite3
+from typing import List, Optional, Tuple
+
+# -------------------------------------------
+# Set up logging
+# -------------------------------------------
+import logging
+CACHE_LOG = logging.getLogger('cache')
+
+# An analysis is a list of (pos, lemma, head index, dep label)
+# tuples, one for each token in the translation line.
+TokenAnalysis = Tuple[str, str, int, str]
+
+# The details kept with the analysis of each token: its fine-grained
+# tag, and the key of its vector in the model's vocabulary (or None).
+TokenDetails = Tuple[str, int]
+
+DEFAULT_MAX_ENTRIES = 500000
+
+# The version of the format entries are stored in. It is part of
+# each entry's key, so that entries in an older format are not used
+# (and are evicted in time).
+CACHE_FORMAT_VERSION = 2
+
+
+class TransAnalysisCache(object):
+    """
+    A content-addressed cache of translation line analyses,
+    stored in a local sqlite file.
+
+    Entries are keyed on the tokens of the translation line
+    and the version of the model that produced the analysis.
+    Once the cache holds more than max_entries lines, the least
+    recently used entries are evicted.
+
+    The number of entries and the order in which they were used are
+    kept in the file itself, so that several processes can share it.
+    """
+    def __init__(self, path: str, model_version: str,
+                 max_entries: int = DEFAULT_MAX_ENTRIES,
+                 commit_every: int = 1000):
+        self.path = path
+        self.model_version = model_version
+        self.max_entries = max_entries
+        self.commit_every = commit_every
+
+        self.hits = 0
+        self.misses = 0
+
+        # Write-ahead logging lets several processes
+        # share the same cache file.
+        self._conn = sqlite3.connect(path, timeout=60)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        with self._conn:
+            self._conn.execute('CREATE TABLE IF NOT EXISTS analyses '
+                               '(key TEXT PRIMARY KEY, analysis TEXT, last_used INTEGER)')
+            self._conn.execute('CREATE INDEX IF NOT EXISTS analyses_last_used ON analyses (last_used)')
+
+            # The number of entries, kept up to date by triggers, since
+            # counting the rows of a large cache is slow.
+            self._conn.execute('CREATE TABLE IF NOT EXISTS size (id INTEGER PRIMARY KEY, entries INTEGER)')
+            self._conn.execute('INSERT OR IGNORE INTO size (id, entries) SELECT 0, COUNT(*) FROM analyses')
+            self._conn.execute('CREATE TRIGGER IF NOT EXISTS analyses_insert AFTER INSERT ON analyses '
+                               'BEGIN UPDATE size SET entries = entries + 1; END')
+            self._conn.execute('CREATE TRIGGER IF NOT EXISTS analyses_delete AFTER DELETE ON analyses '
+                               'BEGIN UPDATE size SET entries = entries - 1; END')
+        self._uncommitted = 0
+
+    def key(self, words: List[str]) -> str:
+        """
+        Return the content address for the given tokens.
+        """
+        key_str = json.dumps([CACHE_FORMAT_VERSION, self.model_version, words], ensure_ascii=False)
+        return hashlib.sha1(key_str.encode('utf-8')).hexdigest()
+
+    # Entries are stamped with one more than the latest stamp
+    # in the file, whichever process wrote it.
+    NEXT_USE = '(SELECT COALESCE(MAX(last_used), 0) + 1 FROM analyses)'
+
+    def _written(self):
+        self._uncommitted += 1
+        if self._uncommitted >= self.commit_every:
+            self.commit()
+
+    def lookup(self, words: List[str]) -> Optional[Tuple[List[TokenAnalysis], Optional[List[TokenDetails]]]]:
+        """
+        Return the cached analysis for the given tokens, along with
+        the details of each token (if they were stored), or None
+        if it has not been seen before.
+        """
+        key = self.key(words)
+        row = self._conn.execute('SELECT analysis FROM analyses WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        self._conn.execute('UPDATE analyses SET last_used = {} WHERE key = ?'.format(self.NEXT_USE), (key,))
+        self._written()
+        analysis, details = json.loads(row[0])
+        return ([tuple(token) for token in analysis],
+                None if details is None else [tuple(token) for token in details])
+
+    def get(self, words: List[str]):
+        """
+        Return the cached analysis for the given tokens,
+        or None if it has not been seen before.
+
+        :rtype: List[TokenAnalysis]
+        """
+        entry = self.lookup(words)
+        return None if entry is None else entry[0]
+
+    def put(self, words: List[str], analysis: List[TokenAnalysis], details: List[TokenDetails] = None):
+        """
+        Store the analysis for the given tokens, and the
+        details of each token, if given.
+        """
+        assert len(words) == len(analysis)
+        assert details is None or len(details) == len(analysis)
+        self._conn.execute('INSERT INTO analyses (key, analysis, last_used) VALUES (?, ?, {}) '
+                           'ON CONFLICT (key) DO UPDATE SET analysis = excluded.analysis, '
+                           'last_used = excluded.last_used'.format(self.NEXT_USE),
+                           (self.key(words), json.dumps([analysis, details], separators=(',', ':'))))
+        if len(self) > self.max_entries:
+            self.evict()
+        self._written()
+
+    def evict(self):
+        """
+        Remove the least recently used entries, making room
+        for a tenth of the maximum cache size.
+        """
+        target_size = self.max_entries - max(1, self.max_entries // 10)
+        num_to_evict = len(self) - target_size
+        if num_to_evict <= 0:
+            return
+        CACHE_LOG.debug('Evicting {} entries from translation cache "{}"'.format(num_to_evict, self.path))
+        self._conn.execute('DELETE FROM analyses WHERE key IN '
+                           '(SELECT key FROM analyses ORDER BY last_used LIMIT ?)', (num_to_evict,))
+
+    def __len__(self):
+        return self._conn.execute('SELECT entries FROM size').fetchone()[0]
+
+    def commit(self):
+        self._conn.commit()
+        self._uncommitted = 0
+
+    def close(self):
+        self.commit()
+        self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def stats_string(self, format_str='{:>30s} {}\n'):
+        return cache_stats_string(self.hits, self.misses, len(self), format_str=format_str)
+
+
+def cache_stats_string(hits: int, misses: int, entries: int, format_str='{:>30s} {}\n'):
+    """
+    Return a report of the hits, misses, and entries of a cache
+    (e.g. those gathered from the caches of several processes).
+    """
+    ret_str = ''
+    for s, val in [('Cache Hits:', hits),
+                   ('Cache Misses:', misses),
+                   ('Cache Entries:', entries)]:
+        ret_str += format_str.format(s, val)
+    return ret_str
+
+
+# -------------------------------------------
+# Test Cases
+# -------------------------------------------
+import os
+import tempfile
+from unittest import TestCase
+
+
+class TransAnalysisCacheTests(TestCase):
+    def setUp(self):
+        fd, self.path = tempfile.mkstemp(suffix='.sqlite')
+        os.close(fd)
+        self.words = ['I', 'ran']
+        self.analysis = [('PRON', '-PRON-', 1, 'nsubj'), ('VERB', 'run', 1, 'ROOT')]
+
+    def tearDown(self):
+        os.remove(self.path)
+
+    def test_hits_and_misses(self):
+        with TransAnalysisCache(self.path, 'en_core_web_lg-2.0.0') as cache:
+            self.assertIsNone(cache.get(self.words))
+            cache.put(self.words, self.analysis)
+            self.assertListEqual(cache.get(self.words), self.analysis)
+            self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+    def test_persistence_and_model_version(self):
+        with TransAnalysisCache(self.path, 'en_core_web_lg-2.0.0') as cache:
+            cache.put(self.words, self.analysis)
+        with TransAnalysisCache(self.path, 'en_core_web_lg-2.0.0') as cache:
+            self.assertListEqual(cache.get(self.words), self.analysis)
+        with TransAnalysisCache(self.path, 'en_core_web_sm-2.0.0') as cache:
+            self.assertIsNone(cache.get(self.words))
+
+    def test_eviction(self):
+        with TransAnalysisCache(self.path, 'v', max_entries=10) as cache:
+            for i in range(10):
+                cache.put([str(i)], [('NUM', str(i), 0, 'ROOT')])
+            cache.get(['0'])
+            cache.put(['10'], [('NUM', '10', 0, 'ROOT')])
+            self.assertEqual(len(cache), 9)
+            self.assertIsNotNone(cache.get(['0']))
+            self.assertIsNone(cache.get(['1']))
+            self.assertIsNotNone(cache.get(['10']))
+
+    def test_details(self):
+        details = [('PRP', 12345), ('VBD', None)]
+        with TransAnalysisCache(self.path, 'v') as cache:
+            cache.put(self.words, self.analysis, details)
+            self.assertEqual(cache.lookup(self.words), (self.analysis, details))
+            cache.put(['ran'], [('VERB', 'run', 0, 'ROOT')])
+            self.assertEqual(cache.lookup(['ran']), ([('VERB', 'run', 0, 'ROOT')], None))
+
+    def test_shared(self):
+        with TransAnalysisCache(self.path, 'v', max_entries=5, commit_every=1) as cache_a, \
+                TransAnalysisCache(self.path, 'v', max_entries=5, commit_every=1) as cache_b:
+            for i in range(5):
+                cache_a.put([str(i)], [('NUM', str(i), 0, 'ROOT')])
+            self.assertEqual(len(cache_b), 5)
+
+            # Entries used by one process are the most recently used for all.
+            cache_b.get(['0'])
+            cache_b.put(['5'], [('NUM', '5', 0, 'ROOT')])
+            self.assertEqual(len(cache_a), 4)
+            self.assertIsNotNone(cache_a.get(['0']))
+            self.assertIsNone(cache_a.get(['1']))
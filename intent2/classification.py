@@ -76,15 +76,19 @@ class PreTokenizedCountVectorizer(CountVectorizer):
 def extract_gloss_word_feats(gloss_w: GlossWord, vocab: dict,
                              projected_tag: str = None,
                              subword_tags: List[str] = None,
-                             use_vocab: bool = True):
+                             use_vocab: bool = True,
+                             spacy_profile: str = None):
     """
     Given a gloss word, return the feature vector
     for classification.
+
+    :param spacy_profile: The spaCy loading profile used to tag the gloss parts
+                          (defaults to the tagger and parser).
     """
     X_word = defaultdict(float)
 
-    from .processing import load_spacy
-    en = load_spacy()
+    from .processing import load_spacy, PROFILE_PARSE
+    en = load_spacy(spacy_profile or PROFILE_PARSE)
     d = en([text for index, text in gloss_w.subword_parts])
 
     # If the subword_parts is empty, just use the literal
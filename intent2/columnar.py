@@ -0,0 +1,385 @@
+"""
+A columnar ("struct-of-arrays") alternative to the Phrase class.
+
+Rather than a list of Word objects that each own a list of
+SubWord objects, a ColumnarPhrase keeps parallel arrays of the
+subword strings, symbols, ids and POS tags, plus the offset of each
+word's first subword. Scans over a whole phrase (its tags, strings,
+or subwords) run over the arrays directly, and WordView/SubWordView
+objects are only created when individual tokens are asked for.
+
+Alignments and dependency structures are not kept in the columnar
+form; use to_phrase() to get a full Phrase for those.
+"""
+from array import array
+from typing import Iterable, Iterator, List, Tuple, Union
+
+from intent2.model import Phrase, Word, SubWord, IdMixin
+from intent2.symbols import SymbolTable, SYMBOLS, NO_SYMBOL
+
+
+# -------------------------------------------
+# Views
+# -------------------------------------------
+def _hyphenate(string: str, left_symbol: str, right_symbol: str) -> str:
+    return (left_symbol or '') + string + (right_symbol or '')
+
+
+class SubWordView(object):
+    """
+    A subword of a ColumnarPhrase, with the
+    read/write attributes of a SubWord.
+    """
+    __slots__ = ('_phrase', '_word_index', '_offset')
+
+    def __init__(self, phrase, word_index: int, offset: int):
+        """
+        :type phrase: ColumnarPhrase
+        :param offset: The position of this subword among all of the phrase's subwords.
+        """
+        self._phrase = phrase
+        self._word_index = word_index
+        self._offset = offset
+
+    @property
+    def string(self) -> str: return self._phrase.strings[self._offset]
+
+    @string.setter
+    def string(self, val): self._phrase.strings[self._offset] = val
+
+    @property
+    def left_symbol(self) -> str: return self._phrase.left_symbols[self._offset]
+
+    @property
+    def right_symbol(self) -> str: return self._phrase.right_symbols[self._offset]
+
+    @property
+    def hyphenated(self) -> str:
+        p, i = self._phrase, self._offset
+        return _hyphenate(p.strings[i], p.left_symbols[i], p.right_symbols[i])
+
+    @property
+    def id(self) -> str: return self._phrase.subword_ids[self._offset]
+
+    @id.setter
+    def id(self, val): self._phrase.subword_ids[self._offset] = val
+
+    @property
+    def pos(self) -> str: return self._phrase.symbols.symbol(self._phrase.subword_pos[self._offset])
+
+    @pos.setter
+    def pos(self, val): self._phrase.subword_pos[self._offset] = self._phrase.symbols.id(val)
+
+    @property
+    def index(self) -> Tuple[int, int]:
+        return self._word_index, self._offset - self._phrase.word_offsets[self._word_index]
+
+    @property
+    def word(self): return WordView(self._phrase, self._word_index)
+
+    @property
+    def alignments(self) -> frozenset:
+        """
+        Columnar phrases do not store alignments.
+        """
+        return frozenset()
+
+    def __str__(self): return self.string
+
+    def __repr__(self): return '<sw: {}>'.format(self.hyphenated)
+
+
+class WordView(object):
+    """
+    A word of a ColumnarPhrase, with the
+    read/write attributes of a Word.
+    """
+    __slots__ = ('_phrase', '_index')
+
+    def __init__(self, phrase, index: int):
+        """
+        :type phrase: ColumnarPhrase
+        """
+        self._phrase = phrase
+        self._index = index
+
+    @property
+    def index(self) -> int: return self._index
+
+    @property
+    def phrase(self): return self._phrase
+
+    @property
+    def id(self) -> str: return self._phrase.word_ids[self._index]
+
+    @id.setter
+    def id(self, val): self._phrase.word_ids[self._index] = val
+
+    @property
+    def pos(self) -> str: return self._phrase.symbols.symbol(self._phrase.word_pos[self._index])
+
+    @pos.setter
+    def pos(self, val): self._phrase.word_pos[self._index] = self._phrase.symbols.id(val)
+
+    @property
+    def _span(self) -> range:
+        offsets = self._phrase.word_offsets
+        return range(offsets[self._index], offsets[self._index + 1])
+
+    @property
+    def subwords(self) -> List[SubWordView]:
+        return [SubWordView(self._phrase, self._index, offset) for offset in self._span]
+
+    def __iter__(self) -> Iterator[SubWordView]:
+        return iter(self.subwords)
+
+    def __getitem__(self, item) -> SubWordView:
+        return self.subwords[item]
+
+    def __len__(self):
+        return len(self._span)
+
+    @property
+    def string(self) -> str:
+        span = self._span
+        return ''.join(self._phrase.strings[span.start:span.stop])
+
+    @property
+    def hyphenated(self) -> str:
+        return self._phrase.word_hyphenated(self._index)
+
+    @property
+    def word(self): return self
+
+    def aligned_words(self) -> list:
+        """
+        Columnar phrases do not store alignments.
+        """
+        return []
+
+    def __str__(self): return self.hyphenated
+
+    def __repr__(self):
+        return '(w: {} [{}])'.format(', '.join([repr(sw) for sw in self.subwords]), self.index)
+
+
+# -------------------------------------------
+# Phrase
+# -------------------------------------------
+class ColumnarPhrase(IdMixin):
+    """
+    A phrase stored as parallel arrays over its subwords.
+
+    word_offsets holds the offset of each word's first subword, plus
+    a final entry for the total number of subwords, so that the subwords
+    of word i are those from word_offsets[i] to word_offsets[i+1].
+    """
+    def __init__(self, id_=None, WordType: type = Word, symbols: SymbolTable = None):
+        self.id = id_
+        self.WordType = WordType
+        self.symbols = SYMBOLS if symbols is None else symbols
+
+        # Per-subword columns
+        self.strings = []  # type: List[str]
+        self.left_symbols = []  # type: List[str]
+        self.right_symbols = []  # type: List[str]
+        self.subword_ids = []  # type: List[str]
+        self.subword_pos = array('i')
+
+        # Per-word columns
+        self.word_offsets = array('I', [0])
+        self.word_ids = []  # type: List[str]
+        self.word_pos = array('i')
+
+    def add_word(self, subwords: Iterable[Union[str, SubWord]], id_: str = None, pos: str = None):
+        """
+        Append a word, given either as SubWord objects, or as
+        the strings of its subwords.
+        """
+        for sw in subwords:
+            if isinstance(sw, str):
+                sw = SubWord(sw)
+            self.strings.append(sw.string)
+            self.left_symbols.append(sw.left_symbol)
+            self.right_symbols.append(sw.right_symbol)
+            self.subword_ids.append(sw.id)
+            self.subword_pos.append(self.symbols.id(sw.pos))
+        assert len(self.strings) > self.word_offsets[-1], 'Every word must contain at least one subword.'
+        self.word_offsets.append(len(self.strings))
+        self.word_ids.append(id_)
+        self.word_pos.append(self.symbols.id(pos))
+
+    @classmethod
+    def from_phrase(cls, phrase: Phrase, symbols: SymbolTable = None):
+        """
+        Build the columnar form of a Phrase.
+
+        :rtype: ColumnarPhrase
+        """
+        WordType = type(phrase[0]) if phrase else Word
+        cp = cls(id_=phrase.id, WordType=WordType, symbols=symbols)
+        for word in phrase:
+            cp.add_word(word.subwords, id_=word.id, pos=word.pos)
+        return cp
+
+    def to_phrase(self) -> Phrase:
+        """
+        Build a full Phrase of Word and SubWord
+        objects from the columnar form.
+        """
+        words = []
+        for i in range(len(self)):
+            subwords = []
+            for offset in range(self.word_offsets[i], self.word_offsets[i + 1]):
+                sw = SubWord(self.strings[offset], id_=self.subword_ids[offset],
+                             left_symbol=self.left_symbols[offset],
+                             right_symbol=self.right_symbols[offset])
+                sw.pos = self.symbols.symbol(self.subword_pos[offset])
+                subwords.append(sw)
+            w = self.WordType(subwords=subwords, id_=self.word_ids[i])
+            w.pos = self.symbols.symbol(self.word_pos[i])
+            words.append(w)
+        return Phrase(words, id_=self.id)
+
+    # -------------------------------------------
+    # Access to individual tokens
+    # -------------------------------------------
+    def __len__(self):
+        return len(self.word_ids)
+
+    def __bool__(self):
+        return bool(self.word_ids)
+
+    def __iter__(self) -> Iterator[WordView]:
+        return (WordView(self, i) for i in range(len(self)))
+
+    def __getitem__(self, i) -> Union[WordView, SubWordView, List[WordView]]:
+        """
+        Look up a word by its index, or a subword by
+        its (word index, subword index) address.
+        """
+        if isinstance(i, tuple):
+            w_index, sw_index = i
+            w_index = range(len(self))[w_index]
+            span = range(self.word_offsets[w_index], self.word_offsets[w_index + 1])
+            return SubWordView(self, w_index, span[sw_index])
+        elif isinstance(i, slice):
+            return [WordView(self, j) for j in range(len(self))[i]]
+        return WordView(self, range(len(self))[i])
+
+    # -------------------------------------------
+    # Bulk operations over the columns
+    # -------------------------------------------
+    @property
+    def num_subwords(self) -> int:
+        return len(self.strings)
+
+    @property
+    def subwords(self) -> List[SubWordView]:
+        offsets = self.word_offsets
+        return [SubWordView(self, i, offset)
+                for i in range(len(self))
+                for offset in range(offsets[i], offsets[i + 1])]
+
+    @property
+    def tags(self) -> List[str]:
+        symbol = self.symbols.symbol
+        return [symbol(tag_id) for tag_id in self.word_pos]
+
+    @property
+    def subword_tags(self) -> List[str]:
+        symbol = self.symbols.symbol
+        return [symbol(tag_id) for tag_id in self.subword_pos]
+
+    @property
+    def subwords_hyphenated(self) -> List[str]:
+        """
+        The hyphenated strings of every subword.
+        """
+        return list(map(_hyphenate, self.strings, self.left_symbols, self.right_symbols))
+
+    def set_tags(self, tags: Iterable[str]):
+        """
+        Set the POS tags of every word at once.
+        """
+        self.word_pos = array('i', map(self.symbols.id, tags))
+        assert len(self.word_pos) == len(self)
+
+    def clear_tags(self):
+        self.word_pos = array('i', [NO_SYMBOL]) * len(self)
+        self.subword_pos = array('i', [NO_SYMBOL]) * len(self.strings)
+
+    def word_hyphenated(self, i: int) -> str:
+        """
+        The string of word i with its morpheme delineations
+        (see Word.hyphenated).
+        """
+        strings, lefts, rights = self.strings, self.left_symbols, self.right_symbols
+        start, stop = self.word_offsets[i], self.word_offsets[i + 1]
+        ret_str = _hyphenate(strings[start], lefts[start], rights[start])
+        for j in range(start + 1, stop):
+            if not (lefts[j] or rights[j]) and not rights[j - 1]:
+                ret_str += '-' + strings[j]
+            else:
+                ret_str += _hyphenate(strings[j], lefts[j], rights[j])
+        return ret_str
+
+    @property
+    def hyphenated(self) -> str:
+        return ' '.join([self.word_hyphenated(i) for i in range(len(self))])
+
+    def __str__(self):
+        return self.hyphenated
+
+    def __repr__(self):
+        return '[cp: {}]'.format(', '.join([repr(w) for w in self]))
+
+
+# -------------------------------------------
+# Test Cases
+# -------------------------------------------
+from unittest import TestCase
+
+
+class ColumnarPhraseTests(TestCase):
+    def setUp(self):
+        self.phrase = Phrase.from_string('Person Spc money take.Pfv father 3.loc-give.Ipfv bett=er', p_id='g')
+        self.phrase[0].pos = 'NOUN'
+        self.phrase[(5, 1)].pos = 'VERB'
+        self.cp = ColumnarPhrase.from_phrase(self.phrase, symbols=SymbolTable())
+
+    def test_bulk(self):
+        self.assertEqual(len(self.cp), len(self.phrase))
+        self.assertEqual(self.cp.num_subwords, len(self.phrase.subwords))
+        self.assertEqual(self.cp.hyphenated, self.phrase.hyphenated)
+        self.assertEqual(str(self.cp), str(self.phrase))
+        self.assertListEqual(self.cp.tags, self.phrase.tags)
+        self.assertListEqual(self.cp.subword_tags, [sw.pos for sw in self.phrase.subwords])
+        self.assertListEqual(self.cp.subwords_hyphenated, [sw.hyphenated for sw in self.phrase.subwords])
+
+    def test_views(self):
+        for w, cw in zip(self.phrase, self.cp):
+            self.assertEqual((w.id, w.index, w.string, w.hyphenated), (cw.id, cw.index, cw.string, cw.hyphenated))
+            for sw, csw in zip(w, cw):
+                self.assertEqual((sw.id, sw.index, sw.hyphenated), (csw.id, csw.index, csw.hyphenated))
+
+        self.assertEqual(self.cp[(5, 1)].pos, 'VERB')
+        self.cp[2].pos = 'NOUN'
+        self.assertListEqual(self.cp.tags[:3], ['NOUN', None, 'NOUN'])
+
+    def test_roundtrip(self):
+        p = self.cp.to_phrase()
+        self.assertTrue(p.equals(self.phrase))
+        self.assertEqual(p.hyphenated, self.phrase.hyphenated)
+        self.assertListEqual(p.tags, self.phrase.tags)
+        self.assertEqual(p[(5, 1)].pos, 'VERB')
+
+    def test_export(self):
+        from xigt.model import Igt
+        from intent2.serialize.exporters import tier_to_xigt
+        from intent2.serialize.consts import GLOSS_KEY
+        igt_a, igt_b = Igt(id='a'), Igt(id='b')
+        tier_to_xigt(igt_a, self.phrase, GLOSS_KEY)
+        tier_to_xigt(igt_b, self.cp, GLOSS_KEY)
+        self.assertListEqual([[(item.id, item.value()) for item in tier] for tier in igt_a],
+                             [[(item.id, item.value()) for item in tier] for tier in igt_b])
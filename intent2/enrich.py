@@ -0,0 +1,389 @@
+"""
+Module holding the enrichment pipeline run by the
+"intent" script: alignment, projection, and classification
+of each instance, and the export of the results back to Xigt.
+
+The pipeline may be run over a whole corpus in a single process,
+streamed a chunk at a time, or split across multiple worker processes.
+"""
+import os
+from argparse import Namespace
+from collections import deque
+from multiprocessing import Pool
+from typing import Iterable, Iterator, List, Tuple
+
+import xigt.codecs.xigtxml
+from xigt.model import Igt, XigtCorpus
+
+from intent2.alignment import heuristic_alignment, AlignException, GlossPartTable
+from intent2.classification import LRWrapper
+from intent2.eval import PRFEval, eval_bilingual_alignments, eval_pos
+from intent2.model import Instance, DependencyException
+from intent2.processing import process_trans_if_needed, process_corpus_trans, load_trans_cache, \
+    load_spacy, gold_trans_tags, PROFILE_PARSE, PROFILE_LEMMA
+from intent2.projection import project_pos, project_ds, clear_bilingual_alignments, clear_pos_tags
+from intent2.serialize.consts import GLOSS_SUBWORD_ID, GLOSS_WORD_ID
+from intent2.serialize.exporters import instance_to_xigt, xigt_add_bilingual_alignment, xigt_add_pos, \
+    xigt_add_dependencies, add_timestamp, ExportContext
+from intent2.serialize.importers import parse_xigt_corpus
+from intent2.symbols import SymbolTable
+import intent2.processing
+from intent2.utils.pos_tags import get_lg_tag
+from intent2.utils.profiling import profile_stage
+from intent2.utils.visualization import alignment_to_png
+
+import logging
+ENRICH_LOG = logging.getLogger('enrich')
+
+# The most gloss part analyses kept across the chunks of
+# a stream (or by a worker process), so that memory use does
+# not grow with the vocabulary of the corpus.
+MAX_SHARED_GLOSS_PARTS = 100000
+
+
+class EnrichStats(object):
+    """
+    The counts and evaluation metrics gathered
+    over the course of enrichment.
+    """
+    def __init__(self):
+        self.instances = 0
+        self.align_count = 0
+        self.pos_project_count = 0
+        self.ds_project_count = 0
+
+        # The use of the translation cache by worker processes
+        # (entries is the latest count, as the file is shared).
+        self.trans_cache_hits = 0
+        self.trans_cache_misses = 0
+        self.trans_cache_entries = None
+
+        # Counters for alignment and POS eval.
+        self.aln_eval = PRFEval()
+        self.lg_pos_eval = PRFEval()
+        self.t_pos_eval = PRFEval()
+
+    def merge(self, other):
+        """
+        Add the counts from another set of stats to these.
+
+        :type other: EnrichStats
+        """
+        self.instances += other.instances
+        self.align_count += other.align_count
+        self.pos_project_count += other.pos_project_count
+        self.ds_project_count += other.ds_project_count
+        self.trans_cache_hits += other.trans_cache_hits
+        self.trans_cache_misses += other.trans_cache_misses
+        if other.trans_cache_entries is not None:
+            self.trans_cache_entries = other.trans_cache_entries
+        self.aln_eval.merge(other.aln_eval)
+        self.lg_pos_eval.merge(other.lg_pos_eval)
+        self.t_pos_eval.merge(other.t_pos_eval)
+
+
+def enrich_instance(inst: Instance, args: Namespace, stats: EnrichStats,
+                    pos_classifier: LRWrapper = None,
+                    gloss_table: GlossPartTable = None, timestamp: str = None) -> Igt:
+    """
+    Enrich a single instance, and return the Xigt
+    representation of the enriched instance.
+
+    :param args: The options given to the "intent" script.
+    :param stats: The counts and evaluations to update.
+    :param timestamp: The creation time to record on the added
+                      tiers (see ExportContext).
+    """
+    stats.instances += 1
+
+    # Add the initial, "clean" instance to the new corpus.
+    with profile_stage('export'):
+        new_xigt_inst = instance_to_xigt(inst)
+        context = ExportContext(new_xigt_inst, timestamp)
+
+    # Save the existing alignments and POS tags from L/G lines
+    # in order to compare later. (If the translation line has
+    # already been processed, its tags are our own, so keep them;
+    # the tags it was imported with were saved when it was processed.)
+    trans_processed = bool(inst.trans) and hasattr(inst.trans, '_processed')
+    old_alignments = inst.trans.alignments
+    old_lg_tags = [get_lg_tag(gw) for gw in inst.gloss]
+    old_trans_tags = gold_trans_tags(inst.trans) if inst.trans else []
+    clear_pos_tags(inst.lang)
+    clear_pos_tags(inst.gloss)
+    if not trans_processed:
+        clear_pos_tags(inst.trans)
+    clear_bilingual_alignments(inst)
+
+    # Classify the gloss line:
+    if pos_classifier:
+        ENRICH_LOG.debug('Using classifier for POS tags on instance {}'.format(inst.id))
+        # TODO: ENSURE PROJECTED INFO IS ADDED WHEN REQUESTED
+        with profile_stage('classify'):
+            gloss_class_tags = pos_classifier.classify(inst.gloss, projected_tags=True, subword_tags=True, use_vocab=True)
+        for gw, tag in zip(inst.gloss, gloss_class_tags):
+            gw.pos = tag
+        with profile_stage('export'):
+            xigt_add_pos(new_xigt_inst, inst.gloss, inst.gloss.id, 'classifier', context=context)
+        clear_pos_tags(inst.gloss)
+
+    # Process the translation line, if it is present.
+    if inst.trans:
+        with profile_stage('spacy'):
+            process_trans_if_needed(inst)
+        with profile_stage('export'):
+            xigt_add_pos(new_xigt_inst, inst.trans, inst.trans.id, 'spacy', context=context)
+            xigt_add_dependencies(new_xigt_inst, inst.trans, 'spacy', context=context)
+
+    # -------------------------------------------
+    # All the following tasks require a translation
+    # translation line, starting with
+    # heuristic alignment.
+    # -------------------------------------------
+        try:
+            if not args.no_align:
+                with profile_stage('align'):
+                    alignments = heuristic_alignment(inst, gloss_table=gloss_table)
+                if alignments:
+                    if args.aln_pngs:
+                        os.makedirs(args.aln_pngs, exist_ok=True)
+                        aln_png_path = os.path.join(args.aln_pngs, '{}_aln.png'.format(inst.id))
+                        alignment_to_png(inst, aln_png_path)
+                    stats.align_count += 1
+                    with profile_stage('export'):
+                        xigt_add_bilingual_alignment(new_xigt_inst, inst.trans, 'heuristic', context=context)
+
+            # Perform alignment evaluation
+            if old_alignments and inst.trans.alignments:
+                eval_bilingual_alignments(inst, old_alignments, stats.aln_eval)
+
+        except AlignException as ae:
+            ENRICH_LOG.warning('Alignment failed for instance "{}": {}'.format(inst.id, ae))
+
+        # -------------------------------------------
+        # Projection tasks
+        #     Only try projection if there is alignment.
+        # -------------------------------------------
+        if inst.trans.alignments:
+
+            # -- A) Attempt POS tag projection
+            if not args.no_posproject:
+                with profile_stage('project_pos'):
+                    project_pos(inst)
+                with profile_stage('export'):
+                    xigt_add_pos(new_xigt_inst, inst.gloss.subwords, GLOSS_SUBWORD_ID, 'project', context=context)
+                    xigt_add_pos(new_xigt_inst, inst.gloss, GLOSS_WORD_ID, 'project', context=context)
+                stats.pos_project_count += 1
+
+            # -- B) Attempt dependency projection
+            if not args.no_dsproject:
+                try:
+                    with profile_stage('project_ds'):
+                        project_ds(inst)
+                    with profile_stage('export'):
+                        xigt_add_dependencies(new_xigt_inst, inst.lang, 'project', context=context)
+                    stats.ds_project_count += 1
+                except DependencyException as de:
+                    ENRICH_LOG.warning('Error in projecting dependency for instance "{}": {}'.format(inst.id, de))
+
+        # Perform POS tag evaluation
+        if old_lg_tags:
+            eval_pos(old_lg_tags, [get_lg_tag(gw) for gw in inst.gloss], stats.lg_pos_eval)
+        if old_trans_tags:
+            eval_pos(old_trans_tags, inst.trans.tags, stats.t_pos_eval)
+
+        # Attempt to save dependency structures
+        # into the specified directory.
+        if args.ds_pngs:
+            os.makedirs(args.ds_pngs, exist_ok=True)
+            if inst.trans and inst.trans.dependency_structure:
+                trans_ds_filename = '{}_trans_ds.png'.format(inst.id)
+                trans_ds_path = os.path.join(args.ds_pngs, trans_ds_filename)
+                inst.trans.dependency_structure.save_png(trans_ds_path)
+            if inst.lang and inst.lang.dependency_structure:
+                lang_ds_filename = '{}_lang_ds.png'.format(inst.id)
+                lang_ds_path = os.path.join(args.ds_pngs, lang_ds_filename)
+                inst.lang.dependency_structure.save_png(lang_ds_path)
+
+    with profile_stage('export'):
+        new_xigt_inst.sort_tiers()
+    return new_xigt_inst
+
+
+def enrich_corpus(corp: Iterable[Instance], args: Namespace, stats: EnrichStats,
+                  pos_classifier: LRWrapper = None, release: bool = False) -> Iterator[Igt]:
+    """
+    Enrich each of the instances in a corpus in turn,
+    yielding the enriched Xigt instances in the same order.
+
+    :param release: Whether to release each instance (see Instance.release)
+                    once it has been enriched, if the corpus will not be
+                    used afterwards.
+    """
+    corp = list(corp)
+    timestamp = add_timestamp()
+
+    # Analyze the gloss parts of the whole corpus at once for alignment.
+    gloss_table = None
+    if not args.no_align:
+        with profile_stage('spacy'):
+            gloss_table = GlossPartTable.from_instances(corp)
+
+    for inst in corp:
+        new_xigt_inst = enrich_instance(inst, args, stats,
+                                        pos_classifier=pos_classifier,
+                                        gloss_table=gloss_table,
+                                        timestamp=timestamp)
+        if release:
+            inst.release()
+        yield new_xigt_inst
+
+
+def _chunk(items: Iterable, chunk_size: int) -> Iterator[list]:
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def enrich_xigt_stream(xc: Iterable[Igt], args: Namespace, stats: EnrichStats,
+                       pos_classifier: LRWrapper = None, chunk_size: int = 100) -> Iterator[Igt]:
+    """
+    Parse and enrich the Xigt instances a chunk at a time, yielding
+    the enriched instances in the same order as the input.
+
+    Only one chunk of instances is held in memory at once, so
+    memory use stays flat when the input is read lazily
+    (e.g. with intent2.serialize.streaming.iterparse_igts).
+    """
+    # The gloss part analyses are kept across chunks (up to a limit),
+    # since the same glosses recur throughout a corpus.
+    gloss_table = GlossPartTable(max_entries=MAX_SHARED_GLOSS_PARTS) if not args.no_align else None
+    timestamp = add_timestamp()
+
+    igt_chunks = _chunk(xc, chunk_size)
+    while True:
+        # Reading the input happens lazily, as each chunk is requested.
+        with profile_stage('load'):
+            igt_chunk = next(igt_chunks, None)
+        if igt_chunk is None:
+            break
+
+        # Each chunk's strings are interned in a table of its own,
+        # which is freed along with the chunk.
+        symbols = SymbolTable()
+        with profile_stage('import'):
+            corp = parse_xigt_corpus(igt_chunk, ignore_import_errors=args.ignore_import_errors, symbols=symbols)
+        with profile_stage('spacy'):
+            process_corpus_trans(corp, batch_size=args.spacy_batch_size, n_threads=args.spacy_threads,
+                                 symbols=symbols)
+            if gloss_table is not None:
+                gloss_table.add_instances(corp)
+
+        for inst in corp:
+            new_xigt_inst = enrich_instance(inst, args, stats,
+                                            pos_classifier=pos_classifier,
+                                            gloss_table=gloss_table,
+                                            timestamp=timestamp)
+            inst.release()
+            yield new_xigt_inst
+
+
+# -------------------------------------------
+# Multi-process enrichment
+# -------------------------------------------
+# The state loaded once by each worker process.
+_WORKER = {}
+
+def _init_worker(args: Namespace, timestamp: str):
+    """
+    Load the models needed for enrichment once per worker process.
+
+    :param timestamp: The creation time of the run, shared by the workers.
+    """
+    load_spacy(PROFILE_PARSE)
+    if not args.no_align:
+        load_spacy(PROFILE_LEMMA)
+    if args.trans_cache:
+        # Commit every write, so the workers don't hold
+        # the cache locked from one another.
+        load_trans_cache(args.trans_cache, max_entries=args.trans_cache_size, commit_every=1)
+
+    _WORKER['args'] = args
+    _WORKER['timestamp'] = timestamp
+    _WORKER['pos_classifier'] = None if not args.classifier else LRWrapper.load(args.classifier)
+    _WORKER['gloss_table'] = GlossPartTable(max_entries=MAX_SHARED_GLOSS_PARTS) if not args.no_align else None
+
+
+def _enrich_chunk(igt_strings: List[str]) -> Tuple[str, EnrichStats]:
+    """
+    Parse and enrich a chunk of serialized Xigt instances, returning the
+    serialized enriched instances, and the stats for the chunk.
+    """
+    args = _WORKER['args']
+    gloss_table = _WORKER['gloss_table']
+
+    trans_cache = intent2.processing.TRANS_CACHE
+    if trans_cache is not None:
+        hits, misses = trans_cache.hits, trans_cache.misses
+
+    # (The chunk's strings are interned in a table of its own, as for --stream.)
+    symbols = SymbolTable()
+    xc = xigt.codecs.xigtxml.loads('<xigt-corpus>{}</xigt-corpus>'.format(''.join(igt_strings)))
+    corp = parse_xigt_corpus(xc, ignore_import_errors=args.ignore_import_errors, symbols=symbols)
+    process_corpus_trans(corp, batch_size=args.spacy_batch_size, symbols=symbols)
+    if gloss_table is not None:
+        gloss_table.add_instances(corp)
+
+    stats = EnrichStats()
+    if trans_cache is not None:
+        stats.trans_cache_hits = trans_cache.hits - hits
+        stats.trans_cache_misses = trans_cache.misses - misses
+        stats.trans_cache_entries = len(trans_cache)
+    new_igts = []
+    for inst in corp:
+        new_igts.append(enrich_instance(inst, args, stats,
+                                        pos_classifier=_WORKER['pos_classifier'],
+                                        gloss_table=gloss_table,
+                                        timestamp=_WORKER['timestamp']))
+        inst.release()
+    return xigt.codecs.xigtxml.dumps(XigtCorpus(igts=new_igts), indent=None), stats
+
+
+def _chunk_igts(xc: Iterable[Igt], chunk_size: int) -> Iterator[List[str]]:
+    for igt_chunk in _chunk(xc, chunk_size):
+        yield [xigt.codecs.xigtxml.encode_igt(igt, indent=None) for igt in igt_chunk]
+
+
+def enrich_xigt_parallel(xc: Iterable[Igt], args: Namespace, stats: EnrichStats,
+                         workers: int, chunk_size: int = 100) -> Iterator[Igt]:
+    """
+    Parse and enrich the Xigt instances across a pool of worker
+    processes, each of which loads the models once and handles
+    chunks of instances.
+
+    The enriched instances are yielded in the same order as the input,
+    and the stats of each chunk are merged into the given stats.
+    At most two chunks per worker are read ahead of the output, so
+    a lazily-read input is never pulled into memory all at once.
+    """
+    max_pending = 2 * workers
+    with Pool(workers, initializer=_init_worker, initargs=(args, add_timestamp())) as pool:
+        pending = deque()
+
+        def finish_oldest():
+            chunk_xml, chunk_stats = pending.popleft().get()
+            stats.merge(chunk_stats)
+            return xigt.codecs.xigtxml.loads(chunk_xml)
+
+        for igt_strings in _chunk_igts(xc, chunk_size):
+            pending.append(pool.apply_async(_enrich_chunk, (igt_strings,)))
+            if len(pending) >= max_pending:
+                yield from finish_oldest()
+
+        while pending:
+            yield from finish_oldest()
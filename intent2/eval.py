@@ -2,7 +2,7 @@
 Use this for evaluating different aspects of intent
 """
 from collections import defaultdict
-from typing import Set, Tuple
+from typing import Set, Tuple, Union
 
 from sklearn.metrics import confusion_matrix, classification_report
 
@@ -78,6 +78,21 @@ class PRFEval(object):
             ret_str += format_str.format(s, val)
         return ret_str
 
+    def merge(self, other):
+        """
+        Add the counts of another evaluation to this one.
+
+        :type other: PRFEval
+        """
+        self.matches += other.matches
+        self.system_counts += other.system_counts
+        self.gold_counts += other.gold_counts
+        self.compares += other.compares
+        self.instances += other.instances
+        self.true.extend(other.true)
+        self.pred.extend(other.pred)
+        self.labels |= other.labels
+
     def __bool__(self):
         return self.instances != 0
 
@@ -90,9 +105,14 @@ def eval_bilingual_alignments(inst: Instance, aln_gold, count_dict: PRFEval):
     Given two sets of alignments,
 
     :type aln_hyp: Set[Tuple[AlignableMixin,AlignableMixin]]
-    :type aln_gold: Set[Tuple[AlignableMixin,AlignableMixin]]
+    :param aln_gold: The gold alignments, as pairs of tokens, or of
+                     the IDs of tokens in the instance.
+    :type aln_gold: Set[Tuple[Union[AlignableMixin, str], Union[AlignableMixin, str]]]
     :return:
     """
+    aln_gold = {tuple(inst.by_id(token) if isinstance(token, str) else token
+                      for token in pair)
+                for pair in aln_gold}
 
     # First, check to see if the gold alignment is supplying
     # Words as alignment objects or Glosses.
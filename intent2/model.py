@@ -1,9 +1,13 @@
 import re
-import sys
+import weakref
+from array import array
 import unittest
-from collections import defaultdict
-from typing import Generator, Iterable, Iterator, Union, ByteString, Set, List
+from collections import defaultdict, deque, namedtuple
+from typing import Generator, Iterable, Iterator, Union, ByteString, Set, List, Dict, FrozenSet, Tuple
 import logging
+
+from intent2.symbols import SymbolTable, SYMBOLS, NO_SYMBOL
+from intent2.vectors import VECTORS, NO_VECTOR_ROW
 DS_LOG = logging.getLogger('dependencies')
 
 
@@ -12,6 +16,304 @@ class DependencyException(Exception): pass
 
 
 
+# -------------------------------------------
+# Alignment Graph
+# -------------------------------------------
+# The lines of an instance, for typing alignment edges.
+LANG_LINE = 'lang'
+GLOSS_LINE = 'gloss'
+TRANS_LINE = 'trans'
+
+def token_line(token) -> str:
+    """
+    Return which line of an instance a word or subword
+    belongs to, or None if it is not a line-specific token.
+    """
+    word = token
+    if isinstance(token, SubWord):
+        word = getattr(token, '_word', None)
+    if isinstance(word, LangWord):
+        return LANG_LINE
+    elif isinstance(word, GlossWord):
+        return GLOSS_LINE
+    elif isinstance(word, TransWord):
+        return TRANS_LINE
+    return None
+
+
+# The neighbours of a node that has no alignments. Nodes only get a
+# set of their own once they are aligned, since most tokens never are.
+NO_NEIGHBOURS = frozenset()
+
+# Shared one-node neighbour sets, by node number, for the many
+# nodes with just one alignment. Like NO_NEIGHBOURS, they are
+# replaced by a set of the node's own when it gets another.
+_SINGLE_NEIGHBOURS = []  # type: List[FrozenSet[int]]
+
+def _single_neighbour(node: int) -> FrozenSet[int]:
+    while len(_SINGLE_NEIGHBOURS) <= node:
+        _SINGLE_NEIGHBOURS.append(frozenset([len(_SINGLE_NEIGHBOURS)]))
+    return _SINGLE_NEIGHBOURS[node]
+
+
+class AlignmentGraph(object):
+    """
+    The alignments between the words and subwords of an instance.
+
+    Each token is a node, numbered in the order it was added, and the
+    alignments are stored as sets of neighbouring node numbers (shared,
+    for nodes with no alignments or just one). The graph only holds weak
+    references to its tokens, which hold the graph, so that the tokens
+    and their graph do not form a reference cycle. Edges are
+    typed by the lines of the tokens they join (see token_line), so that
+    e.g. just the trans--gloss alignments can be retrieved.
+
+    Aligned tokens always share a graph: aligning tokens from two graphs
+    merges the smaller graph into the larger. The trans-to-lang alignments
+    (see TransWord.aligned_lang_words) are cached until the graph changes.
+    """
+    def __init__(self):
+        self._tokens = []  # type: List[weakref.ref]
+        self._adjacency = []  # type: List[Union[Set[int], FrozenSet[int]]]
+        self._num_edges = 0
+        self._lang_closure = {}  # type: Dict[int, FrozenSet[int]]
+
+    @classmethod
+    def joining(cls, tokens: Iterable):
+        """
+        Return a single graph containing all of the given
+        tokens, and any tokens they are already aligned with.
+
+        :rtype: AlignmentGraph
+        """
+        tokens = list(tokens)
+        graphs = {id(g): g for g in (getattr(t, '_graph', None) for t in tokens) if g is not None}
+        graph = max(graphs.values(), key=len) if graphs else cls()
+        for token in tokens:
+            graph.node(token)
+        return graph
+
+    @classmethod
+    def from_edges(cls, tokens: List, edges: Iterable[Tuple[int, int]]):
+        """
+        Return a new graph of the given tokens, none of which may
+        belong to a graph yet, with an alignment for each pair of
+        positions in edges.
+
+        :rtype: AlignmentGraph
+        """
+        graph = cls()
+        for node, token in enumerate(tokens):
+            token._graph, token._node = graph, node
+        graph._tokens = [weakref.ref(token) for token in tokens]
+
+        # Add the edges as _add_edge does, inlined since this is
+        # how whole corpora are loaded (see intent2.serialize.snapshot).
+        adjacency = graph._adjacency = [NO_NEIGHBOURS] * len(tokens)
+        if tokens:
+            _single_neighbour(len(tokens) - 1)
+        for a, b in edges:
+            if b in adjacency[a]:
+                continue
+            for node, neighbour in ((a, b), (b, a)):
+                neighbours = adjacency[node]
+                if not neighbours:
+                    adjacency[node] = _SINGLE_NEIGHBOURS[neighbour]
+                elif type(neighbours) is set:
+                    neighbours.add(neighbour)
+                else:
+                    adjacency[node] = {*neighbours, neighbour}
+            graph._num_edges += 1
+        return graph
+
+    @classmethod
+    def linking(cls, a, b):
+        """
+        Return the graph that a and b should share,
+        merging their current graphs if need be.
+
+        :rtype: AlignmentGraph
+        """
+        graph_a, graph_b = getattr(a, '_graph', None), getattr(b, '_graph', None)
+        if graph_a is None and graph_b is None:
+            return cls()
+        elif graph_a is None or graph_b is None:
+            return graph_a or graph_b
+        elif len(graph_a) >= len(graph_b):
+            graph_a.merge(graph_b)
+            return graph_a
+        else:
+            graph_b.merge(graph_a)
+            return graph_b
+
+    def __len__(self):
+        """
+        The number of tokens in the graph.
+        """
+        return len(self._tokens)
+
+    @property
+    def num_edges(self) -> int: return self._num_edges
+
+    @staticmethod
+    def _live_tokens(refs: Iterable[weakref.ref]) -> Iterator:
+        """
+        The tokens still referred to by the refs (those
+        that have not been freed since they were added).
+        """
+        for ref in refs:
+            token = ref()
+            if token is not None:
+                yield token
+
+    def _changed(self):
+        if self._lang_closure:
+            self._lang_closure = {}
+
+    def node(self, token) -> int:
+        """
+        Return the node number of the token, adding the token
+        (and any graph it already belongs to) if needed.
+        """
+        graph = getattr(token, '_graph', None)
+        if graph is None:
+            token._graph = self
+            token._node = len(self._tokens)
+            self._tokens.append(weakref.ref(token))
+            self._adjacency.append(NO_NEIGHBOURS)
+        elif graph is not self:
+            self.merge(graph)
+        return token._node
+
+    def merge(self, other):
+        """
+        Move the tokens and alignments of another graph into this one,
+        leaving the other graph empty.
+
+        :type other: AlignmentGraph
+        """
+        if other is self:
+            return
+        offset = len(self._tokens)
+        for token in other._live_tokens(other._tokens):
+            token._graph = self
+            token._node += offset
+        self._tokens.extend(other._tokens)
+        self._adjacency.extend({n + offset for n in neighbours} if neighbours else NO_NEIGHBOURS
+                               for neighbours in other._adjacency)
+        self._num_edges += other._num_edges
+        self._changed()
+        other.__init__()
+
+    def _add_edge(self, node_a: int, node_b: int) -> bool:
+        adjacency = self._adjacency
+        if node_b in adjacency[node_a]:
+            return False
+        for node, neighbour in ((node_a, node_b), (node_b, node_a)):
+            neighbours = adjacency[node]
+            if not neighbours:
+                adjacency[node] = _single_neighbour(neighbour)
+            elif type(neighbours) is set:
+                neighbours.add(neighbour)
+            else:
+                adjacency[node] = {*neighbours, neighbour}
+        self._num_edges += 1
+        return True
+
+    def add_edge(self, a, b):
+        if self._add_edge(self.node(a), self.node(b)):
+            self._changed()
+
+    def remove_edge(self, a, b):
+        if getattr(a, '_graph', None) is not self or getattr(b, '_graph', None) is not self:
+            return
+        adjacency = self._adjacency
+        if b._node in adjacency[a._node]:
+            for node, neighbour in ((a._node, b._node), (b._node, a._node)):
+                neighbours = adjacency[node]
+                # (Only a node's own set holds more than one neighbour.)
+                if len(neighbours) == 1:
+                    adjacency[node] = NO_NEIGHBOURS
+                else:
+                    neighbours.discard(neighbour)
+            self._num_edges -= 1
+            self._changed()
+
+    def has_edge(self, a, b) -> bool:
+        return (getattr(a, '_graph', None) is self and getattr(b, '_graph', None) is self
+                and b._node in self._adjacency[a._node])
+
+    def neighbours(self, token, line: str = None) -> set:
+        """
+        Return the tokens directly aligned with the given
+        token, optionally only those on the given line.
+        """
+        if getattr(token, '_graph', None) is not self:
+            return set([])
+        tokens = self._tokens
+        neighbours = set(self._live_tokens(tokens[n] for n in self._adjacency[token._node]))
+        if line is not None:
+            neighbours = {t for t in neighbours if token_line(t) == line}
+        return neighbours
+
+    def edges(self, src_line: str = None, tgt_line: str = None) -> Iterator[Tuple]:
+        """
+        Iterate over the alignments as (source, target) token pairs,
+        optionally only those from a token on src_line to one on tgt_line.
+        Each alignment is returned once.
+        """
+        tokens = [ref() for ref in self._tokens]
+        lines = [token_line(t) for t in tokens]
+
+        def matches(src, tgt):
+            return ((src_line is None or lines[src] == src_line) and
+                    (tgt_line is None or lines[tgt] == tgt_line))
+
+        for src, neighbours in enumerate(self._adjacency):
+            for tgt in neighbours:
+                # Skip the reversed copy of an edge that
+                # would match in both directions.
+                if matches(src, tgt) and not (tgt < src and matches(tgt, src)):
+                    if tokens[src] is not None and tokens[tgt] is not None:
+                        yield tokens[src], tokens[tgt]
+
+    def _aligned_words(self, word) -> Set:
+        """
+        The words aligned with a word or any of its subwords.
+        """
+        tokens, adjacency = self._tokens, self._adjacency
+        nodes = [word._node] + [sw._node for sw in word.subwords if getattr(sw, '_graph', None) is self]
+        aligned = set([])
+        for node in nodes:
+            for aligned_item in self._live_tokens(tokens[n] for n in adjacency[node]):
+                aligned.add(aligned_item.word if isinstance(aligned_item, SubWord) else aligned_item)
+        return aligned
+
+    def aligned_lang_words(self, word) -> FrozenSet:
+        """
+        Return the lang words aligned with a word either directly,
+        or through the gloss words or morphemes it is aligned with.
+
+        :rtype: FrozenSet[LangWord]
+        """
+        if getattr(word, '_graph', None) is not self:
+            return frozenset()
+
+        # The closure is cached by node number, rather than
+        # holding the words themselves.
+        closure = self._lang_closure.get(word._node)
+        if closure is None:
+            lang_words = set([])
+            for aligned_word in self._aligned_words(word):
+                if isinstance(aligned_word, LangWord):
+                    lang_words.add(aligned_word)
+                elif getattr(aligned_word, '_graph', None) is self:
+                    lang_words |= {w for w in self._aligned_words(aligned_word) if isinstance(w, LangWord)}
+            self._lang_closure[word._node] = frozenset(w._node for w in lang_words)
+            return frozenset(lang_words)
+        return frozenset(self._live_tokens(self._tokens[n] for n in closure))
+
+
 # -------------------------------------------
 # MIXINS
 # -------------------------------------------
@@ -19,31 +321,56 @@ class AlignableMixin(object):
     """
     A mixin for items that can be aligned with
     another thing.
+
+    The alignments themselves are stored in
+    the AlignmentGraph the item belongs to.
     """
+    __slots__ = ()
+
+    @property
+    def alignment_graph(self):
+        """:rtype: AlignmentGraph"""
+        return getattr(self, '_graph', None)
+
     @property
     def alignments(self):
         """
         :rtype: Set[Union[Word,SubWord]]
         """
-        alns = getattr(self, '_alignment', set([]))
+        graph = getattr(self, '_graph', None)
+        alns = graph.neighbours(self) if graph is not None else set([])
         # Also include alignments of subwords if this is a word
         if isinstance(self, Word):
             for sw in self.subwords:
-                alns |= sw.alignments
+                sw_graph = getattr(sw, '_graph', None)
+                if sw_graph is not None:
+                    alns |= sw_graph.neighbours(sw)
         return alns
 
     @alignments.setter
-    def alignments(self, val): setattr(self, '_alignment', val)
+    def alignments(self, val):
+        graph = getattr(self, '_graph', None)
+        current = graph.neighbours(self) if graph is not None else set([])
+        for other in current - set(val):
+            self.remove_alignment(other)
+        for other in set(val) - current:
+            self.add_alignment(other)
 
     def add_alignment(self, other):
         assert isinstance(other, AlignableMixin)
-        self.alignments |= {other}
-        other.alignments |= {self}
+        AlignmentGraph.linking(self, other).add_edge(self, other)
 
     def remove_alignment(self, other):
         assert isinstance(other, AlignableMixin)
-        self.alignments -= {other}
-        other.alignments -= {self}
+        graph = getattr(self, '_graph', None)
+        if graph is None:
+            return
+        graph.remove_edge(self, other)
+        # Alignments reported for a word include those
+        # of its subwords, so remove those too.
+        if isinstance(self, Word):
+            for sw in self.subwords:
+                graph.remove_edge(sw, other)
 
     def aligned_words(self, word_type: type=None):
         """
@@ -61,6 +388,8 @@ class AlignableMixin(object):
         return alignments
 
 class IdMixin(object):
+    __slots__ = ()
+
     @property
     def id(self): return getattr(self, '_id', None)
 
@@ -68,6 +397,8 @@ class IdMixin(object):
     def id(self, val): setattr(self, '_id', val)
 
 class IndexableMixin(object):
+    __slots__ = ()
+
     @property
     def index(self): return getattr(self, '_index', None)
 
@@ -79,6 +410,8 @@ class TaggableMixin(object):
     A mixin for items that can have POS tags
     associated with them.
     """
+    __slots__ = ()
+
     @property
     def pos(self): return getattr(self, '_pos', None)
 
@@ -90,6 +423,8 @@ class GlossableMixin(object):
     A mixin for items that can have glosses associated with
     them
     """
+    __slots__ = ()
+
     @property
     def gloss(self): return getattr(self, '_gloss', None)
 
@@ -109,6 +444,9 @@ class DependencyStructure(set):
         self._child_map = defaultdict(set)
         self._roots = set([]) # type: set[Word]
         self._words = set([]) # type: set[Word]
+        self._sorted_words = None # type: List[Word]
+        self._word_depths = None # type: Dict[Word, int]
+        self._cycles = None # type: List[FrozenSet[Word]]
         for link in links:
             self.add(link)
 
@@ -118,14 +456,12 @@ class DependencyStructure(set):
 
     def copy(self):
         """
+        Links are never modified once made (they are replaced
+        instead), so the copy shares them with this structure.
+
         :rtype: DependencyStructure
         """
-        new_ds = DependencyStructure()
-        for old_link in self: # type: DependencyLink
-            new_ds.add(DependencyLink(child=old_link.child,
-                                      parent=old_link.parent,
-                                      link_type=old_link.type))
-        return new_ds
+        return DependencyStructure(self)
 
     def add(self, link):
         """
@@ -143,35 +479,111 @@ class DependencyStructure(set):
         """:rtype: set[Word]"""
         return self._roots
 
-    def depth(self, link, seen_links = None):
+    def _child_words(self, word):
+        return [link.child for link in self._head_map.get(word, ())]
+
+    @property
+    def word_depths(self):
+        """
+        The minimum number of links between each word and a root,
+        found with a breadth-first search down from the roots. Words
+        that no root reaches (e.g. those only in a cycle) are absent.
+
+        The result is kept until a link is added or removed.
+
+        :rtype: Dict[Word, int]
+        """
+        if self._word_depths is None:
+            depths = {root: 0 for root in self._roots}
+            queue = deque(self._roots)
+            while queue:
+                word = queue.popleft()
+                child_depth = depths[word] + 1
+                for child in self._child_words(word):
+                    if child not in depths:
+                        depths[child] = child_depth
+                        queue.append(child)
+            self._word_depths = depths
+        return self._word_depths
+
+    def word_depth(self, word):
         """
-        Return the number of links between this link and a root.
+        Return the minimum number of links between the word
+        and a root, or None if no root reaches it.
+
+        :type word: Word
+        :rtype: int
+        """
+        return self.word_depths.get(word)
+
+    def depth(self, link):
+        """
+        Return the number of links between this link and a root,
+        or None if no root reaches it.
 
         :type link: DependencyLink
         :rtype: int
         """
-        if seen_links is None:
-            seen_links = set([])
         if link.parent is None:
             return 0
-        else:
-            parent_links = self.get_parent_links(link.parent)
-            filtered_links = {parent_link for parent_link in parent_links if parent_link not in seen_links}
-            if not filtered_links:
-                # TODO: Better cycle handling
-                raise DependencyException('Cycle found in "{} [{}] -> {} [{}]"'.format(link.child,
-                                                                                       link.child.id,
-                                                                                       link.parent,
-                                                                                       link.parent.id))
-            else:
-                min_depth = sys.maxsize
-                for parent_link in filtered_links:
-                    try:
-                        min_depth = min(min_depth, self.depth(parent_link, seen_links=seen_links | parent_links))
-                    except DependencyException as de:
-                        DS_LOG.info(de)
-                        pass
-                return min_depth
+        parent_depth = self.word_depths.get(link.parent)
+        return None if parent_depth is None else parent_depth + 1
+
+    @property
+    def cycles(self):
+        """
+        The sets of words that form cycles in the structure (the strongly
+        connected components with more than one word, or with a word that
+        is its own parent), found with Tarjan's algorithm.
+
+        The result is kept until a link is added or removed.
+
+        :rtype: List[FrozenSet[Word]]
+        """
+        if self._cycles is not None:
+            return self._cycles
+
+        cycles = []
+        order, lowlink = {}, {}
+        stack, on_stack = [], set([])
+
+        def visit(word):
+            order[word] = lowlink[word] = len(order)
+            stack.append(word)
+            on_stack.add(word)
+
+        for start in self._words:
+            if start in order:
+                continue
+            visit(start)
+            work = [(start, iter(self._child_words(start)))]
+            while work:
+                word, children = work[-1]
+                for child in children:
+                    if child not in order:
+                        visit(child)
+                        work.append((child, iter(self._child_words(child))))
+                        break
+                    elif child in on_stack:
+                        lowlink[word] = min(lowlink[word], order[child])
+                else:
+                    work.pop()
+                    if work:
+                        parent = work[-1][0]
+                        lowlink[parent] = min(lowlink[parent], lowlink[word])
+                    if lowlink[word] == order[word]:
+                        component = set([])
+                        while True:
+                            member = stack.pop()
+                            on_stack.remove(member)
+                            component.add(member)
+                            if member is word:
+                                break
+                        if len(component) > 1 or word in self._child_words(word):
+                            cycles.append(frozenset(component))
+
+        self._cycles = cycles
+        return cycles
 
 
     def remove_word(self, word, promote=True):
@@ -220,7 +632,13 @@ class DependencyStructure(set):
             self.add(new_link)
 
 
+    def _invalidate(self):
+        self._sorted_words = None
+        self._word_depths = None
+        self._cycles = None
+
     def _add_extra(self, link):
+        self._invalidate()
         self._child_map[link.child].add(link)
         self._head_map[link.parent].add(link)
         if link.parent is None:
@@ -230,6 +648,7 @@ class DependencyStructure(set):
         self._words.add(link.child)
 
     def _remove_extra(self, link):
+        self._invalidate()
         self._child_map[link.child].remove(link)
         self._head_map[link.parent].remove(link)
         if link.parent is None:
@@ -242,7 +661,15 @@ class DependencyStructure(set):
 
     @property
     def words(self):
-        return sorted(self._words, key=lambda word: word.index)
+        """
+        The words in the structure, in order. The sorted list is kept
+        until a link is added or removed, and should not be modified.
+
+        :rtype: List[Word]
+        """
+        if self._sorted_words is None:
+            self._sorted_words = sorted(self._words, key=lambda word: word.index)
+        return self._sorted_words
 
     def __or__(self, other):
         for link in other:
@@ -336,6 +763,183 @@ class DependencyStructure(set):
         with open(filename, 'wb') as img_f:
             img_f.write(self.draw())
 
+# Head indices in a DependencyArray for words that are
+# roots, and for words that are not in the structure.
+ROOT_HEAD = -1
+NO_HEAD = -2
+
+class DependencyArray(object):
+    """
+    A single-headed dependency structure over the words of a phrase,
+    stored as the index of each word's head and the symbol id of
+    its label, in arrays indexed by word position.
+
+    Copies share their arrays until one of them is modified. The
+    phrase is held weakly, as the phrase holds its structure.
+    """
+    __slots__ = ('_phrase_ref', '_heads', '_labels', '_symbols', '_shared', '_children')
+
+    def __init__(self, phrase, heads: Iterable[int] = None, labels: Iterable[int] = None,
+                 symbols: SymbolTable = None):
+        """
+        :type phrase: Phrase
+        :param heads: The head index of each word (or ROOT_HEAD or NO_HEAD).
+        :param labels: The symbol id of the label of each word's link.
+        """
+        self._phrase = phrase
+        self._symbols = SYMBOLS if symbols is None else symbols
+        self._heads = array('i', [NO_HEAD]) * len(phrase) if heads is None else array('i', heads)
+        self._labels = array('i', [NO_SYMBOL]) * len(phrase) if labels is None else array('i', labels)
+        assert len(self._heads) == len(self._labels) == len(phrase)
+        self._shared = False
+        self._children = None # type: List[List[int]]
+
+    @property
+    def _phrase(self):
+        """:rtype: Phrase"""
+        return self._phrase_ref()
+
+    @_phrase.setter
+    def _phrase(self, phrase):
+        self._phrase_ref = weakref.ref(phrase)
+
+    @classmethod
+    def from_analysis(cls, phrase, analysis, symbols: SymbolTable = None):
+        """
+        Build the structure from the analysis of a phrase, as
+        returned by intent2.processing.doc_to_analysis. Words that
+        are their own heads become roots, labeled "root".
+
+        :type phrase: Phrase
+        :rtype: DependencyArray
+        """
+        symbols = SYMBOLS if symbols is None else symbols
+        heads = array('i', [ROOT_HEAD if head_i == i else head_i
+                            for i, (pos, lemma, head_i, dep) in enumerate(analysis)])
+        labels = array('i', [symbols.id('root' if head_i == i else dep)
+                             for i, (pos, lemma, head_i, dep) in enumerate(analysis)])
+        return cls(phrase, heads, labels, symbols=symbols)
+
+    @classmethod
+    def from_structure(cls, ds: DependencyStructure, phrase, symbols: SymbolTable = None):
+        """
+        Build the structure from the set-of-links form. Every word in
+        the links must belong to the phrase, and have only one head.
+
+        :type phrase: Phrase
+        :rtype: DependencyArray
+        """
+        da = cls(phrase, symbols=symbols)
+        for link in ds:
+            i = link.child.index
+            if da._heads[i] != NO_HEAD:
+                raise DependencyException('Word "{}" [{}] has more than one head.'.format(link.child, link.child.id))
+            da.set_head(i, ROOT_HEAD if link.parent is None else link.parent.index, link.type)
+        return da
+
+    def to_structure(self) -> DependencyStructure:
+        """
+        Return the set-of-links form of the structure.
+        """
+        return DependencyStructure(self.links())
+
+    def links(self):
+        """
+        Return new links for the structure, in order of their child words.
+
+        :rtype: Iterator[DependencyLink]
+        """
+        phrase, symbol = self._phrase, self._symbols.symbol
+        for i, head in enumerate(self._heads):
+            if head != NO_HEAD:
+                yield DependencyLink(child=phrase[i],
+                                     parent=None if head == ROOT_HEAD else phrase[head],
+                                     link_type=symbol(self._labels[i]))
+
+    def copy(self):
+        """
+        :rtype: DependencyArray
+        """
+        new_da = DependencyArray.__new__(DependencyArray)
+        new_da._phrase_ref, new_da._symbols = self._phrase_ref, self._symbols
+        new_da._heads, new_da._labels = self._heads, self._labels
+        new_da._children = self._children
+        new_da._shared = self._shared = True
+        return new_da
+
+    def _modify(self):
+        """
+        Take a private copy of shared arrays before they are modified.
+        """
+        if self._shared:
+            self._heads = array('i', self._heads)
+            self._labels = array('i', self._labels)
+            self._shared = False
+        self._children = None
+
+    def set_head(self, i: int, head: int, label: str = None):
+        """
+        Attach word i to the word at the head index (or ROOT_HEAD).
+        """
+        self._modify()
+        self._heads[i] = head
+        self._labels[i] = self._symbols.id(label)
+
+    def detach(self, i: int):
+        """
+        Remove word i from the structure.
+        """
+        self._modify()
+        self._heads[i] = NO_HEAD
+        self._labels[i] = NO_SYMBOL
+
+    def head(self, i: int) -> int:
+        return self._heads[i]
+
+    def parent(self, i: int):
+        """
+        :rtype: Word
+        """
+        head = self._heads[i]
+        return None if head < 0 else self._phrase[head]
+
+    def label(self, i: int) -> str:
+        return self._symbols.symbol(self._labels[i])
+
+    def children(self, i: int) -> List[int]:
+        """
+        Return the indices of the words headed by word i.
+        """
+        if self._children is None:
+            children = [[] for head in self._heads]
+            for child, head in enumerate(self._heads):
+                if head >= 0:
+                    children[head].append(child)
+            self._children = children
+        return self._children[i]
+
+    @property
+    def roots(self) -> List[int]:
+        return [i for i, head in enumerate(self._heads) if head == ROOT_HEAD]
+
+    def __iter__(self) -> Iterator[Tuple[int, int, str]]:
+        """
+        Iterate over the (child index, head index, label) of each link.
+        """
+        symbol = self._symbols.symbol
+        return ((i, head, symbol(label)) for i, (head, label) in enumerate(zip(self._heads, self._labels))
+                if head != NO_HEAD)
+
+    def __len__(self):
+        return sum(1 for head in self._heads if head != NO_HEAD)
+
+    def __eq__(self, other):
+        return (isinstance(other, DependencyArray) and
+                self._heads == other._heads and list(self) == list(other))
+
+    def __repr__(self):
+        return 'DependencyArray({})'.format(list(self))
+
 def display_png(png_data):
     from PIL import Image
     from io import BytesIO
@@ -353,27 +957,58 @@ class DependencyMixin(object):
 
     (This is defined to just be a phrase)
     """
+    __slots__ = ()
+
 
     @property
     def dependency_structure(self):
-        """:rtype: DependencyStructure"""
-        return getattr(self, '_ds', None)
+        """
+        The structure in its set-of-links form. If only the array
+        form is held, it is converted, and the links are kept in
+        its place (since they may then be modified).
+
+        :rtype: DependencyStructure
+        """
+        ds = getattr(self, '_ds', None)
+        if ds is None and getattr(self, '_da', None) is not None:
+            ds = self._da.to_structure()
+            self._ds, self._da = ds, None
+        return ds
 
     @dependency_structure.setter
     def dependency_structure(self, val):
         setattr(self, '_ds', val)
+        setattr(self, '_da', None)
+
+    @property
+    def dependency_array(self):
+        """
+        The structure in its array form, if that is the form held.
+
+        :rtype: DependencyArray
+        """
+        return getattr(self, '_da', None)
+
+    @dependency_array.setter
+    def dependency_array(self, val):
+        setattr(self, '_da', val)
+        setattr(self, '_ds', None)
 
 
 class StringMixin(object):
     """
     A mixin for words and subwords
     """
+    __slots__ = ()
+
     @property
     def string(self): return getattr(self, '_string')
 
     def __str__(self): return self.string
 
 class MutableStringMixin(StringMixin):
+    __slots__ = ()
+
     @property
     def string(self) -> str: return getattr(self, '_string')
 
@@ -385,6 +1020,8 @@ class LemmatizableMixin(object):
     """
     A mixin for objects that could be lemmatizable
     """
+    __slots__ = ()
+
     @property
     def lemma(self): return getattr(self, '_lemma')
 
@@ -393,28 +1030,76 @@ class LemmatizableMixin(object):
 
 class VectorMixin(object):
     """
-    A mixin to add a vector representation to objects
+    A mixin to add a vector representation to objects.
+
+    Only the row of the vector in the shared table
+    (intent2.vectors.VECTORS) is kept on each object.
     """
+    __slots__ = ()
+
     @property
-    def vector(self): return getattr(self, '_vector')
+    def vector_row(self) -> int: return getattr(self, '_vector_row', NO_VECTOR_ROW)
+
+    @vector_row.setter
+    def vector_row(self, val: int): setattr(self, '_vector_row', val)
+
+    @property
+    def vector(self):
+        """
+        The vector, as a read-only row of the shared table, or None.
+        Setting it adds it to the table under the object's string,
+        unless the table already holds a vector for that string.
+        """
+        return VECTORS.vector(self.vector_row)
 
     @vector.setter
-    def vector(self, val): setattr(self, '_vector', val)
+    def vector(self, val):
+        self.vector_row = NO_VECTOR_ROW if val is None else VECTORS.add(self.string, val)
+
+# The spaCy analysis of a translation token: its POS and fine-grained
+# tags, lemma, the index of its head in the phrase (its own index if it
+# is the root), its dependency label, and its row in the vectors table
+# of the spaCy vocabulary (or NO_VECTOR_ROW).
+TokenRecord = namedtuple('TokenRecord', ['pos', 'tag', 'lemma', 'head', 'dep', 'vector_row'])
 
 class SpacyTokenMixin(object):
     """
-    A mixin to add a vector representation to objects
+    A mixin for words analyzed with spaCy.
+
+    Only a TokenRecord of the analysis is kept, rather than the spaCy
+    Token, which would keep its whole Doc alive along with it. The
+    Token is recreated from the records of the phrase when asked for.
     """
+    __slots__ = ()
+
     @property
-    def spacy_token(self): return getattr(self, '_spacy_token')
+    def analysis(self):
+        """:rtype: TokenRecord"""
+        return getattr(self, '_analysis', None)
+
+    @analysis.setter
+    def analysis(self, val): setattr(self, '_analysis', val)
+
+    @property
+    def spacy_token(self):
+        """
+        A spaCy Token for this word, rebuilt from the analysis
+        of its phrase (see intent2.processing.rehydrate_doc).
+        """
+        from intent2.processing import rehydrate_token
+        return rehydrate_token(self)
 
     @spacy_token.setter
-    def spacy_token(self, val): setattr(self, '_spacy_token', val)
+    def spacy_token(self, val):
+        from intent2.processing import token_record
+        setattr(self, '_analysis', token_record(val))
 
 # -------------------------------------------
 # Structures
 # -------------------------------------------
 class DependencyLink(object):
+    __slots__ = ('child', 'parent', 'type')
+
     def __init__(self, child=None, parent=None,
                  link_type: str=None):
         """
@@ -452,6 +1137,13 @@ class Word(TaggableMixin, AlignableMixin, VectorMixin, SpacyTokenMixin, IdMixin)
 
     For word-level items. Every word must contain at least one subword.
     """
+    # Attributes are kept in slots rather than a per-object __dict__,
+    # since a corpus may hold a great many tokens. Unset slots
+    # behave as unset attributes did.
+    __slots__ = ('_subwords', '_phrase_ref', '_index', '_id',
+                 '_pos', '_graph', '_node', '_vector_row', '_analysis',
+                 '_cached_hyphenated', '_cached_string', '__weakref__')
+
     def __init__(self, string=None, subwords=None, id_=None):
         """
 
@@ -461,6 +1153,11 @@ class Word(TaggableMixin, AlignableMixin, VectorMixin, SpacyTokenMixin, IdMixin)
         :param id_:
         """
         assert (string or subwords) and not (string and subwords)
+        self._phrase = None
+        self._index = None
+        self._id = id_
+        self._cached_hyphenated = None
+        self._cached_string = None
         if string is not None:
             self._subwords = [SubWord(string, word=self, index=0)]
         else:
@@ -468,11 +1165,8 @@ class Word(TaggableMixin, AlignableMixin, VectorMixin, SpacyTokenMixin, IdMixin)
             for i, sw in enumerate(self._subwords):
                 if isinstance(sw, str):
                     self._subwords[i] = SubWord(sw)
-                self._subwords[i].word = self
                 self._subwords[i]._index = i
-        self._phrase = None
-        self._index = None
-        self._id = id_
+                self._subwords[i].word = self
 
     def __repr__(self):
         return '(w: {} [{}])'.format(', '.join([repr(sw) for sw in self.subwords]), self.index)
@@ -502,6 +1196,39 @@ class Word(TaggableMixin, AlignableMixin, VectorMixin, SpacyTokenMixin, IdMixin)
     @property
     def index(self): return self._index
 
+    @property
+    def _phrase(self):
+        """
+        The phrase holding this word, if any. Like the instance of a
+        phrase, it is held weakly, so that they do not form a cycle.
+
+        :rtype: Phrase
+        """
+        return None if self._phrase_ref is None else self._phrase_ref()
+
+    @_phrase.setter
+    def _phrase(self, phrase):
+        self._phrase_ref = None if phrase is None else weakref.ref(phrase)
+
+    def _set_index(self, i: int):
+        """
+        Set the position of this word in its phrase, along
+        with the addresses of its subwords.
+        """
+        self._index = i
+        for sw in self._subwords:
+            sw._address = (i, sw._index)
+
+    def _invalidate(self):
+        """
+        Drop the strings cached for this word and its phrase,
+        after one of its subwords has changed.
+        """
+        self._cached_hyphenated = None
+        self._cached_string = None
+        if self._phrase is not None:
+            self._phrase._invalidate()
+
     @property
     def hyphenated(self):
         """
@@ -512,6 +1239,9 @@ class Word(TaggableMixin, AlignableMixin, VectorMixin, SpacyTokenMixin, IdMixin)
 
         :rtype: str
         """
+        if self._cached_hyphenated is not None:
+            return self._cached_hyphenated
+
         ret_str = self.subwords[0].hyphenated
         prev_subword = self.subwords[0]
 
@@ -521,10 +1251,14 @@ class Word(TaggableMixin, AlignableMixin, VectorMixin, SpacyTokenMixin, IdMixin)
             else:
                 ret_str += subword.hyphenated
             prev_subword = subword
+        self._cached_hyphenated = ret_str
         return ret_str
 
     @property
-    def string(self): return ''.join([str(s) for s in self._subwords])
+    def string(self):
+        if self._cached_string is None:
+            self._cached_string = ''.join([str(s) for s in self._subwords])
+        return self._cached_string
 
     @property
     def phrase(self): return self._phrase
@@ -536,7 +1270,7 @@ class Word(TaggableMixin, AlignableMixin, VectorMixin, SpacyTokenMixin, IdMixin)
 
     @property
     def subword_parts(self):
-        """:rtype: Generator[tuple[float, str]]"""
+        """:rtype: Generator[tuple[tuple[int, int], str]]"""
         for sw in self.subwords:
             for part in sw.parts:
                 yield part
@@ -550,6 +1284,7 @@ class Word(TaggableMixin, AlignableMixin, VectorMixin, SpacyTokenMixin, IdMixin)
     def word(self): return self
 
 class TransWord(Word):
+    __slots__ = ()
 
     @property
     def aligned_lang_words(self):
@@ -559,25 +1294,25 @@ class TransWord(Word):
         words that those gloss words/morphemes are aligned to (or
         LangWords, if they're aligned directly).
 
-        :rtype: set[LangWord]
+        :rtype: FrozenSet[LangWord]
         """
-        ret_words = set([])
-        for aligned_item in self.aligned_words():
+        graph = getattr(self, '_graph', None)
+        return graph.aligned_lang_words(self) if graph is not None else frozenset()
 
-            if isinstance(aligned_item, LangWord):
-                ret_words.add(aligned_item)
-            else:
-                ret_words |= {w for w in aligned_item.aligned_words(LangWord)}
-        return ret_words
 
+class LangWord(Word): __slots__ = ()
+class GlossWord(Word): __slots__ = ()
 
-class LangWord(Word): pass
-class GlossWord(Word): pass
+# The characters that separate the parts of a subword (e.g. "1sg.PAST")
+PARTS_RE = re.compile(r'[./()]+')
 
 class SubWord(TaggableMixin, AlignableMixin, MutableStringMixin, LemmatizableMixin, IdMixin):
     """
     Class to represent sub-word level items -- either morphemes or glosses.
     """
+    __slots__ = ('_string', '_word_ref', '_index', '_address', '_id', '_left_symbol', '_right_symbol',
+                 '_pos', '_graph', '_node', '_lemma', '_cached_parts', '__weakref__')
+
     def __init__(self, s, word: Word=None, index=None, id_=None,
                  left_symbol: str = None, right_symbol: str = None):
         """
@@ -589,30 +1324,101 @@ class SubWord(TaggableMixin, AlignableMixin, MutableStringMixin, LemmatizableMix
         :param left_symbol: A string that combines this symbol with the token to the left (e.g. - or =)
         :param right_symbol: A string that combines this symbol with the token to the right
         """
-        self.string = s
+        self._string = s
         self._index = index
         self._id = id_
-        self.left_symbol = left_symbol
-        self.right_symbol = right_symbol
+        self._left_symbol = left_symbol
+        self._right_symbol = right_symbol
+        self._cached_parts = None
+        self._word_ref = None
         if word is not None:
             self.word = word
 
+    def _invalidate(self):
+        """
+        Drop the values cached for this subword, and for
+        the word and phrase that contain it.
+        """
+        self._cached_parts = None
+        word = getattr(self, '_word', None)
+        if word is not None:
+            word._invalidate()
+
+    @property
+    def string(self) -> str: return self._string
+
+    @string.setter
+    def string(self, val):
+        self._string = val
+        self._invalidate()
+
+    @property
+    def left_symbol(self) -> str: return self._left_symbol
+
+    @left_symbol.setter
+    def left_symbol(self, val):
+        self._left_symbol = val
+        self._invalidate()
+
+    @property
+    def right_symbol(self) -> str: return self._right_symbol
+
+    @right_symbol.setter
+    def right_symbol(self, val):
+        self._right_symbol = val
+        self._invalidate()
+
+    @property
+    def _word(self):
+        """
+        The word holding this subword, if any (held weakly, as for words' phrases).
+
+        :rtype: Word
+        """
+        return None if self._word_ref is None else self._word_ref()
+
+    @_word.setter
+    def _word(self, w):
+        self._word_ref = None if w is None else weakref.ref(w)
+
     @property
     def word(self): return self._word
 
     @word.setter
-    def word(self, w): self._word = w
+    def word(self, w):
+        self._word = w
+        self._address = (w.index, self._index)
 
     @property
     def index(self):
-        return float('{}.{}'.format(self.word.index, self._index))
+        """
+        The address of this subword within its phrase, as a
+        (word index, subword index) tuple.
+
+        :rtype: Tuple[int, int]
+        """
+        return self._address
+
+    @property
+    def float_index(self):
+        """
+        The address of this subword in the older "word.subword" float
+        form. Note that this form cannot tell the tenth subword of a
+        word apart from the second (e.g. 3.10 == 3.1); use index instead.
+
+        :rtype: float
+        """
+        return float('{}.{}'.format(*self._address))
 
     @property
     def parts(self):
         """
         Return the period-or-slash-delineated portions of a sub-word.
         """
-        return ((self.index, part) for part in re.split('[\./\(\)]+', self.string) if part)
+        if self._cached_parts is None:
+            self._cached_parts = tuple(part for part in PARTS_RE.split(self._string) if part)
+        index = self.index
+        return ((index, part) for part in self._cached_parts)
 
     @property
     def hyphenated(self):
@@ -641,7 +1447,7 @@ class SubWord(TaggableMixin, AlignableMixin, MutableStringMixin, LemmatizableMix
         return hash((self.left_symbol, self.right_symbol, self.id))
 
     def __copy__(self):
-        return SubWord(self.string, word=self.word, index=self.index,
+        return SubWord(self.string, word=self.word, index=self._index,
                        left_symbol=self.left_symbol, right_symbol=self.right_symbol)
 
     def __deepcopy__(self, memodict={}):
@@ -658,28 +1464,137 @@ class Phrase(list, IdMixin, DependencyMixin):
         super().__init__(iterable)
         for i, w in enumerate(self):
             w._phrase = self
-            w._index = i
+            w._set_index(i)
         self.id = id_
+        self._instance_ref = None # type: weakref.ref
+        self._invalidate()
+
+    @property
+    def _instance(self):
+        """
+        The instance holding this phrase, if any. It is held
+        weakly, so that the phrase and its instance do not
+        form a reference cycle.
+
+        :rtype: Instance
+        """
+        return None if self._instance_ref is None else self._instance_ref()
 
+    @_instance.setter
+    def _instance(self, inst):
+        self._instance_ref = None if inst is None else weakref.ref(inst)
+
+    def _invalidate(self):
+        """
+        Drop the values cached for this phrase, after
+        its words (or their subwords) have changed.
+        """
+        self._cached_hyphenated = None
+        self._cached_subwords = None
+
+    def _words_changed(self):
+        """
+        Drop the cached values, and the ID index of the instance
+        holding this phrase, after words have been removed or
+        replaced, or have been given new IDs.
+        """
+        self._invalidate()
+        if self._instance is not None:
+            self._instance._id_index = None
 
     def add_word(self, w: Word):
-        w._index = len(self)
-        w._phrase = self
         self.append(w)
 
     def append(self, w: Word):
-        w._index = len(self)
+        w._phrase = self
+        w._set_index(len(self))
         super().append(w)
+        self._invalidate()
+        if self._instance is not None:
+            self._instance._index_word(w)
+
+    def extend(self, words: Iterable[Word]):
+        for w in words:
+            self.append(w)
+
+    def _reindex(self, start: int = 0):
+        """
+        Set the indices (and subword addresses) of the words
+        from start onward, after words have been inserted or
+        removed before them.
+        """
+        for i in range(max(start, 0), len(self)):
+            w = list.__getitem__(self, i)
+            w._phrase = self
+            w._set_index(i)
+
+    @staticmethod
+    def _detach(words: Iterable[Word]):
+        for w in words:
+            w._phrase = None
+
+    def insert(self, i: int, w: Word):
+        start = min(i if i >= 0 else max(len(self) + i, 0), len(self))
+        super().insert(i, w)
+        self._reindex(start)
+        self._words_changed()
+
+    def pop(self, i: int = -1):
+        start = i if i >= 0 else len(self) + i
+        w = super().pop(i)
+        self._detach([w])
+        self._reindex(start)
+        self._words_changed()
+        return w
+
+    def remove(self, w: Word):
+        start = super().index(w)
+        super().remove(w)
+        self._detach([w])
+        self._reindex(start)
+        self._words_changed()
+
+    def __setitem__(self, i, w):
+        if isinstance(i, slice):
+            start = i.indices(len(self))[0]
+            old_words = super().__getitem__(i)
+        else:
+            start = i if i >= 0 else len(self) + i
+            old_words = [super().__getitem__(i)]
+        super().__setitem__(i, w)
+        self._detach(ow for ow in old_words if ow._phrase is self and ow not in self)
+        self._reindex(start)
+        self._words_changed()
+
+    def __delitem__(self, i):
+        if isinstance(i, slice):
+            start = i.indices(len(self))[0]
+            old_words = super().__getitem__(i)
+        else:
+            start = i if i >= 0 else len(self) + i
+            old_words = [super().__getitem__(i)]
+        super().__delitem__(i)
+        self._detach(old_words)
+        self._reindex(start)
+        self._words_changed()
 
     def __getitem__(self, i):
         """
+        Look up a word by its index, or a subword by
+        its (word index, subword index) address.
+
+        Float addresses (e.g. 3.1), as given by SubWord.float_index,
+        are still accepted for compatibility.
+
         :rtype: Union[Word, SubWord]
         """
-        if isinstance(i, int):
-            return super().__getitem__(i)
+        if isinstance(i, tuple):
+            w_index, sw_index = i
+            return super().__getitem__(w_index)._subwords[sw_index]
         if isinstance(i, float):
             w_index, sw_index = (int(part) for part in str(i).split('.'))
-            return super().__getitem__(w_index)[sw_index]
+            return super().__getitem__(w_index)._subwords[sw_index]
+        return super().__getitem__(i)
 
     def __iter__(self):
         """
@@ -705,7 +1620,10 @@ class Phrase(list, IdMixin, DependencyMixin):
         return cls(wordlist, id_=p_id)
 
     @property
-    def hyphenated(self): return ' '.join([w.hyphenated for w in self])
+    def hyphenated(self):
+        if self._cached_hyphenated is None:
+            self._cached_hyphenated = ' '.join([w.hyphenated for w in self])
+        return self._cached_hyphenated
 
     def __str__(self):
         return ' '.join([str(s) for s in self]) if self else ''
@@ -716,9 +1634,12 @@ class Phrase(list, IdMixin, DependencyMixin):
     @property
     def subwords(self) -> List[SubWord]:
         """
-        Return all the subwords
+        Return all the subwords. The list is kept until the
+        phrase changes, and should not be modified.
         """
-        return [subword for word in self for subword in word]
+        if self._cached_subwords is None:
+            self._cached_subwords = [subword for word in self for subword in word]
+        return self._cached_subwords
 
     @property
     def alignments(self):
@@ -754,17 +1675,116 @@ class Instance(IdMixin):
     This class represents an entire IGT instance. It supposes
     that
     """
-    def __init__(self, lang=None, gloss=None, trans=None, id=None):
+    def __init__(self, lang=None, gloss=None, trans=None, id=None,
+                 alignment_graph: AlignmentGraph = None):
         """
         :type lang: Phrase
         :type gloss: Phrase
         :type trans: Phrase
+        :param alignment_graph: A graph that already holds all of the tokens
+                                of the three lines, if one has been built.
         """
         self.lang = lang # type: Phrase
         self.gloss = gloss # type: Phrase[GlossWord]
         self.trans = trans # type: Phrase
         self._id = id
 
+        # The index of the phrases and tokens by their IDs is built
+        # when first needed, and kept up to date as words are added.
+        self._id_index = None # type: Dict[str, Union[Phrase, Word, SubWord]]
+        for phrase in (lang, gloss, trans):
+            if phrase is not None:
+                phrase._instance = self
+
+        # Gather the tokens of all three lines into one alignment graph.
+        if alignment_graph is None:
+            self.alignment_graph
+
+    def tokens(self) -> Iterator[Union['Word', 'SubWord']]:
+        """
+        Iterate over all of the words and subwords of the instance.
+        """
+        for phrase in [self.lang, self.gloss, self.trans]:
+            for word in (phrase or []):
+                yield word
+                yield from word.subwords
+
+    @property
+    def alignment_graph(self):
+        """
+        The graph holding the alignments between the tokens of this
+        instance. Any tokens not yet in the graph are added to it.
+
+        :rtype: AlignmentGraph
+        """
+        return AlignmentGraph.joining(self.tokens())
+
+    @property
+    def id_index(self):
+        """
+        The phrases, words, and subwords of the instance, by their IDs.
+
+        Words added to a phrase (with Phrase.add_word) are added to the
+        index, and it is rebuilt after a phrase's words are removed or
+        replaced, or re-numbered with assign_ids. (IDs set directly
+        on a token afterwards are not tracked.)
+
+        :rtype: Dict[str, Union[Phrase, Word, SubWord]]
+        """
+        if self._id_index is None:
+            self._id_index = {}
+            for phrase in (self.lang, self.gloss, self.trans):
+                if phrase is not None:
+                    if phrase.id is not None:
+                        self._id_index[phrase.id] = phrase
+                    for word in phrase:
+                        self._index_word(word)
+        return self._id_index
+
+    def _index_word(self, word):
+        index = self._id_index
+        if index is not None:
+            if word.id is not None:
+                index[word.id] = word
+            for subword in word.subwords:
+                if subword.id is not None:
+                    index[subword.id] = subword
+
+    def by_id(self, id_: str):
+        """
+        Return the phrase, word, or subword with the given ID, or None.
+
+        :rtype: Union[Phrase, Word, SubWord]
+        """
+        return self.id_index.get(id_)
+
+    def release(self):
+        """
+        Tear the instance down once it is no longer needed (e.g. once
+        it has been exported), by clearing the references from its
+        tokens back to their words, phrases, and alignment graph, and
+        dropping its dependency structures and cached values.
+
+        The back-references are weak, so an instance is freed by reference
+        counting alone whether or not it is released; releasing it also
+        detaches any of its tokens that are still referenced elsewhere
+        from the rest of it. The instance should not be used after it
+        has been released.
+        """
+        for phrase in (self.lang, self.gloss, self.trans):
+            if phrase is None:
+                continue
+            for word in phrase:
+                for subword in word._subwords:
+                    subword._word = None
+                    subword._graph = None
+                word._phrase = None
+                word._graph = None
+            phrase._ds = phrase._da = None
+            phrase._instance = None
+            phrase._invalidate()
+        self._id_index = None
+
     def __str__(self):
         max_token_len = [0 for i in range(max(len(self.lang), len(self.gloss)))]
 
@@ -817,8 +1837,13 @@ class Corpus(list):
     Class for holding a collection
     of instances
     """
-    def __init__(self, instances=None):
+    def __init__(self, instances=None, symbols: SymbolTable = None):
+        """
+        :param symbols: The table the strings of the instances were interned
+                        with (the shared intent2.symbols.SYMBOLS by default).
+        """
         super().__init__(instances)
+        self.symbols = SYMBOLS if symbols is None else symbols
 
     def __iter__(self):
         """
@@ -826,6 +1851,14 @@ class Corpus(list):
         """
         return super().__iter__()
 
+    def release(self):
+        """
+        Release every instance in the corpus (see Instance.release),
+        once the corpus is about to be dropped.
+        """
+        for inst in self:
+            inst.release()
+
 
 # -------------------------------------------
 # Tests
@@ -849,6 +1882,82 @@ class DependencyTests(unittest.TestCase):
 
         #TODO: Add more dependency tests
 
+    def test_depth(self):
+        root = DependencyLink(self.wordA, None, link_type='root')
+        subj = DependencyLink(self.wordB, self.wordA)
+        adv = DependencyLink(self.wordC, self.wordB)
+        ds = DependencyStructure([root, subj, adv])
+        self.assertListEqual([ds.depth(l) for l in (root, subj, adv)], [0, 1, 2])
+
+        # A second, shallower copy of the adverb link
+        adv_copy = DependencyLink(self.wordC, self.wordA)
+        ds.add(adv_copy)
+        self.assertEqual(ds.word_depth(self.wordC), 1)
+        ds.remove(adv_copy)
+        self.assertEqual(ds.word_depth(self.wordC), 2)
+
+    def test_long_chain(self):
+        words = [Word('w{}'.format(i)) for i in range(5000)]
+        ds = DependencyStructure([DependencyLink(words[0], None)])
+        for parent, child in zip(words, words[1:]):
+            ds.add(DependencyLink(child, parent))
+        self.assertEqual(ds.word_depth(words[-1]), 4999)
+        self.assertListEqual(ds.cycles, [])
+
+    def test_cycles(self):
+        ds = DependencyStructure([DependencyLink(self.wordA, None),
+                                  DependencyLink(self.wordB, self.wordC),
+                                  DependencyLink(self.wordC, self.wordB)])
+        self.assertListEqual(ds.cycles, [frozenset([self.wordB, self.wordC])])
+        self.assertIsNone(ds.word_depth(self.wordB))
+        self.assertIsNone(ds.depth(DependencyLink(self.wordB, self.wordC)))
+
+        loop = DependencyLink(self.wordA, self.wordA)
+        ds.add(loop)
+        self.assertIn(frozenset([self.wordA]), ds.cycles)
+        self.assertEqual(ds.depth(loop), 1)
+
+class DependencyArrayTests(unittest.TestCase):
+    def setUp(self):
+        setUpPhrase(self)
+        # John ran around
+        analysis = [('PROPN', 'John', 1, 'nsubj'), ('VERB', 'run', 1, 'ROOT'), ('ADV', 'around', 1, 'advmod')]
+        self.da = DependencyArray.from_analysis(self.phrase, analysis)
+
+    def test_lookup(self):
+        self.assertListEqual(self.da.roots, [1])
+        self.assertIs(self.da.parent(0), self.wordA)
+        self.assertIsNone(self.da.parent(1))
+        self.assertEqual(self.da.label(1), 'root')
+        self.assertListEqual(self.da.children(1), [0, 2])
+
+    def test_conversion(self):
+        ds = self.da.to_structure()
+        self.assertSetEqual(ds, {DependencyLink(self.wordB, self.wordA, 'nsubj'),
+                                 DependencyLink(self.wordA, None, 'root'),
+                                 DependencyLink(self.wordC, self.wordA, 'advmod')})
+        self.assertEqual(DependencyArray.from_structure(ds, self.phrase), self.da)
+
+        ds.add(DependencyLink(self.wordC, self.wordB))
+        with self.assertRaises(DependencyException):
+            DependencyArray.from_structure(ds, self.phrase)
+
+    def test_copy_on_write(self):
+        da_copy = self.da.copy()
+        da_copy.set_head(2, 0, 'dep')
+        da_copy.detach(1)
+        self.assertListEqual(self.da.children(1), [0, 2])
+        self.assertListEqual(list(da_copy), [(0, 1, 'nsubj'), (2, 0, 'dep')])
+        self.assertEqual(len(self.da), 3)
+
+    def test_phrase_forms(self):
+        self.phrase.dependency_array = self.da
+        self.assertIsNot(self.phrase.dependency_array, None)
+        ds = self.phrase.dependency_structure
+        self.assertEqual(len(ds), 3)
+        self.assertIsNone(self.phrase.dependency_array)
+        self.assertIs(self.phrase.dependency_structure, ds)
+
 class PhraseTests(unittest.TestCase):
     def setUp(self):
         setUpPhrase(self)
@@ -876,6 +1985,45 @@ class PhraseTests(unittest.TestCase):
         self.assertEqual(p[1].hyphenated, Word('Spc').hyphenated)
         self.assertEqual(p[2].hyphenated, Word('money').hyphenated)
 
+    def test_subword_addresses(self):
+        p = Phrase.from_string('one a-b-c-d-e-f-g-h-i-j-k')
+        self.assertEqual(p[1][10].index, (1, 10))
+        self.assertIs(p[(1, 1)], p[1][1])
+        self.assertIs(p[(1, 10)], p[1][10])
+        self.assertIsNot(p[(1, 10)], p[(1, 1)])
+
+        # Appended words have their subwords addressed as well.
+        p.append(Word(subwords=['x', 'y']))
+        self.assertIs(p[(2, 1)], p[2][1])
+
+    def test_float_addresses(self):
+        p = Phrase.from_string('one two-three')
+        self.assertEqual(p[1][1].float_index, 1.1)
+        self.assertIs(p[1.1], p[1][1])
+
+    def test_mutation_indices(self):
+        p = Phrase.from_string('one two-three four')
+        sw = p[1][1]
+        new_w = Word(subwords=['x', 'y'])
+        p.insert(1, new_w)
+        self.assertEqual(sw.index, (2, 1))
+        self.assertIs(p[(2, 1)], sw)
+        self.assertEqual(new_w[1].index, (1, 1))
+        self.assertIs(new_w.phrase, p)
+
+        popped = p.pop(0)
+        self.assertIsNone(popped.phrase)
+        self.assertEqual(sw.index, (1, 1))
+        self.assertListEqual([w.index for w in p], [0, 1, 2])
+
+        del p[0]
+        p.remove(p[-1])
+        self.assertEqual(sw.index, (0, 1))
+
+        p[0:0] = [Word('zero')]
+        self.assertIs(p[(1, 1)], sw)
+        self.assertListEqual([w.index for w in p], [0, 1])
+
 
 class WordTests(unittest.TestCase):
     def setUp(self):
@@ -938,6 +2086,63 @@ class AlignmentTests(unittest.TestCase):
         self.assertEqual(next(iter(self.w1.alignments)), self.w3)
         self.assertEqual(len(self.w2.alignments), 0)
 
+class AlignmentGraphTests(unittest.TestCase):
+    def setUp(self):
+        self.inst = Instance.from_strings(['ama-nu seng', 'person-Spc money', 'the person has money'])
+        lang, gloss, trans = self.inst.lang, self.inst.gloss, self.inst.trans
+        for lw, gw in zip(lang, gloss):
+            lw.add_alignment(gw)
+            for lsw, gsw in zip(lw, gw):
+                lsw.add_alignment(gsw)
+        trans[1].add_alignment(gloss[(0, 0)])
+        trans[3].add_alignment(gloss[1])
+
+    def test_single_graph(self):
+        graph = self.inst.alignment_graph
+        self.assertTrue(all(token.alignment_graph is graph for token in self.inst.tokens()))
+        self.assertEqual(graph.num_edges, 7)
+
+    def test_typed_edges(self):
+        graph = self.inst.alignment_graph
+        trans_gloss = set(graph.edges(TRANS_LINE, GLOSS_LINE))
+        self.assertSetEqual(trans_gloss, {(self.inst.trans[1], self.inst.gloss[(0, 0)]),
+                                          (self.inst.trans[3], self.inst.gloss[1])})
+        self.assertEqual(len(list(graph.edges(LANG_LINE, GLOSS_LINE))), 5)
+        self.assertEqual(len(list(graph.edges())), 7)
+
+    def test_unaligned_storage(self):
+        graph, trans = self.inst.alignment_graph, self.inst.trans
+        self.assertIs(graph._adjacency[trans[0]._node], NO_NEIGHBOURS)
+        trans[3].remove_alignment(self.inst.gloss[1])
+        self.assertIs(graph._adjacency[trans[3]._node], NO_NEIGHBOURS)
+        trans[3].add_alignment(self.inst.gloss[1])
+        self.assertSetEqual(graph.neighbours(trans[3]), {self.inst.gloss[1]})
+
+    def test_reads_do_not_mutate(self):
+        gloss_w = self.inst.gloss[0]
+        self.assertIn(self.inst.trans[1], gloss_w.alignments)
+        self.inst.trans[1].remove_alignment(self.inst.gloss[(0, 0)])
+        self.assertNotIn(self.inst.trans[1], gloss_w.alignments)
+
+    def test_lang_closure(self):
+        trans = self.inst.trans
+        self.assertSetEqual(set(trans[1].aligned_lang_words), {self.inst.lang[0]})
+        self.assertSetEqual(set(trans[3].aligned_lang_words), {self.inst.lang[1]})
+        self.assertFalse(trans[0].aligned_lang_words)
+
+        # The cached closure is updated when the alignments change.
+        trans[0].add_alignment(self.inst.lang[1])
+        self.assertSetEqual(set(trans[0].aligned_lang_words), {self.inst.lang[1]})
+
+    def test_merge(self):
+        w1, w2, w3, w4 = Word('a'), Word('b'), Word('c'), Word('d')
+        w1.add_alignment(w2)
+        w3.add_alignment(w4)
+        self.assertIsNot(w1.alignment_graph, w3.alignment_graph)
+        w2.add_alignment(w3)
+        self.assertIs(w1.alignment_graph, w4.alignment_graph)
+        self.assertSetEqual(w3.alignments, {w2, w4})
+
 class TagTests(unittest.TestCase):
     def setUp(self):
         setUpPhrase(self)
@@ -948,4 +2153,133 @@ class TagTests(unittest.TestCase):
         self.wordA.pos = 'NN'
         self.assertIsNotNone(self.wordA.pos)
 
+class SlotsTests(unittest.TestCase):
+    def test_no_instance_dict(self):
+        for token in [Word('ran'), TransWord('ran'), GlossWord('run-PST'), SubWord('ran'),
+                      DependencyLink(Word('John'), Word('ran'))]:
+            self.assertFalse(hasattr(token, '__dict__'))
+
+    def test_unset_attributes(self):
+        sw = SubWord('ran')
+        self.assertIsNone(sw.pos)
+        self.assertIsNone(sw.id)
+        self.assertSetEqual(sw.alignments, set())
+        with self.assertRaises(AttributeError):
+            sw.lemma
+
+class IdIndexTests(unittest.TestCase):
+    def setUp(self):
+        lang_p = Phrase.from_string('ni iya', p_id='w', id_base='w', WordType=LangWord)
+        gloss_p = Phrase.from_string('1sg see-PST', p_id='gw', id_base='gw', WordType=GlossWord)
+        trans_p = Phrase.from_string('I saw', p_id='tw', id_base='tw', WordType=TransWord)
+        self.inst = Instance(lang_p, gloss_p, trans_p, id='i1')
+
+    def test_by_id(self):
+        self.assertIs(self.inst.by_id('gw2'), self.inst.gloss[1])
+        self.assertIs(self.inst.by_id(self.inst.gloss[(1, 1)].id), self.inst.gloss[(1, 1)])
+        self.assertIs(self.inst.by_id('tw'), self.inst.trans)
+        self.assertIsNone(self.inst.by_id('w9'))
+
+    def test_updates(self):
+        self.inst.by_id('w1')
+        self.inst.lang.add_word(LangWord('ba', id_='w3'))
+        self.assertIs(self.inst.by_id('w3'), self.inst.lang[2])
+
+        from intent2.serialize.importers import assign_ids
+        assign_ids(self.inst.lang, 'x', 'm')
+        self.assertIsNone(self.inst.by_id('w3'))
+        self.assertIs(self.inst.by_id('x3'), self.inst.lang[2])
+
+        del self.inst.lang[0]
+        self.assertIsNone(self.inst.by_id('x1'))
+
+class CacheTests(unittest.TestCase):
+    def setUp(self):
+        self.phrase = Phrase.from_string('3sg.give-PST dog', p_id='g')
+
+    def test_subword_changes(self):
+        self.assertEqual(self.phrase.hyphenated, '3sg.give-PST dog')
+        self.assertListEqual([p for i, p in self.phrase[0][0].parts], ['3sg', 'give'])
+
+        sw = self.phrase[(0, 0)]
+        sw.string = '1pl.take'
+        self.assertListEqual([p for i, p in sw.parts], ['1pl', 'take'])
+        self.assertEqual(self.phrase[0].string, '1pl.takePST')
+        self.assertEqual(self.phrase.hyphenated, '1pl.take-PST dog')
+
+        self.phrase[(0, 0)].right_symbol = '='
+        self.assertEqual(self.phrase.hyphenated, '1pl.take=PST dog')
+
+    def test_phrase_changes(self):
+        self.assertEqual(len(self.phrase.subwords), 3)
+        self.phrase.append(Word('ran'))
+        self.assertEqual(self.phrase.hyphenated, '3sg.give-PST dog ran')
+        self.assertEqual(len(self.phrase.subwords), 4)
+        del self.phrase[0]
+        self.assertEqual(self.phrase.hyphenated, 'dog ran')
+
+    def test_dependency_words(self):
+        setUpPhrase(self)
+        ds = DependencyStructure([DependencyLink(self.wordB, self.wordA)])
+        self.assertListEqual(ds.words, [self.wordB, self.wordA])
+        ds.add(DependencyLink(self.wordC, self.wordA))
+        self.assertListEqual(ds.words, [self.wordB, self.wordA, self.wordC])
+
+class ReleaseTests(unittest.TestCase):
+    def setUp(self):
+        lang_p = Phrase.from_string('ni iya', p_id='w', id_base='w', WordType=LangWord)
+        gloss_p = Phrase.from_string('1sg see-PST', p_id='gw', id_base='gw', WordType=GlossWord)
+        trans_p = Phrase.from_string('I saw', p_id='tw', id_base='tw', WordType=TransWord)
+        self.inst = Instance(lang_p, gloss_p, trans_p, id='i1')
+        self.inst.gloss[0].add_alignment(self.inst.lang[0])
+        self.inst.trans[1].add_alignment(self.inst.gloss[(1, 0)])
+        self.inst.trans.dependency_structure = DependencyStructure([DependencyLink(self.inst.trans[0],
+                                                                                   self.inst.trans[1])])
+
+    def test_phrase_instance(self):
+        self.assertIs(self.inst.lang._instance, self.inst)
+        lang = self.inst.lang
+        del self.inst
+        self.assertIsNone(lang._instance)
+
+    def test_release(self):
+        import gc
+        refs = [weakref.ref(self.inst.alignment_graph)]
+        refs += [weakref.ref(phrase) for phrase in (self.inst.lang, self.inst.gloss, self.inst.trans)]
+        gc.disable()
+        try:
+            self.inst.release()
+            del self.inst
+            # Without cycles, everything is freed by reference counting alone.
+            self.assertTrue(all(ref() is None for ref in refs))
+        finally:
+            gc.enable()
+
+    def test_unreleased(self):
+        import gc
+        refs = [weakref.ref(self.inst.alignment_graph)]
+        refs += [weakref.ref(token) for token in self.inst.tokens()]
+        gc.disable()
+        try:
+            del self.inst
+            self.assertTrue(all(ref() is None for ref in refs))
+        finally:
+            gc.enable()
+
+    def test_held_token(self):
+        trans_w = self.inst.trans[1]
+        gloss_sw = self.inst.gloss[(1, 0)]
+        self.assertSetEqual(trans_w.alignments, {gloss_sw})
+        del self.inst, gloss_sw
+        # The freed tokens are no longer reported as aligned.
+        self.assertSetEqual(trans_w.alignments, set())
+        self.assertIsNone(trans_w.phrase)
+
+    def test_corpus_release(self):
+        corp = Corpus([self.inst])
+        trans = self.inst.trans
+        corp.release()
+        self.assertIsNone(trans[0].phrase)
+        self.assertIsNone(trans[0].alignment_graph)
+
 from intent2.utils.strings import word_str_to_subwords, word_tokenize
@@ -2,14 +2,23 @@
 Module to do things like dependency parsing and
 part-of-speech-tagging
 """
-from collections import Iterable
+import time
+import numpy as np
+from collections import OrderedDict
+from collections.abc import Iterable
+from typing import List
 
-from intent2.model import Instance, DependencyStructure, DependencyLink
+from intent2.model import Instance, Phrase, Word, DependencyStructure, DependencyArray, TokenRecord, NO_VECTOR_ROW
+from intent2.symbols import SymbolTable, SYMBOLS
+from intent2.vectors import VectorTable, VECTORS
+from intent2.cache import TransAnalysisCache, TokenDetails, DEFAULT_MAX_ENTRIES
+from intent2.utils.memory import current_rss, format_bytes
 
 import spacy
 from spacy.tokenizer import Tokenizer
 from spacy.language import Language
-from spacy.tokens import Doc
+from spacy.tokens import Doc, Token
+from spacy.attrs import POS, TAG, LEMMA, HEAD, DEP
 
 # -------------------------------------------
 # Set up logging
@@ -17,11 +26,25 @@ from spacy.tokens import Doc
 import logging
 PROCESS_LOG = logging.getLogger()
 
+class ProcessException(Exception): pass
+
 # -------------------------------------------
 # Set up spaCy
 # -------------------------------------------
-global SPACY_ENG # type: Language
-SPACY_ENG = None
+# Loading profiles, from the cheapest to the most complete:
+#   * lemma: Only the vocabulary and lookup lemmatizer (no statistical models or vectors)
+#   * parse: The tagger and parser
+#   * full:  The full pipeline, including NER.
+PROFILE_LEMMA = 'lemma'
+PROFILE_PARSE = 'parse'
+PROFILE_FULL = 'full'
+
+SPACY_MODEL_NAME = 'en_core_web_lg'
+
+# The loaded models, and the time (in seconds) and
+# change in RSS (in bytes) it took to load each.
+SPACY_MODELS = {}     # type: dict[str, Language]
+SPACY_LOAD_STATS = {} # type: dict[str, tuple[float, int]]
 
 class DummyTokenizer(Tokenizer):
     """
@@ -29,86 +52,484 @@ class DummyTokenizer(Tokenizer):
     lists instead of strings.
     """
     def __call__(self, input: Iterable, **kwargs):
+        # Docs that were already created from the
+        # tokens are passed through as-is.
+        if isinstance(input, Doc):
+            return input
         d = Doc(self.vocab, words=input)
         return d
 
 
-def load_spacy():
+def load_spacy(profile: str = PROFILE_FULL):
+    """
+    Lazy-load the spacy model for the given profile when needed.
+
+    Each profile is loaded once, the first time it is asked for.
+
+    :rtype: Language
+    """
+    if profile not in SPACY_MODELS:
+        PROCESS_LOG.info('spaCy "{}" profile was not previously loaded. Now loading...'.format(profile))
+        start_time, start_rss = time.time(), current_rss()
+
+        if profile == PROFILE_LEMMA:
+            spacy_eng = spacy.blank('en')
+        elif profile == PROFILE_PARSE:
+            spacy_eng = spacy.load(SPACY_MODEL_NAME, disable=['ner'])
+        elif profile == PROFILE_FULL:
+            spacy_eng = spacy.load(SPACY_MODEL_NAME)
+        else:
+            raise ProcessException('Unknown spaCy loading profile "{}"'.format(profile))
+        spacy_eng.tokenizer = DummyTokenizer(spacy_eng.vocab)
+
+        SPACY_MODELS[profile] = spacy_eng
+        SPACY_LOAD_STATS[profile] = (time.time() - start_time, current_rss() - start_rss)
+        PROCESS_LOG.info('spaCy "{}" profile loaded in {:.2f}s, using {} of memory.'.format(
+            profile, SPACY_LOAD_STATS[profile][0], format_bytes(SPACY_LOAD_STATS[profile][1])))
+    return SPACY_MODELS[profile]
+
+def spacy_load_report(format_str='{:>30s} {:.2f}s {:>10s}\n'):
+    """
+    Return a report of the time and memory taken
+    to load each of the spaCy profiles used so far.
+    """
+    ret_str = ''
+    for profile, (seconds, rss) in sorted(SPACY_LOAD_STATS.items()):
+        ret_str += format_str.format('{}:'.format(profile), seconds, format_bytes(rss))
+    return ret_str
+
+def spacy_model_version(spacy_eng: Language) -> str:
+    """
+    Return a string identifying the loaded spaCy model
+    and its version, e.g. "en_core_web_lg-2.0.0"
+    """
+    meta = spacy_eng.meta
+    return '{}_{}-{}'.format(meta.get('lang'), meta.get('name'), meta.get('version'))
+
+# -------------------------------------------
+# Set up the translation analysis cache
+# -------------------------------------------
+global TRANS_CACHE # type: TransAnalysisCache
+TRANS_CACHE = None
+
+def load_trans_cache(path: str, max_entries: int = DEFAULT_MAX_ENTRIES, commit_every: int = 1000):
     """
-    Lazy-load the spacy model when needed.
-    :return:
+    Open the on-disk cache of translation line analyses at the given
+    path, and use it for all subsequent translation line processing.
+
+    :rtype: TransAnalysisCache
     """
-    global SPACY_ENG
-    if SPACY_ENG is None:
-        PROCESS_LOG.info('spaCy model was not previously loaded. Now loading...')
-        SPACY_ENG = spacy.load('en_core_web_lg')  # type: Language
-        SPACY_ENG.tokenizer = DummyTokenizer(SPACY_ENG.vocab)
-    return SPACY_ENG
+    global TRANS_CACHE
+    spacy_eng = load_spacy(PROFILE_PARSE)
+    TRANS_CACHE = TransAnalysisCache(path, spacy_model_version(spacy_eng),
+                                     max_entries=max_entries, commit_every=commit_every)
+    PROCESS_LOG.info('Using translation cache "{}" with {} entries.'.format(path, len(TRANS_CACHE)))
+    return TRANS_CACHE
+
+def close_trans_cache():
+    global TRANS_CACHE
+    if TRANS_CACHE is not None:
+        TRANS_CACHE.close()
+        TRANS_CACHE = None
 
 # -------------------------------------------
 # Processing for different lines
 # -------------------------------------------
 
-def process_trans(inst: Instance, tag=True, parse=True):
+def process_trans(inst: Instance, tag=True, parse=True, spacy_profile=PROFILE_PARSE,
+                  symbols: SymbolTable = None):
     """
     Apply the SpaCy pipeline to the translation sentence.
 
+    If a translation cache is in use, the cached analysis
+    is used instead, when present.
+
+    :param spacy_profile: The spaCy loading profile to use (must include the tagger and parser).
+    :param symbols: The table to intern the tags, lemmas, and labels with.
     :type inst: Instance
     """
     # Parsing requires a translation line
     if not inst.trans:
         raise ProcessException("No translation line present, cannot process.")
 
-    spacy_eng = load_spacy()
+    trans_words = [w.string for w in inst.trans]
+
+    if TRANS_CACHE is not None:
+        entry = TRANS_CACHE.lookup(trans_words)
+        if entry is not None:
+            PROCESS_LOG.info('Using cached analysis for translation line "{}"'.format(inst.trans.hyphenated))
+            analysis, details = entry
+            assign_trans_analysis(inst, analysis, tag=tag, parse=parse, symbols=symbols,
+                                  records=cached_records(analysis, details, spacy_profile, symbols=symbols))
+            return
 
-    trans_doc = Doc(spacy_eng.vocab, words=[w.string for w in inst.trans])
+    spacy_eng = load_spacy(spacy_profile)
+
+    trans_doc = Doc(spacy_eng.vocab, words=trans_words)
 
     # Tag and parse
     PROCESS_LOG.info('Tagging and parsing translation line "{}"'.format(inst.trans.hyphenated))
     spacy_eng.tagger(trans_doc)
     spacy_eng.parser(trans_doc)
 
-    # Now let's go through the words, and assign attributes to them.
-    assert len(inst.trans) == len(trans_doc)
+    analysis = doc_to_analysis(trans_doc)
+    if TRANS_CACHE is not None:
+        TRANS_CACHE.put(trans_words, analysis, doc_details(trans_doc))
 
-    trans_ds = DependencyStructure()
+    assign_trans_analysis(inst, analysis, tag=tag, parse=parse, trans_doc=trans_doc, symbols=symbols)
 
-    for i in range(len(inst.trans)):
-        trans_word = inst.trans[i]
-        spacy_word = trans_doc[i] # type: Token
 
-        # Add POS Tag
-        if tag:
-            trans_word.pos = spacy_word.pos_
+def process_corpus_trans(corpus: Iterable, tag=True, parse=True,
+                         batch_size=1000, n_threads=None, spacy_profile=PROFILE_PARSE,
+                         symbols: SymbolTable = None):
+    """
+    Apply the SpaCy pipeline to the translation lines of every
+    instance in the corpus at once, streaming them through
+    the pipeline in batches rather than one Doc at a time.
+
+    Instances that have no translation line, or whose translation
+    line has already been processed, are skipped. If a translation
+    cache is in use, only lines missing from the cache are parsed.
+
+    :param corpus: The instances whose translation lines should be processed.
+    :type corpus: Iterable[Instance]
+    :param batch_size: Number of translation lines to send through the pipeline at a time.
+    :param n_threads: Number of threads for spaCy's parser to use (None
+                      for spaCy's own default).
+    :param spacy_profile: The spaCy loading profile to use (must include the tagger and parser).
+    :param symbols: The table to intern the tags, lemmas, and labels with.
+    """
+    # Group the instances that still need parsing by their
+    # translation tokens, so that repeated lines are only parsed once.
+    pending = OrderedDict()
+    for inst in corpus:
+        if not inst.trans or hasattr(inst.trans, '_processed'):
+            continue
+
+        trans_words = tuple(w.string for w in inst.trans)
+        if trans_words in pending:
+            pending[trans_words].append(inst)
+            continue
+
+        entry = None
+        if TRANS_CACHE is not None:
+            entry = TRANS_CACHE.lookup(list(trans_words))
+
+        if entry is not None:
+            analysis, details = entry
+            assign_trans_analysis(inst, analysis, tag=tag, parse=parse, symbols=symbols,
+                                  records=cached_records(analysis, details, spacy_profile, symbols=symbols))
+        else:
+            pending[trans_words] = [inst]
+
+    PROCESS_LOG.info('Tagging and parsing {} translation lines.'.format(len(pending)))
+    if not pending:
+        return
+
+    spacy_eng = load_spacy(spacy_profile)
+
+    pipe_kwargs = {'batch_size': batch_size, 'disable': ['ner']}
+    if n_threads is not None:
+        pipe_kwargs['n_threads'] = n_threads
+
+    trans_docs = spacy_eng.pipe((Doc(spacy_eng.vocab, words=list(trans_words))
+                                 for trans_words in pending),
+                                **pipe_kwargs)
+
+    for (trans_words, instances), trans_doc in zip(pending.items(), trans_docs):
+        analysis = doc_to_analysis(trans_doc)
+        if TRANS_CACHE is not None:
+            TRANS_CACHE.put(list(trans_words), analysis, doc_details(trans_doc))
+        records = analysis_records(analysis, trans_doc=trans_doc, symbols=symbols)
+        for inst in instances:
+            assign_trans_analysis(inst, analysis, tag=tag, parse=parse, symbols=symbols, records=records)
+
+
+def doc_to_analysis(trans_doc: Doc):
+    """
+    Reduce a tagged and parsed Doc to the (pos, lemma, head index, dep label)
+    for each of its tokens.
+
+    :rtype: List[Tuple[str, str, int, str]]
+    """
+    return [(token.pos_, token.lemma_, token.head.i, token.dep_) for token in trans_doc]
+
+
+def doc_details(trans_doc: Doc) -> List[TokenDetails]:
+    """
+    Return the fine-grained tag of each token of a Doc, and the
+    key of its vector (or None, if it has no vector), to be
+    cached along with the analysis of the Doc.
+    """
+    return [(token.tag_, None if vector_row(token) == NO_VECTOR_ROW else token.orth)
+            for token in trans_doc]
+
+
+def analysis_records(analysis, trans_doc: Doc = None, symbols: SymbolTable = None,
+                     details: List[TokenDetails] = None, vocab=None) -> List[TokenRecord]:
+    """
+    Return the records of the analysis of each token in a translation
+    line (as returned by doc_to_analysis), with interned strings.
+
+    :param trans_doc: The Doc the analysis came from, if any, for the
+                      fine-grained tags and vector rows of the tokens.
+    :param details: The fine-grained tags and vector keys of the tokens
+                    (as returned by doc_details), if there is no Doc.
+    :param vocab: The vocabulary to find the vector rows of the keys in.
+    :type vocab: spacy.vocab.Vocab
+    """
+    intern = (SYMBOLS if symbols is None else symbols).intern
+    if trans_doc is not None:
+        details, vocab = doc_details(trans_doc), trans_doc.vocab
+    if details is None:
+        return [TokenRecord(intern(pos), None, intern(lemma), head_i, intern(dep), NO_VECTOR_ROW)
+                for pos, lemma, head_i, dep in analysis]
+    return [TokenRecord(intern(pos), intern(tag), intern(lemma), head_i, intern(dep), vector_key_row(vocab, key))
+            for (pos, lemma, head_i, dep), (tag, key) in zip(analysis, details)]
+
+
+def cached_records(analysis, details: List[TokenDetails], spacy_profile=PROFILE_PARSE,
+                   symbols: SymbolTable = None) -> List[TokenRecord]:
+    """
+    Return the records of an analysis read from the translation cache,
+    finding the vector rows of its tokens in the vocabulary of the
+    given profile (which is only loaded if any token has a vector).
+    """
+    vocab = None
+    if details is not None and any(key is not None for tag, key in details):
+        vocab = load_spacy(spacy_profile).vocab
+    return analysis_records(analysis, symbols=symbols, details=details, vocab=vocab)
+
+
+def assign_trans_analysis(inst: Instance, analysis, tag=True, parse=True, trans_doc: Doc=None,
+                          symbols: SymbolTable = None, records: List[TokenRecord] = None):
+    """
+    Given the analysis of the translation line of the instance
+    (as returned by doc_to_analysis), assign the POS tags, lemmas,
+    and dependency structure to the translation words.
 
-        # Add Dependency Head
-        if parse:
-            if spacy_word.head.i != i:
-                trans_ds.add(DependencyLink(child=trans_word,
-                                            parent=inst.trans[spacy_word.head.i],
-                                            link_type=spacy_word.dep_))
+    A record of the analysis of each word is kept on it, rather than
+    the spaCy Token, which would keep the whole Doc alive.
 
-            # If spacy says that a word is its own head,
-            # it is the root.
-            else:
-                trans_ds.add(DependencyLink(child=trans_word,
-                                            parent=None,
-                                            link_type='root'))
+    :param trans_doc: The Doc the analysis came from, if any, for the
+                      fine-grained tags and vector rows of the tokens
+                      (the Doc itself is not kept).
+    :param symbols: The table to intern the tags, lemmas, and labels with.
+    :param records: The analysis_records of the analysis, if they have already
+                    been made (e.g. for another instance with the same line).
+    :type inst: Instance
+    """
+    # Now let's go through the words, and assign attributes to them.
+    assert len(inst.trans) == len(analysis)
+
+    symbols = SYMBOLS if symbols is None else symbols
+    if records is None:
+        records = analysis_records(analysis, trans_doc=trans_doc, symbols=symbols)
 
-        # Add vector
-        trans_word.spacy_token = spacy_word
+    # Keep the tags the translation words were imported with,
+    # before they are replaced, to evaluate the new tags against.
+    if tag and not hasattr(inst.trans, '_processed'):
+        inst.trans._gold_tags = [tw.pos for tw in inst.trans]
+
+    for trans_word, record in zip(inst.trans, records):
+        trans_word.analysis = record
+
+        # Add POS Tag
+        if tag:
+            trans_word.pos = record.pos
 
         # Add lemmatization
         assert len(trans_word.subwords) == 1
-        trans_word[0].lemma = spacy_word.lemma_
+        trans_word[0].lemma = record.lemma
         # TODO: Should there be a case where a translation word has more than one subword?
 
-    inst.trans.dependency_structure = trans_ds
+    # Add the dependency heads, kept as arrays of head indices
+    # until the links themselves are needed. If spacy says
+    # that a word is its own head, it is the root.
+    if parse:
+        inst.trans.dependency_array = DependencyArray.from_analysis(inst.trans, analysis, symbols=symbols)
+    else:
+        inst.trans.dependency_structure = DependencyStructure()
     setattr(inst.trans, '_processed', True)
 
 
 
 
+def vector_key_row(vocab, key: int) -> int:
+    """
+    Return the row of the vector with the given key in the
+    vectors table of the vocabulary, or NO_VECTOR_ROW.
+
+    :type vocab: spacy.vocab.Vocab
+    """
+    if key is None:
+        return NO_VECTOR_ROW
+    vectors = vocab.vectors
+    if not vectors.size or getattr(vectors, 'mode', 'default') != 'default':
+        return NO_VECTOR_ROW
+    return vectors.find(key=key)
+
+
+def vector_row(token: Token) -> int:
+    """
+    Return the row of the token in the vectors table
+    of its vocabulary, or NO_VECTOR_ROW.
+    """
+    return vector_key_row(token.vocab, token.orth)
+
+
+def assign_trans_vectors(words: Iterable, spacy_profile=PROFILE_PARSE, vectors: VectorTable = None):
+    """
+    Give each processed translation word the row of its vector in the
+    vector table, copying the vectors of any strings new to the table
+    from the spaCy vocabulary in a single batch (using the vocabulary
+    rows kept in the words' analysis records).
+
+    :type words: Iterable[Word]
+    :param spacy_profile: The spaCy loading profile the words were processed with.
+    :param vectors: The table to add the vectors to (the shared intent2.vectors.VECTORS by default).
+    """
+    vectors = VECTORS if vectors is None else vectors
+    words = [w for w in words if w.analysis is not None]
+    if not words:
+        return
+
+    vocab_vectors = load_spacy(spacy_profile).vocab.vectors
+    rows = vectors.add_rows([w.string for w in words], vocab_vectors.data,
+                            [w.analysis.vector_row for w in words])
+    for word, row in zip(words, rows):
+        word.vector_row = row
+
+
+def token_record(token: Token, symbols: SymbolTable = None) -> TokenRecord:
+    """
+    Return the record of the analysis of a spaCy Token.
+    """
+    intern = (SYMBOLS if symbols is None else symbols).intern
+    return TokenRecord(intern(token.pos_), intern(token.tag_), intern(token.lemma_),
+                       token.head.i, intern(token.dep_), vector_row(token))
+
+
+def rehydrate_doc(phrase: Phrase, spacy_profile=PROFILE_PARSE) -> Doc:
+    """
+    Rebuild the spaCy Doc for a processed translation
+    phrase, from the analysis records of its words.
+    """
+    records = [w.analysis for w in phrase]
+    if None in records:
+        raise ProcessException('Phrase "{}" has not been processed with spaCy.'.format(phrase.hyphenated))
+
+    vocab = load_spacy(spacy_profile).vocab
+    trans_doc = Doc(vocab, words=[w.string for w in phrase])
+
+    # Set all the annotations at once from an array of string IDs
+    # (empty strings for missing annotations), with the heads given
+    # as offsets from each token, as Doc.to_array() produces them.
+    annotations = np.array([[vocab.strings.add(r.pos or ''),
+                             vocab.strings.add(r.tag or ''),
+                             vocab.strings.add(r.lemma or ''),
+                             (r.head - i) % 2**64,
+                             vocab.strings.add(r.dep or '')]
+                            for i, r in enumerate(records)], dtype='uint64')
+    trans_doc.from_array([POS, TAG, LEMMA, HEAD, DEP], annotations)
+    return trans_doc
+
+
+def rehydrate_token(word: Word, spacy_profile=PROFILE_PARSE) -> Token:
+    """
+    Rebuild the spaCy Token for a processed translation word.
+    (Rebuild the Doc with rehydrate_doc to get more than one.)
+    """
+    return rehydrate_doc(word.phrase, spacy_profile=spacy_profile)[word.index]
+
+
 def process_trans_if_needed(inst: Instance):
     if not hasattr(inst.trans, '_processed'):
         process_trans(inst)
+
+def gold_trans_tags(phrase: Phrase) -> List[str]:
+    """
+    Return the POS tags the translation words were imported
+    with, whether or not the phrase has since been processed.
+    """
+    if hasattr(phrase, '_processed'):
+        return list(getattr(phrase, '_gold_tags', []))
+    return [tw.pos for tw in phrase]
+
+
+# -------------------------------------------
+# Test Cases
+# -------------------------------------------
+from unittest import TestCase
+
+
+def tagged_doc(vocab, words: List[str], tags: List[str]) -> Doc:
+    """
+    Build a Doc with the given tags, set with from_array as
+    the Doc constructor only takes tags from spaCy 3.
+    """
+    doc = Doc(vocab, words=words)
+    doc.from_array([TAG], np.array([[vocab.strings.add(tag)] for tag in tags], dtype='uint64'))
+    return doc
+
+
+class TokenRecordTests(TestCase):
+    def setUp(self):
+        self.inst = Instance.from_strings(['ni iya', '1pl moon', 'the dog ran'])
+        self.analysis = [('DET', 'the', 1, 'det'), ('NOUN', 'dog', 2, 'nsubj'), ('VERB', 'run', 2, 'ROOT')]
+
+    def test_records(self):
+        trans_doc = tagged_doc(load_spacy(PROFILE_LEMMA).vocab, ['the', 'dog', 'ran'], ['DT', 'NN', 'VBD'])
+        assign_trans_analysis(self.inst, self.analysis, trans_doc=trans_doc)
+        self.assertEqual(self.inst.trans[1].analysis,
+                         TokenRecord('NOUN', 'NN', 'dog', 2, 'nsubj', NO_VECTOR_ROW))
+        self.assertFalse(any(isinstance(w.analysis, Token) for w in self.inst.trans))
+
+    def test_rehydrate(self):
+        assign_trans_analysis(self.inst, self.analysis)
+        trans_doc = rehydrate_doc(self.inst.trans, spacy_profile=PROFILE_LEMMA)
+        self.assertListEqual(doc_to_analysis(trans_doc), self.analysis)
+
+        token = rehydrate_token(self.inst.trans[1], spacy_profile=PROFILE_LEMMA)
+        self.assertEqual((token.text, token.head.text), ('dog', 'ran'))
+
+        self.inst.trans[0].analysis = None
+        self.assertRaises(ProcessException, rehydrate_doc, self.inst.trans, PROFILE_LEMMA)
+
+    def test_vectors(self):
+        vocab = load_spacy(PROFILE_LEMMA).vocab
+        vocab.set_vector('dog', np.array([1.0, 2.0], dtype='float32'))
+        self.addCleanup(vocab.reset_vectors, shape=(0, 0))
+        trans_doc = Doc(vocab, words=['the', 'dog', 'ran'])
+        assign_trans_analysis(self.inst, self.analysis, trans_doc=trans_doc)
+
+        vectors = VectorTable()
+        assign_trans_vectors(self.inst.trans, spacy_profile=PROFILE_LEMMA, vectors=vectors)
+        self.assertListEqual([w.vector_row for w in self.inst.trans], [NO_VECTOR_ROW, 0, NO_VECTOR_ROW])
+        self.assertListEqual(vectors.vector(self.inst.trans[1].vector_row).tolist(), [1.0, 2.0])
+
+    def test_gold_tags(self):
+        for tw, tag in zip(self.inst.trans, ['DET', 'PROPN', None]):
+            tw.pos = tag
+        assign_trans_analysis(self.inst, self.analysis)
+        self.assertListEqual(self.inst.trans.tags, ['DET', 'NOUN', 'VERB'])
+        self.assertListEqual(gold_trans_tags(self.inst.trans), ['DET', 'PROPN', None])
+
+        # Processing the line again keeps the imported tags.
+        assign_trans_analysis(self.inst, self.analysis)
+        self.assertListEqual(gold_trans_tags(self.inst.trans), ['DET', 'PROPN', None])
+
+    def test_cached_records(self):
+        vocab = load_spacy(PROFILE_LEMMA).vocab
+        vocab.set_vector('dog', np.array([1.0, 2.0], dtype='float32'))
+        self.addCleanup(vocab.reset_vectors, shape=(0, 0))
+        trans_doc = tagged_doc(vocab, ['the', 'dog', 'ran'], ['DT', 'NN', 'VBD'])
+        details = doc_details(trans_doc)
+        self.assertEqual(details[0], ('DT', None))
+
+        # The records rebuilt from the cached details match those from the Doc.
+        self.assertListEqual(cached_records(self.analysis, details, spacy_profile=PROFILE_LEMMA),
+                             analysis_records(self.analysis, trans_doc=trans_doc))
+        record = cached_records(self.analysis, details, spacy_profile=PROFILE_LEMMA)[1]
+        self.assertEqual(record.tag, 'NN')
+        self.assertNotEqual(record.vector_row, NO_VECTOR_ROW)
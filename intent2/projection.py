@@ -9,6 +9,7 @@ namely:
 """
 from intent2.model import Instance, Word, SubWord, Phrase, DependencyLink, TransWord
 from intent2.processing import process_trans_if_needed
+from intent2.symbols import SymbolTable, SYMBOLS
 from typing import Iterable, Generator, List, Tuple, Iterator, Union
 import itertools
 
@@ -54,8 +55,9 @@ def project_ds(inst: Instance):
     # -- 0) Start by ensuring the translation line has a ds.
     process_trans_if_needed(inst)
 
-    # -- 1) Get the dependency structure, anc create a copy.
-    new_ds = inst.trans.dependency_structure.copy()
+    # -- 1) Get the dependency structure, and create a copy.
+    trans_da = inst.trans.dependency_array
+    new_ds = trans_da.to_structure() if trans_da is not None else inst.trans.dependency_structure.copy()
     for trans_word in [tw for tw in inst.trans if not tw.alignments]:
         new_ds.remove_word(trans_word)
 
@@ -74,24 +76,41 @@ def project_ds(inst: Instance):
     assert set(aligned_lang_words) & unaligned_lang_words == set([])
 
     # -- 3) Look for duplicate LangWords, and only keep the shallowest copy.
+    #
+    #       The depths are all taken before any links are removed, since
+    #       removing a link that is deeper than another copy of the same
+    #       word (or that no root reaches) leaves every word's depth as it was.
+    link_depths = {parent_link: new_ds.depth(parent_link)
+                   for word in aligned_lang_words
+                   for parent_link in new_ds.get_parent_links(word)}
+
     for word in aligned_lang_words:
 
         # Get the depth of the word in the tree (minimum number
-        # of links traversed to make it to a root)
+        # of links traversed to make it to a root). Links
+        # that no root reaches have no depth.
         parent_links = list(new_ds.get_parent_links(word))
-        min_depth = min([new_ds.depth(parent_link) for parent_link in parent_links]) if parent_links else None
+        depths = [link_depths[parent_link] for parent_link in parent_links
+                  if link_depths[parent_link] is not None]
+        min_depth = min(depths) if depths else None
 
-        # Remove all the links that have a depth less than the min_depth.
+        # Remove all the links that are deeper than the min_depth.
         # TODO: What about the case when multiple copies are at the same depth?
         for parent_link in parent_links:
-            if new_ds.depth(parent_link) > min_depth:
-                new_ds.remove(parent_link)
 
-            # Also, make sure to remove any cycles (links where the child
+            # Make sure to remove any cycles (links where the child
             # is the same node as the parent.
             if parent_link.parent and parent_link.child == parent_link.parent:
                 new_ds.remove(parent_link)
 
+            elif min_depth is not None and (link_depths[parent_link] is None or
+                                            link_depths[parent_link] > min_depth):
+                new_ds.remove(parent_link)
+
+    if new_ds.cycles:
+        DS_PROJ_LOG.info('Projected DS for instance "{}" contains cycles: {}'.format(
+            inst.id, [sorted(w.index for w in cycle) for cycle in new_ds.cycles]))
+
     # -- 4) Reattach unaligned words.
     #       Unaligned attachment from Quirk, et. al, 2005:
     #
@@ -183,6 +202,11 @@ def project_ds(inst: Instance):
 precedence = ['PROPN', 'NOUN','VERB', 'ADJ', 'ADV', 'PRON', 'DET', 'ADP', 'CONJ', 'CCONJ', 'PART', 'PRT', 'NUM', 'PUNC', 'X', 'SYM', 'INTJ', 'PUNCT']
 
 
+# The rank of each tag in the precedence list, so that tags
+# are ordered by comparing integers.
+precedence_rank = {tag: rank for rank, tag in enumerate(precedence)}
+
+
 def choose_tag(taglist: List[str], method='precedence'):
     """
     Choose the tag from a list of possible tags that represent multiple
@@ -192,8 +216,7 @@ def choose_tag(taglist: List[str], method='precedence'):
     # If 'precedence' is the multiple alignment for subwords,
     # choose from the multiple alignments by order of precedence
     if method == 'precedence':
-        best_tags = sorted(taglist, key=lambda tag: precedence.index(tag))
-        return best_tags[0] if best_tags else None
+        return min(taglist, key=precedence_rank.__getitem__) if taglist else None
 
     # The 'avoid' method avoids assigning any tag if there are multiple options
     elif method == 'avoid':
@@ -209,7 +232,8 @@ def choose_tag(taglist: List[str], method='precedence'):
 
 def project_pos(inst: Instance,
                 subword_multiple_alignment='precedence',
-                word_multiple_alignment='precedence'):
+                word_multiple_alignment='precedence',
+                symbols: SymbolTable = None):
     """
     Project part-of-speech tags using the bilingual alignment.
 
@@ -224,12 +248,15 @@ def project_pos(inst: Instance,
    :param subword_multiple_alignment: Same as above, but the translation words
              are initially aligned with subword elements (e.g. 1sg.read-PAST can
              have 1sg <-> 'I' and read  <-> 'read' constitute one subword (morpheme))
+
+    :param symbols: The table to intern the projected tags with.
     """
     ENRICH_LOG.info('Projecting part-of-speech tags.')
 
     # There must be alignments present to project
     assert inst.trans.alignments and inst.trans and inst.gloss
     process_trans_if_needed(inst)
+    intern = (SYMBOLS if symbols is None else symbols).intern
 
     for gloss_w in inst.gloss:
 
@@ -238,7 +265,7 @@ def project_pos(inst: Instance,
             for gloss_sw in gloss_w.subwords:
                 aligned_trans_words = gloss_sw.aligned_words(TransWord)
                 aligned_trans_tags = [tw.pos for tw in aligned_trans_words if tw.pos]
-                gloss_sw.pos = choose_tag(aligned_trans_tags, method=subword_multiple_alignment)
+                gloss_sw.pos = intern(choose_tag(aligned_trans_tags, method=subword_multiple_alignment))
                 POS_PROJ_LOG.debug('Subword tag chosen for {}[{}]: {}'.format(gloss_sw.string,
                                                                               gloss_sw.id,
                                                                               gloss_sw.pos))
@@ -246,7 +273,7 @@ def project_pos(inst: Instance,
 
         # Choose the gloss tags at the word level
         aligned_trans_tags = [tw.pos for tw in gloss_w.aligned_words(TransWord) if tw.pos]
-        gloss_w.pos = choose_tag(aligned_trans_tags, method=word_multiple_alignment)
+        gloss_w.pos = intern(choose_tag(aligned_trans_tags, method=word_multiple_alignment))
         POS_PROJ_LOG.debug('Gloss Word tag chosen for {}[{}]: {}'.format(gloss_w.hyphenated,
                                                                          gloss_w.id,
                                                                          gloss_w.pos))
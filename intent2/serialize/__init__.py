@@ -0,0 +1 @@
+from intent2.serialize.snapshot import save_snapshot, load_snapshot, dumps_snapshot, loads_snapshot, load_corpus
@@ -9,7 +9,7 @@ from datetime import datetime
 
 import logging
 
-from intent2.xigt_helpers import generate_tier_id
+from intent2.xigt_helpers import TierIdRegistry
 from .consts import *
 
 EXPORT_LOG = logging.getLogger('export')
@@ -26,6 +26,37 @@ def add_timestamp():
     return datetime.now().strftime('%Y-%m-%d %H:%M:%S')
 # -------------------------------------------
 
+
+class ExportContext(object):
+    """
+    The state shared by the annotation tiers added to a single exported
+    Xigt instance: the ids of the tiers it already has (so that a new
+    tier can be given a unique id without searching the instance), and
+    the creation time recorded on each of them.
+    """
+    def __init__(self, xigt_inst: Igt, timestamp: str = None):
+        """
+        :param timestamp: The creation time to record. Pass the same
+                          timestamp (from add_timestamp) to the contexts of
+                          every instance exported in one run. If not given,
+                          the current time is used.
+        """
+        self.xigt_inst = xigt_inst
+        self.timestamp = add_timestamp() if timestamp is None else timestamp
+        self.tier_ids = TierIdRegistry(xigt_inst)
+
+    def tier_id(self, tier_type: str, tier_annotating_1: str, tier_annotating_2: str = None) -> str:
+        return self.tier_ids.generate(tier_type, tier_annotating_1, tier_annotating_2)
+
+    def append(self, tier: Tier):
+        self.tier_ids.append(tier)
+
+def _export_context(xigt_inst: Igt, context: ExportContext = None) -> ExportContext:
+    if context is None:
+        return ExportContext(xigt_inst)
+    assert context.xigt_inst is xigt_inst, 'The export context belongs to another instance.'
+    return context
+
 def corpus_to_xigt(corp: Corpus):
     """
     Given an INTENT2 Corpus object,
@@ -122,46 +153,52 @@ def tier_to_xigt(igt: Igt,
     if sw_dict:
         igt.append(subword_tier)
 
-def xigt_add_pos(xigt_inst: Igt, tokens: List[Union[Word, SubWord]], tgt_id: str, method):
+def xigt_add_pos(xigt_inst: Igt, tokens: List[Union[Word, SubWord]], tgt_id: str, method,
+                 context: ExportContext = None):
     """
     Given a xigt instance, and list of tagged words or subwords, add
     an appropriate pos-tagged tier to the Xigt instance.
+
+    :param context: The export context of the instance, when several
+                    tiers are added to it.
     """
-    pos_tier_id = generate_tier_id(xigt_inst, 'pos', tgt_id)
+    context = _export_context(xigt_inst, context)
+    pos_tier_id = context.tier_id('pos', tgt_id)
     pos_tier = Tier(type='pos', id=pos_tier_id,
                     alignment=tgt_id,
                     attributes={DATA_PROV_KEY: INTENT2_DATA_PROV,
                                 DATA_METHOD_KEY: method,
-                                DATA_TIME_KEY: add_timestamp()})
+                                DATA_TIME_KEY: context.timestamp})
     for i, token in enumerate(tokens):
         if token.pos:
             token_id = '{}_{}'.format(pos_tier_id, i+1)
             pos_item = Item(text=token.pos, id=token_id, alignment=token.id)
             pos_tier.append(pos_item)
     if pos_tier.items:
-        xigt_inst.append(pos_tier)
+        context.append(pos_tier)
     return pos_tier
 
-def xigt_add_bilingual_alignment(xigt_inst: Igt, trans: Phrase, method):
+def xigt_add_bilingual_alignment(xigt_inst: Igt, trans: Phrase, method,
+                                 context: ExportContext = None):
     """
     Given the translation phrase object, add the encoded alignments
     to a bilingual-alignments tier.
     """
-
-    tw_to_g_tier_id = generate_tier_id(xigt_inst, 'bilingual-alignments', TRANS_WORD_ID, GLOSS_SUBWORD_ID)
+    context = _export_context(xigt_inst, context)
+    tw_to_g_tier_id = context.tier_id('bilingual-alignments', TRANS_WORD_ID, GLOSS_SUBWORD_ID)
     tw_to_g_tier = Tier(id=tw_to_g_tier_id, type='bilingual-alignments',
                         attributes={'source': TRANS_WORD_ID,
                                     'target': GLOSS_SUBWORD_ID,
                                     DATA_PROV_KEY: INTENT2_DATA_PROV,
                                     DATA_METHOD_KEY: method,
-                                    DATA_TIME_KEY: add_timestamp()})
+                                    DATA_TIME_KEY: context.timestamp})
 
-    tw_to_lw_id = generate_tier_id(xigt_inst, 'bilingual-alignments', TRANS_WORD_ID, LANG_WORD_ID)
+    tw_to_lw_id = context.tier_id('bilingual-alignments', TRANS_WORD_ID, LANG_WORD_ID)
     tw_to_lw_tier = Tier(id=tw_to_lw_id, type='bilingual-alignments',
                          attributes={'source': TRANS_WORD_ID,
                                      'target': LANG_WORD_ID,
                                      DATA_PROV_KEY: INTENT2_DATA_PROV,
-                                     DATA_TIME_KEY: add_timestamp()})
+                                     DATA_TIME_KEY: context.timestamp})
 
     for t_w in trans: # type: TransWord
         for aligned_gloss in [item for item in t_w.alignments if isinstance(item, SubWord)]:
@@ -183,27 +220,35 @@ def xigt_add_bilingual_alignment(xigt_inst: Igt, trans: Phrase, method):
 
     # Only append if it's not empty.
     if tw_to_g_tier:
-        xigt_inst.append(tw_to_g_tier)
+        context.append(tw_to_g_tier)
     if tw_to_lw_tier:
-        xigt_inst.append(tw_to_lw_tier)
+        context.append(tw_to_lw_tier)
 
-def xigt_add_dependencies(xigt_inst: Igt, phrase: Phrase, method: str):
+def xigt_add_dependencies(xigt_inst: Igt, phrase: Phrase, method: str,
+                          context: ExportContext = None):
     """
     Given a phrase that has a dependency structure analysis,
     render it into
     """
     # Skip adding dependency structure if none exists for this phrase.
-    if not phrase.dependency_structure:
+    # (The array form is already in order, and needn't be converted.)
+    if phrase.dependency_array is not None:
+        dep_links = list(phrase.dependency_array.links())
+    elif phrase.dependency_structure:
+        dep_links = sorted(phrase.dependency_structure, key=lambda link: link.child.index)
+    else:
+        dep_links = []
+    if not dep_links:
         return
 
-    dep_tier_id = generate_tier_id(xigt_inst, 'dependencies', phrase.id)
+    context = _export_context(xigt_inst, context)
+    dep_tier_id = context.tier_id('dependencies', phrase.id)
     dep_tier = Tier(type='dependencies', id=dep_tier_id,
                     attributes={'dep':phrase.id, 'head':phrase.id,
                                 DATA_PROV_KEY: INTENT2_DATA_PROV,
                                 DATA_METHOD_KEY: method,
-                                DATA_TIME_KEY: add_timestamp()})
-    for i, dep_link in enumerate(sorted(phrase.dependency_structure,
-                                        key=lambda link: link.child.index)):
+                                DATA_TIME_KEY: context.timestamp})
+    for i, dep_link in enumerate(dep_links):
         dep_item = Item(id='{}_dep{}'.format(dep_tier_id, i+1),
                         attributes={'dep':dep_link.child.id})
         if dep_link.parent:
@@ -212,14 +257,15 @@ def xigt_add_dependencies(xigt_inst: Igt, phrase: Phrase, method: str):
             dep_item.text = dep_link.type
         dep_tier.append(dep_item)
     if dep_tier:
-        xigt_inst.append(dep_tier)
+        context.append(dep_tier)
 
 
-def xigt_add_all_pos(inst: Instance, xigt_inst: Igt, method):
-    xigt_add_pos(xigt_inst, inst.lang, LANG_WORD_ID, method)
-    xigt_add_pos(xigt_inst, inst.gloss, GLOSS_WORD_ID, method)
-    xigt_add_pos(xigt_inst, inst.gloss.subwords, GLOSS_SUBWORD_ID, method)
-    xigt_add_pos(xigt_inst, inst.trans, TRANS_WORD_ID, method)
+def xigt_add_all_pos(inst: Instance, xigt_inst: Igt, method, context: ExportContext = None):
+    context = _export_context(xigt_inst, context)
+    xigt_add_pos(xigt_inst, inst.lang, LANG_WORD_ID, method, context=context)
+    xigt_add_pos(xigt_inst, inst.gloss, GLOSS_WORD_ID, method, context=context)
+    xigt_add_pos(xigt_inst, inst.gloss.subwords, GLOSS_SUBWORD_ID, method, context=context)
+    xigt_add_pos(xigt_inst, inst.trans, TRANS_WORD_ID, method, context=context)
 
 
 def instance_to_xigt(inst: Instance):
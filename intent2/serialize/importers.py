@@ -5,11 +5,13 @@ import xigt
 import xigt.codecs.xigtxml
 from xigt.errors import XigtStructureError
 from xigt.model import Igt, Item
-from intent2.xigt_helpers import xigt_find
+from intent2.xigt_helpers import xigt_find, ref_index
 from intent2.model import Word, GlossWord, TransWord, LangWord, SubWord, Phrase, TaggableMixin, Instance, Corpus
+from intent2.symbols import SymbolTable, SYMBOLS
+from intent2.utils.memory import gc_paused
 from intent2.utils.strings import subword_str_to_subword, word_tokenize, word_str_to_subwords
 
-from typing import Union, Iterable, Tuple
+from typing import Dict, List, Union, Iterable, Tuple
 
 import logging
 IMPORT_LOG = logging.getLogger('import')
@@ -339,9 +341,10 @@ def force_token_alignments(src_aln_tier: xigt.model.Tier):
     Take a tier which is expected to have alignments, and do a preliminary
     pass to ensure the tokens have alignments.
     """
-    aligned_items = list(filter(lambda item: item.alignment, src_aln_tier))
-    if len(aligned_items) != len(src_aln_tier) and src_aln_tier.alignment:
-        tgt_aln_tier = xigt_find(src_aln_tier.igt, id=src_aln_tier.alignment)
+    # Items with no alignment target are indexed under None.
+    unaligned_items = ref_index(src_aln_tier, xigt.consts.ALIGNMENT).get(None)
+    if unaligned_items and src_aln_tier.alignment:
+        tgt_aln_tier = src_aln_tier.igt.get(src_aln_tier.alignment)
         assert tgt_aln_tier
 
 
@@ -495,13 +498,16 @@ def load_words(id_to_object_mapping,
     elif segmentation_tier and words_tier:
         words = []
 
+        # Index the segments by the words they segment in one pass,
+        # rather than rescanning the segmentation tier for every word.
+        segments = segment_index(segmentation_tier)
+
         # For each word in the tier, retrieve the portions of the word
         # that are given as segments
         prev_sw = None
         for xigt_word_item in words_tier:  # type: xigt.model.Item
 
-            morph_segments = [morph for morph in segmentation_tier
-                              if xigt_word_item.id in segmenting_refs(morph)]
+            morph_segments = segments.get(xigt_word_item.id)
 
             # If the segmentation tier is provided,
             # we assume that every word has some form
@@ -550,13 +556,16 @@ def load_words(id_to_object_mapping,
     else:
         raise ImportException("Unable to create phrase.")
 
-def segmenting_refs(morph: xigt.model.Item):
-    if morph.content:
-        return xigt.ref.ids(morph.content)
-    elif morph.segmentation:
-        return xigt.ref.ids(morph.segmentation)
-    else:
-        raise SegmentationTierException('Neither segmentation nor content was given for morph "{}"'.format(morph.id))
+def segment_index(segmentation_tier: xigt.model.Tier) -> Dict[str, List[Item]]:
+    """
+    Map the id of each item that the segmentation tier segments
+    to its segments, in order. A segment's content reference is
+    used if it has one, and its segmentation reference otherwise.
+    """
+    index = ref_index(segmentation_tier, xigt.consts.CONTENT, xigt.consts.SEGMENTATION)
+    if None in index:
+        raise SegmentationTierException('Neither segmentation nor content was given for morph "{}"'.format(index[None][0].id))
+    return index
 
 
 
@@ -600,39 +609,49 @@ def parse_trans_tier(inst, id_to_object_mapping):
 
         return trans_phrase
 
-def parse_pos(inst, pos_id, id_to_object_mapping):
+def parse_pos(inst, pos_id, id_to_object_mapping, symbols: SymbolTable = None):
     """
     Parse pre-existing POS tag tiers.
+
+    :param symbols: The table to intern the tags with.
     """
+    intern = (SYMBOLS if symbols is None else symbols).intern
     pos_tag_tier = xigt_find(inst, alignment=pos_id, type='pos') or []
     for pos_tag_item in pos_tag_tier:  # type: xigt.model.Item
         aligned_object = id_to_object_mapping.get(pos_tag_item.alignment) # type: TaggableMixin
         if aligned_object:
-            aligned_object.pos = pos_tag_item.value()
+            aligned_object.pos = intern(pos_tag_item.value())
 
 
 
 # -------------------------------------------
 # Now, parse into INTENT2 model
 # -------------------------------------------
-def parse_xigt_corpus(xigt_corpus, ignore_import_errors=True):
+def parse_xigt_corpus(xigt_corpus, ignore_import_errors=True, symbols: SymbolTable = None):
     """
     :type xigt_corpus: xigt.model.XigtCorpus
+    :param symbols: The table to intern the corpus's strings with.
     :rtype: Corpus
     """
     from intent2.model import Corpus
 
+    symbols = SYMBOLS if symbols is None else symbols
     instances = []
-    for xigt_inst in xigt_corpus:
-        try:
-            intent_inst = parse_xigt_instance(xigt_inst)
-            instances.append(intent_inst)
-        except (ImportException, XigtStructureError) as ie:
-            IMPORT_LOG.error('There was an error importing instance "{}": {}'.format(xigt_inst.id, ie))
-            if not ignore_import_errors:
-                raise ie
 
-    return Corpus(instances)
+    # The instances are built with the cyclic garbage collector
+    # paused, as it would otherwise rescan the objects being
+    # created over and over.
+    with gc_paused():
+        for xigt_inst in xigt_corpus:
+            try:
+                intent_inst = parse_xigt_instance(xigt_inst, symbols=symbols)
+                instances.append(intent_inst)
+            except (ImportException, XigtStructureError) as ie:
+                IMPORT_LOG.error('There was an error importing instance "{}": {}'.format(xigt_inst.id, ie))
+                if not ignore_import_errors:
+                    raise ie
+
+    return Corpus(instances, symbols=symbols)
 
 def parse_odin(xigt_inst, tag, WordType,
                word_id_base, subword_id_base):
@@ -678,6 +697,7 @@ def assign_ids(p: Phrase, word_id_base: str, subword_id_base: str):
         word.id = item_id(word_id_base, word.index+1)
     for i, subword in enumerate(p.subwords):
         subword.id = item_id(subword_id_base, i+1)
+    p._words_changed()
 
 
 def parse_bilingual_alignments(xigt_inst: Igt,
@@ -743,7 +763,7 @@ def align_gloss_lang_sw(gloss: Phrase, lang: Phrase):
         lang_word.add_alignment(gloss_word) # Reciprocal is added automatically
 
 
-def parse_xigt_instance(xigt_inst: Igt):
+def parse_xigt_instance(xigt_inst: Igt, symbols: SymbolTable = None):
     """
     Given a Xigt instance, parse it into the INTENT2 objects
     for processing.
@@ -754,6 +774,7 @@ def parse_xigt_instance(xigt_inst: Igt):
        * a type="translations" tier that provides translations
 
     :type xigt_inst: xigt.model.Igt
+    :param symbols: The table to intern the token strings, ids, and tags with.
     """
 
     # Keep a mapping of the ID strings and their associated mappings
@@ -786,15 +807,25 @@ def parse_xigt_instance(xigt_inst: Igt):
     except ImportException as ie:
         IMPORT_LOG.warning('Error aligning gloss and language tokens for instance "{}": {}'.format(xigt_inst.id, ie))
 
-    # -- 2) Add any POS tags found.
-    parse_pos(xigt_inst, 'm', id_to_object_mapping)
-    parse_pos(xigt_inst, 'w', id_to_object_mapping)
-    parse_pos(xigt_inst, 'gw', id_to_object_mapping)
+    # -- 1e) Intern the strings that repeat across the corpus
+    #        (before they become keys of the instance's ID index).
+    symbols = SYMBOLS if symbols is None else symbols
+    for phrase in (lang_p, gloss_p, trans_p):
+        symbols.intern_phrase(phrase)
 
+    inst = Instance(lang_p, gloss_p, trans_p, id=xigt_inst.id)
 
-    parse_bilingual_alignments(xigt_inst, id_to_object_mapping)
+    # -- 2) Add any POS tags found, looking up the tokens they
+    #       refer to in the instance's ID index (which, unlike the
+    #       mapping above, includes tokens created from ODIN lines).
+    parse_pos(xigt_inst, 'm', inst.id_index, symbols=symbols)
+    parse_pos(xigt_inst, 'w', inst.id_index, symbols=symbols)
+    parse_pos(xigt_inst, 'gw', inst.id_index, symbols=symbols)
+    parse_pos(xigt_inst, 'tw', inst.id_index, symbols=symbols)
+
+
+    parse_bilingual_alignments(xigt_inst, inst.id_index)
 
-    inst = Instance(lang_p, gloss_p, trans_p, id=xigt_inst.id)
     return inst
 
 
@@ -0,0 +1,305 @@
+"""
+A corpus that is read from a Xigt-XML file on demand.
+
+Opening the file only scans it for the byte offsets and ids of
+its <igt> elements. Each instance is then decoded and parsed into
+the INTENT2 model the first time it is accessed, and the parsed
+instances are kept in a least-recently-used cache, so that a few
+instances of a very large file can be used without parsing (or
+holding in memory) the rest.
+"""
+import mmap
+import re
+from collections import OrderedDict
+from typing import Iterator, List, Tuple, Union
+
+import xigt.codecs.xigtxml
+from xigt.errors import XigtStructureError
+from xigt.model import Igt
+
+from intent2.model import Instance
+from intent2.serialize.importers import parse_xigt_instance, ImportException
+from intent2.symbols import SymbolTable
+
+import logging
+INDEX_LOG = logging.getLogger('indexed')
+
+# 64 MB of Xigt-XML
+DEFAULT_CACHE_BYTES = 64 * 1024 * 1024
+
+IGT_START_RE = re.compile(rb'<igt[\s>/]')
+CORPUS_START_RE = re.compile(rb'<xigt-corpus[\s>]')
+ID_ATTR_RE = re.compile(rb'\sid\s*=\s*(["\'])(.*?)\1', re.S)
+
+
+class IndexException(Exception): pass
+
+
+def index_xigt_file(path: str) -> Tuple[bytes, List[Tuple[str, int, int]]]:
+    """
+    Scan a Xigt-XML file for the start tag of its root
+    element, and the (id, start, end) byte span of each
+    of its <igt> elements.
+    """
+    with open(path, 'rb') as xigt_f:
+        with mmap.mmap(xigt_f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            corpus_match = CORPUS_START_RE.search(data)
+            if corpus_match is None:
+                raise IndexException('No <xigt-corpus> element found in "{}"'.format(path))
+            root_tag = data[corpus_match.start():data.find(b'>', corpus_match.start()) + 1]
+
+            spans = []
+            pos = corpus_match.end()
+            while True:
+                igt_match = IGT_START_RE.search(data, pos)
+                if igt_match is None:
+                    break
+                start = igt_match.start()
+                tag_end = data.find(b'>', start)
+                if tag_end < 0:
+                    raise IndexException('Unclosed <igt> tag at byte {} of "{}"'.format(start, path))
+                start_tag = data[start:tag_end + 1]
+
+                # Instances with no content end with their start tag.
+                if start_tag.endswith(b'/>'):
+                    end = tag_end + 1
+                else:
+                    end = data.find(b'</igt>', tag_end)
+                    if end < 0:
+                        raise IndexException('Unclosed <igt> element at byte {} of "{}"'.format(start, path))
+                    end += len(b'</igt>')
+
+                id_match = ID_ATTR_RE.search(start_tag)
+                igt_id = id_match.group(2).decode('utf-8') if id_match else None
+                spans.append((igt_id, start, end))
+                pos = end
+
+    if root_tag.endswith(b'/>'):
+        root_tag = root_tag[:-2] + b'>'
+    return root_tag, spans
+
+
+class XigtFileSource(object):
+    """
+    The instances of a Xigt-XML file, read from their byte
+    spans, and the cache of those that have been parsed.
+
+    Evicted instances are freed by reference counting as soon as
+    nothing else refers to them. Their strings are interned in a
+    table of the file's own (unless one is given), rather than the
+    shared intent2.symbols.SYMBOLS, so that they are not kept for
+    the life of the process either.
+    """
+    def __init__(self, path: str, cache_bytes: int = DEFAULT_CACHE_BYTES,
+                 symbols: SymbolTable = None):
+        self.path = path
+        self.symbols = SymbolTable() if symbols is None else symbols
+        self.cache_bytes = cache_bytes
+        self.root_tag, self.spans = index_xigt_file(path)
+
+        self._file = open(path, 'rb')
+        self._cache = OrderedDict()  # type: OrderedDict[int, Instance]
+        self._cached_bytes = 0
+
+    def igt(self, i: int) -> Igt:
+        """
+        Decode the Xigt instance at position i.
+        """
+        igt_id, start, end = self.spans[i]
+        self._file.seek(start)
+        igt_xml = self._file.read(end - start)
+
+        # Decode the instance inside the file's own root element,
+        # so that any namespaces declared there still apply.
+        corpus_xml = self.root_tag + igt_xml + b'</xigt-corpus>'
+        return xigt.codecs.xigtxml.loads(corpus_xml.decode('utf-8'))[0]
+
+    def instance(self, i: int) -> Instance:
+        """
+        Return the parsed instance at position i, parsing it
+        if it is not in the cache.
+        """
+        inst = self._cache.get(i)
+        if inst is not None:
+            self._cache.move_to_end(i)
+            return inst
+
+        inst = parse_xigt_instance(self.igt(i), symbols=self.symbols)
+        self._cache[i] = inst
+        self._cached_bytes += self._span_size(i)
+
+        # Evict the least recently used instances, but always keep the
+        # one that was just parsed. (They are not released, as the caller
+        # may still hold them; see IndexedCorpus.)
+        while self._cached_bytes > self.cache_bytes and len(self._cache) > 1:
+            evicted, evicted_inst = self._cache.popitem(last=False)
+            self._cached_bytes -= self._span_size(evicted)
+        return inst
+
+    def _span_size(self, i: int) -> int:
+        igt_id, start, end = self.spans[i]
+        return end - start
+
+    @property
+    def num_cached(self) -> int:
+        return len(self._cache)
+
+    def close(self):
+        self._file.close()
+        self._cache.clear()
+        self._cached_bytes = 0
+
+
+class IndexedCorpus(object):
+    """
+    A corpus of instances parsed from a Xigt-XML file as they
+    are used. Instances can be looked up by position or by id
+    (corpus[3], corpus['igt123']), and slices return a view of
+    the same file that shares its cache.
+
+    The cache is limited by the size of the source XML of the
+    instances it holds (cache_bytes). An instance that has been
+    evicted is parsed again the next time it is accessed, so any
+    changes to it are lost unless a reference to it is kept.
+    """
+    def __init__(self, path: str = None, cache_bytes: int = DEFAULT_CACHE_BYTES,
+                 symbols: SymbolTable = None, ignore_import_errors: bool = True,
+                 source: XigtFileSource = None, positions: range = None):
+        """
+        :param ignore_import_errors: Whether instances that fail to import
+                                     are skipped (and logged) when iterating.
+        """
+        self._source = XigtFileSource(path, cache_bytes, symbols) if source is None else source
+        self._positions = range(len(self._source.spans)) if positions is None else positions
+        self._id_positions = None
+        self.ignore_import_errors = ignore_import_errors
+
+    @property
+    def symbols(self) -> SymbolTable:
+        return self._source.symbols
+
+    @property
+    def ids(self) -> List[str]:
+        spans = self._source.spans
+        return [spans[pos][0] for pos in self._positions]
+
+    def _position(self, igt_id: str) -> int:
+        if self._id_positions is None:
+            spans = self._source.spans
+            self._id_positions = {spans[pos][0]: pos for pos in self._positions}
+        try:
+            return self._id_positions[igt_id]
+        except KeyError:
+            raise KeyError('No instance with id "{}"'.format(igt_id))
+
+    def __len__(self):
+        return len(self._positions)
+
+    def __contains__(self, igt_id: str):
+        try:
+            self._position(igt_id)
+            return True
+        except KeyError:
+            return False
+
+    def __getitem__(self, key: Union[int, str, slice]):
+        """
+        :rtype: Union[Instance, IndexedCorpus]
+        """
+        if isinstance(key, slice):
+            return IndexedCorpus(source=self._source, positions=self._positions[key],
+                                 ignore_import_errors=self.ignore_import_errors)
+        elif isinstance(key, str):
+            return self._source.instance(self._position(key))
+        return self._source.instance(self._positions[key])
+
+    def igt(self, key: Union[int, str]) -> Igt:
+        """
+        Return the Xigt instance at the position or with the id, as
+        read from the file (without parsing it into the INTENT2 model).
+        """
+        pos = self._position(key) if isinstance(key, str) else self._positions[key]
+        return self._source.igt(pos)
+
+    def __iter__(self) -> Iterator[Instance]:
+        for pos in self._positions:
+            try:
+                yield self._source.instance(pos)
+            except (ImportException, XigtStructureError) as ie:
+                INDEX_LOG.error('There was an error importing instance "{}": {}'.format(self._source.spans[pos][0], ie))
+                if not self.ignore_import_errors:
+                    raise ie
+
+    def close(self):
+        self._source.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def __repr__(self):
+        return '<IndexedCorpus of {} instances from "{}">'.format(len(self), self._source.path)
+
+
+# -------------------------------------------
+# Test Cases
+# -------------------------------------------
+import os
+from unittest import TestCase
+
+
+class IndexedCorpusTests(TestCase):
+    def setUp(self):
+        self.path = os.path.join(os.path.dirname(__file__), '../testcases/seg_tests.xml')
+        self.corpus = IndexedCorpus(self.path)
+
+    def tearDown(self):
+        self.corpus.close()
+
+    def test_index(self):
+        with open(self.path, 'r') as xigt_f:
+            xc = xigt.codecs.xigtxml.load(xigt_f)
+        self.assertListEqual(self.corpus.ids, [igt.id for igt in xc])
+        for igt in xc:
+            self.assertEqual(xigt.codecs.xigtxml.encode_igt(self.corpus.igt(igt.id)),
+                             xigt.codecs.xigtxml.encode_igt(igt))
+
+    def test_access(self):
+        first_id = self.corpus.ids[0]
+        inst = self.corpus[first_id]
+        self.assertEqual(inst.id, first_id)
+        self.assertIs(self.corpus[0], inst)
+        self.assertIn(first_id, self.corpus)
+        self.assertNotIn('no-such-igt', self.corpus)
+
+        tail = self.corpus[1:]
+        self.assertEqual(len(tail), len(self.corpus) - 1)
+        self.assertEqual(tail[0].id, self.corpus.ids[1])
+        self.assertListEqual([inst.id for inst in tail], self.corpus.ids[1:])
+
+    def test_eviction(self):
+        corpus = IndexedCorpus(self.path, cache_bytes=1)
+        first = corpus[0]
+        corpus[1]
+        self.assertEqual(corpus._source.num_cached, 1)
+        self.assertIsNot(corpus[0], first)
+        self.assertEqual(corpus[0].id, first.id)
+        corpus.close()
+
+    def test_eviction_frees(self):
+        import gc, weakref
+        from intent2.symbols import SYMBOLS
+        num_symbols = len(SYMBOLS)
+        corpus = IndexedCorpus(self.path, cache_bytes=1)
+        gc.disable()
+        try:
+            first = weakref.ref(corpus[0])
+            corpus[1]
+            self.assertIsNone(first())
+        finally:
+            gc.enable()
+        self.assertEqual(len(SYMBOLS), num_symbols)
+        self.assertGreater(len(corpus.symbols), 0)
+        corpus.close()
@@ -0,0 +1,536 @@
+"""
+A compact binary snapshot of a corpus parsed into the INTENT2
+model, for reloading the same inputs far faster than they can be
+decoded from Xigt-XML and imported again.
+
+A snapshot holds the phrases, words and subwords of each instance
+(with their ids, segmentation symbols, POS tags and lemmas, and the
+spaCy analyses of translation words), the alignments between their
+tokens, and their dependency structures.
+It is laid out as:
+
+    * a header: the MAGIC bytes, the format version, and the
+      sizes of the sections that follow
+    * a string table: the length of each string, then the UTF-8
+      text of all of them, as one block
+    * the instances: one block of little-endian 32-bit ints, in which
+      strings are given by their position in the string table
+      (or NO_STRING for None)
+
+The string table and the instances are compressed together with zlib.
+
+Snapshots written with another SNAPSHOT_VERSION are refused
+(with a SnapshotVersionException), rather than misread.
+"""
+import hashlib
+import json
+import os
+import struct
+import sys
+import weakref
+import zlib
+from array import array
+from typing import Iterable, List
+
+from intent2.model import Instance, Corpus, Phrase, Word, LangWord, GlossWord, TransWord, SubWord, \
+    DependencyArray, DependencyStructure, DependencyLink, AlignmentGraph, TokenRecord, ROOT_HEAD
+from intent2.symbols import SymbolTable, SYMBOLS
+from intent2.utils.memory import gc_paused
+from intent2.utils.profiling import profile_stage
+
+import logging
+SNAPSHOT_LOG = logging.getLogger('snapshot')
+
+MAGIC = b'INTENT2S'
+SNAPSHOT_VERSION = 2
+
+# The header, following the magic bytes: the format version,
+# the number of strings, the length of the string text in bytes,
+# and the number of ints.
+HEADER = struct.Struct('<IIQQ')
+
+NO_STRING = -1
+
+# The word classes, by the code they are stored with.
+WORD_TYPES = [Word, LangWord, GlossWord, TransWord]
+WORD_TYPE_CODES = {word_type: code for code, word_type in enumerate(WORD_TYPES)}
+
+# How the dependencies of a phrase are stored.
+NO_DEPS = 0
+DEP_ARRAY = 1
+DEP_LINKS = 2
+
+
+class SnapshotException(Exception): pass
+class SnapshotVersionException(SnapshotException): pass
+
+
+# -------------------------------------------
+# Writing
+# -------------------------------------------
+class _SnapshotWriter(object):
+    def __init__(self):
+        self.strings = []  # type: List[str]
+        self.string_nums = {}
+        self.ints = array('i')
+
+    def string(self, s: str):
+        if s is None:
+            self.ints.append(NO_STRING)
+            return
+        num = self.string_nums.get(s)
+        if num is None:
+            num = self.string_nums[s] = len(self.strings)
+            self.strings.append(s)
+        self.ints.append(num)
+
+    def instance(self, inst: Instance):
+        ints, string = self.ints, self.string
+        string(inst.id)
+
+        phrases = (inst.lang, inst.gloss, inst.trans)
+        for phrase in phrases:
+            self.phrase(phrase)
+
+        # Number the tokens in the order the instance gives them,
+        # which is also the order they are added to a new instance's
+        # alignment graph.
+        token_nums = {}
+        for num, token in enumerate(inst.tokens()):
+            token_nums[id(token)] = num
+
+        edges = array('i')
+        for phrase in phrases:
+            for word in (phrase or []):
+                for token in [word] + word.subwords:
+                    graph = getattr(token, '_graph', None)
+                    if graph is None:
+                        continue
+                    src = token_nums[id(token)]
+                    for other in graph.neighbours(token):
+                        tgt = token_nums.get(id(other))
+                        if tgt is None:
+                            SNAPSHOT_LOG.warning('Not saving the alignment of "{}" to "{}", outside instance "{}".'.format(token, other, inst.id))
+                        elif src < tgt:
+                            edges.append(src)
+                            edges.append(tgt)
+        ints.append(len(edges) // 2)
+        ints.extend(edges)
+
+        for phrase in phrases:
+            if phrase is not None:
+                self.dependencies(phrase)
+
+    def phrase(self, phrase: Phrase):
+        ints, string = self.ints, self.string
+        if phrase is None:
+            ints.append(0)
+            return
+        ints.append(1)
+        string(phrase.id)
+        ints.append(int(hasattr(phrase, '_processed')))
+        ints.append(len(phrase))
+        for word in phrase:
+            ints.append(WORD_TYPE_CODES[type(word)])
+            string(word.id)
+            string(word.pos)
+            ints.append(len(word.subwords))
+            for sw in word.subwords:
+                string(sw.string)
+                string(sw.id)
+                string(sw.pos)
+                string(sw.left_symbol)
+                string(sw.right_symbol)
+                string(getattr(sw, '_lemma', None))
+            record = word.analysis
+            if record is None:
+                ints.append(0)
+            else:
+                ints.append(1)
+                string(record.pos)
+                string(record.tag)
+                string(record.lemma)
+                ints.append(record.head)
+                string(record.dep)
+                ints.append(record.vector_row)
+
+    def dependencies(self, phrase: Phrase):
+        ints, string = self.ints, self.string
+        da = phrase.dependency_array
+        ds = getattr(phrase, '_ds', None)
+        if da is not None:
+            ints.append(DEP_ARRAY)
+            ints.extend(da._heads)
+            for i in range(len(phrase)):
+                string(da.label(i))
+        elif ds is not None:
+            ints.append(DEP_LINKS)
+            ints.append(len(ds))
+            for link in ds:
+                ints.append(self._word_num(phrase, link.child))
+                ints.append(ROOT_HEAD if link.parent is None else self._word_num(phrase, link.parent))
+                string(link.type)
+        else:
+            ints.append(NO_DEPS)
+
+    @staticmethod
+    def _word_num(phrase: Phrase, word: Word) -> int:
+        if word.phrase is not phrase:
+            raise SnapshotException('Dependency link to word "{}", which is not in phrase "{}"'.format(word, phrase.id))
+        return word.index
+
+    def tobytes(self) -> bytes:
+        text = ''.join(self.strings).encode('utf-8')
+        lengths = array('I', [len(s) for s in self.strings])
+        ints = self.ints
+        if sys.byteorder == 'big':
+            lengths.byteswap()
+            ints = array('i', ints)
+            ints.byteswap()
+        body = zlib.compress(b''.join([lengths.tobytes(), text, ints.tobytes()]))
+        return b''.join([MAGIC, HEADER.pack(SNAPSHOT_VERSION, len(self.strings), len(text), len(ints)), body])
+
+
+def dumps_snapshot(corpus: Iterable[Instance]) -> bytes:
+    """
+    Return the snapshot of the instances as bytes.
+    """
+    writer = _SnapshotWriter()
+    insts = list(corpus)
+    writer.ints.append(len(insts))
+    for inst in insts:
+        writer.instance(inst)
+    return writer.tobytes()
+
+
+def save_snapshot(corpus: Iterable[Instance], path: str):
+    """
+    Write the snapshot of the instances to the file at path.
+    """
+    data = dumps_snapshot(corpus)
+    with open(path, 'wb') as snap_f:
+        snap_f.write(data)
+
+
+# -------------------------------------------
+# Reading
+# -------------------------------------------
+def loads_snapshot(data: bytes, symbols: SymbolTable = None) -> Corpus:
+    """
+    Rebuild the corpus held in a snapshot.
+
+    :param symbols: The table to intern the corpus's strings with.
+    """
+    symbols = SYMBOLS if symbols is None else symbols
+    if data[:len(MAGIC)] != MAGIC:
+        raise SnapshotException('Not an INTENT2 snapshot.')
+    pos = len(MAGIC)
+    version, num_strings, text_len, num_ints = HEADER.unpack_from(data, pos)
+    if version != SNAPSHOT_VERSION:
+        raise SnapshotVersionException('Snapshot is version {}, but this is version {}.'.format(version, SNAPSHOT_VERSION))
+    try:
+        data = zlib.decompress(data[len(MAGIC) + HEADER.size:])
+    except zlib.error as ze:
+        raise SnapshotException('Snapshot is corrupt: {}'.format(ze))
+
+    pos = 0
+    lengths = array('I')
+    lengths.frombytes(data[pos:pos + num_strings * lengths.itemsize])
+    pos += num_strings * lengths.itemsize
+    text = data[pos:pos + text_len].decode('utf-8')
+    pos += text_len
+    ints = array('i')
+    ints.frombytes(data[pos:pos + num_ints * ints.itemsize])
+    if sys.byteorder == 'big':
+        lengths.byteswap()
+        ints.byteswap()
+
+    strings = []
+    start = 0
+    intern = symbols.intern
+    for length in lengths:
+        strings.append(intern(text[start:start + length]))
+        start += length
+
+    # Looking strings up at position NO_STRING (-1)
+    # gives None.
+    strings.append(None)
+
+    # The instances are rebuilt with the cyclic garbage collector
+    # paused, as it would otherwise rescan the objects being
+    # created over and over.
+    ints = ints.tolist()
+    with gc_paused():
+        instances = []
+        pos = 1
+        for i in range(ints[0]):
+            inst, pos = _read_instance(ints, pos, strings, symbols)
+            instances.append(inst)
+    return Corpus(instances, symbols=symbols)
+
+
+def _read_phrase(ints: List[int], pos: int, strings: List[str], tokens: list):
+    """
+    Rebuild the phrase starting at pos, adding its words and
+    subwords to tokens (in the order of Instance.tokens).
+
+    The tokens are created without calling their constructors,
+    and given the attributes those would set, as this is most
+    of the time spent loading a snapshot.
+    """
+    if not ints[pos]:
+        return None, pos + 1
+    phrase = Phrase(id_=strings[ints[pos + 1]])
+    if ints[pos + 2]:
+        phrase._processed = True
+    num_words = ints[pos + 3]
+    pos += 4
+
+    new_subword = SubWord.__new__
+
+    # (The back-references are weak; see Word._phrase and SubWord._word.)
+    phrase_ref = weakref.ref(phrase)
+    words = []
+    for w_i in range(num_words):
+        WordType, word_id, word_pos, num_subwords = ints[pos:pos + 4]
+        word = Word.__new__(WORD_TYPES[WordType])
+        word._phrase_ref, word._index, word._id = phrase_ref, w_i, strings[word_id]
+        word._cached_hyphenated = word._cached_string = None
+        if word_pos != NO_STRING:
+            word._pos = strings[word_pos]
+        words.append(word)
+        tokens.append(word)
+        pos += 4
+
+        word_ref = weakref.ref(word)
+        subwords = []
+        for sw_i in range(num_subwords):
+            sw = new_subword(SubWord)
+            sw._string, sw._id = strings[ints[pos]], strings[ints[pos + 1]]
+            sw._left_symbol, sw._right_symbol = strings[ints[pos + 3]], strings[ints[pos + 4]]
+            sw._index, sw._address = sw_i, (w_i, sw_i)
+            sw._cached_parts = None
+            sw._word_ref = word_ref
+            if ints[pos + 2] != NO_STRING:
+                sw._pos = strings[ints[pos + 2]]
+            if ints[pos + 5] != NO_STRING:
+                sw._lemma = strings[ints[pos + 5]]
+            subwords.append(sw)
+            pos += 6
+        word._subwords = subwords
+        tokens.extend(subwords)
+
+        if ints[pos]:
+            tag_pos, tag, lemma, head, dep, vector_row = ints[pos + 1:pos + 7]
+            word._analysis = TokenRecord(strings[tag_pos], strings[tag], strings[lemma], head, strings[dep], vector_row)
+            pos += 7
+        else:
+            pos += 1
+
+    list.extend(phrase, words)
+    return phrase, pos
+
+
+def _read_dependencies(ints: List[int], pos: int, strings: List[str], phrase: Phrase, symbols: SymbolTable) -> int:
+    kind = ints[pos]
+    pos += 1
+    if kind == DEP_ARRAY:
+        num_words = len(phrase)
+        heads = ints[pos:pos + num_words]
+        labels = [symbols.id(strings[n]) for n in ints[pos + num_words:pos + 2 * num_words]]
+        phrase.dependency_array = DependencyArray(phrase, heads, labels, symbols=symbols)
+        pos += 2 * num_words
+    elif kind == DEP_LINKS:
+        links = []
+        num_links = ints[pos]
+        pos += 1
+        for link_i in range(num_links):
+            child, parent, link_type = ints[pos:pos + 3]
+            links.append(DependencyLink(child=phrase[child],
+                                        parent=None if parent == ROOT_HEAD else phrase[parent],
+                                        link_type=strings[link_type]))
+            pos += 3
+        phrase.dependency_structure = DependencyStructure(links)
+    elif kind != NO_DEPS:
+        raise SnapshotException('Unknown dependency format {}.'.format(kind))
+    return pos
+
+
+def _read_instance(ints: List[int], pos: int, strings: List[str], symbols: SymbolTable):
+    inst_id = strings[ints[pos]]
+    pos += 1
+    tokens = []
+    lang, pos = _read_phrase(ints, pos, strings, tokens)
+    gloss, pos = _read_phrase(ints, pos, strings, tokens)
+    trans, pos = _read_phrase(ints, pos, strings, tokens)
+
+    num_edges = ints[pos]
+    edge_ints = ints[pos + 1:pos + 1 + 2 * num_edges]
+    graph = AlignmentGraph.from_edges(tokens, zip(edge_ints[::2], edge_ints[1::2]))
+    pos += 1 + 2 * num_edges
+    inst = Instance(lang, gloss, trans, id=inst_id, alignment_graph=graph)
+
+    for phrase in (lang, gloss, trans):
+        if phrase is not None:
+            pos = _read_dependencies(ints, pos, strings, phrase, symbols)
+    return inst, pos
+
+
+def load_snapshot(path: str, symbols: SymbolTable = None) -> Corpus:
+    """
+    Load the corpus from the snapshot file at path.
+    """
+    with open(path, 'rb') as snap_f:
+        return loads_snapshot(snap_f.read(), symbols=symbols)
+
+
+# -------------------------------------------
+# Snapshots of Xigt-XML inputs
+# -------------------------------------------
+def snapshot_path(xigt_path: str, snapshot_dir: str, ignore_import_errors: bool = True) -> str:
+    """
+    The path in snapshot_dir for the snapshot of a Xigt-XML file,
+    imported with the given options.
+
+    The import options and the format version are part of the name,
+    so that a snapshot is only used by imports that would have
+    produced the same corpus.
+    """
+    key = json.dumps([os.path.abspath(xigt_path), SNAPSHOT_VERSION,
+                      {'ignore_import_errors': ignore_import_errors}])
+    key_hash = hashlib.sha1(key.encode('utf-8')).hexdigest()[:10]
+    return os.path.join(snapshot_dir, '{}.{}.snapshot'.format(os.path.basename(xigt_path), key_hash))
+
+
+def load_corpus(xigt_path: str, snapshot_dir: str = None,
+                ignore_import_errors: bool = True, symbols: SymbolTable = None) -> Corpus:
+    """
+    Load and import the corpus in a Xigt-XML file.
+
+    If snapshot_dir is given, the corpus is loaded from the snapshot
+    kept there, unless it is missing, older than the file, or from an
+    older version of the format, in which case the file is imported
+    and a new snapshot saved. (Imports with different options
+    keep separate snapshots.)
+    """
+    if snapshot_dir is not None:
+        snap_path = snapshot_path(xigt_path, snapshot_dir, ignore_import_errors=ignore_import_errors)
+        if os.path.exists(snap_path) and os.path.getmtime(snap_path) >= os.path.getmtime(xigt_path):
+            try:
+                with profile_stage('load'):
+                    corp = load_snapshot(snap_path, symbols=symbols)
+                SNAPSHOT_LOG.info('Loaded "{}" from snapshot "{}"'.format(xigt_path, snap_path))
+                return corp
+            except SnapshotException as se:
+                SNAPSHOT_LOG.warning('Not using snapshot "{}": {}'.format(snap_path, se))
+
+    from xigt.codecs import xigtxml
+    from intent2.serialize.importers import parse_xigt_corpus
+    with open(xigt_path, 'r') as xigt_f, profile_stage('load'):
+        xc = xigtxml.load(xigt_f)
+    with profile_stage('import'):
+        corp = parse_xigt_corpus(xc, ignore_import_errors=ignore_import_errors, symbols=symbols)
+
+    if snapshot_dir is not None:
+        os.makedirs(snapshot_dir, exist_ok=True)
+        SNAPSHOT_LOG.info('Saving snapshot of "{}" to "{}"'.format(xigt_path, snap_path))
+        with profile_stage('snapshot'):
+            save_snapshot(corp, snap_path)
+    return corp
+
+
+# -------------------------------------------
+# Test Cases
+# -------------------------------------------
+import tempfile
+from unittest import TestCase
+
+
+def _instance_state(inst: Instance):
+    """
+    The saved parts of an instance, for comparing instances.
+    """
+    def phrase_state(phrase):
+        if phrase is None:
+            return None
+        words = [(type(w).__name__, w.id, w.pos, w.analysis,
+                  [(sw.string, sw.id, sw.pos, sw.left_symbol, sw.right_symbol, getattr(sw, '_lemma', None))
+                   for sw in w.subwords])
+                 for w in phrase]
+        deps = None
+        if phrase.dependency_array is not None:
+            deps = ('array', list(phrase.dependency_array))
+        elif getattr(phrase, '_ds', None) is not None:
+            deps = ('links', sorted((l.child.index, -1 if l.parent is None else l.parent.index, l.type)
+                                    for l in phrase.dependency_structure))
+        return phrase.id, hasattr(phrase, '_processed'), words, deps
+
+    def token_key(token):
+        return token.id, type(token).__name__
+
+    alignments = sorted(tuple(sorted([token_key(a), token_key(b)]))
+                        for a, b in inst.alignment_graph.edges())
+    return inst.id, [phrase_state(p) for p in (inst.lang, inst.gloss, inst.trans)], alignments
+
+
+class SnapshotTests(TestCase):
+    def setUp(self):
+        from intent2.benchmarks.synthetic import generate_xigt_corpus
+        from intent2.serialize.importers import parse_xigt_corpus
+        self.corp = parse_xigt_corpus(generate_xigt_corpus(num_instances=20, seed=0))
+
+    def test_round_trip(self):
+        from intent2.benchmarks.synthetic import trans_analysis
+        from intent2.processing import assign_trans_analysis
+
+        # Give the instances translation analyses (with the
+        # dependencies in array form), alignments, and
+        # dependencies in link form.
+        for inst in self.corp:
+            assign_trans_analysis(inst, trans_analysis([w.string for w in inst.trans]))
+            for tw, gw in zip(inst.trans, inst.gloss):
+                tw.add_alignment(gw[-1])
+            inst.lang.dependency_structure = DependencyStructure(
+                [DependencyLink(inst.lang[1], inst.lang[0], 'nsubj'), DependencyLink(inst.lang[0], None, 'root')])
+
+        symbols = SymbolTable()
+        loaded = loads_snapshot(dumps_snapshot(self.corp), symbols=symbols)
+        self.assertIs(loaded.symbols, symbols)
+        self.assertEqual(len(loaded), len(self.corp))
+        for inst, loaded_inst in zip(self.corp, loaded):
+            self.assertEqual(_instance_state(loaded_inst), _instance_state(inst))
+            self.assertIs(loaded_inst.by_id(inst.gloss[0].id), loaded_inst.gloss[0])
+
+    def test_export(self):
+        from xigt.codecs.xigtxml import encode_igt
+        from intent2.serialize.exporters import instance_to_xigt
+        loaded = loads_snapshot(dumps_snapshot(self.corp))
+        for inst, loaded_inst in zip(self.corp, loaded):
+            self.assertEqual(encode_igt(instance_to_xigt(loaded_inst)), encode_igt(instance_to_xigt(inst)))
+
+    def test_version(self):
+        data = bytearray(dumps_snapshot(self.corp))
+        struct.pack_into('<I', data, len(MAGIC), SNAPSHOT_VERSION + 1)
+        self.assertRaises(SnapshotVersionException, loads_snapshot, bytes(data))
+        self.assertRaises(SnapshotException, loads_snapshot, b'<xigt-corpus/>')
+
+    def test_load_corpus(self):
+        from intent2.benchmarks.synthetic import generate_xigt_corpus
+        from xigt.codecs import xigtxml
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            xigt_path = os.path.join(tmp_dir, 'corpus.xml')
+            with open(xigt_path, 'w') as xigt_f:
+                xigtxml.dump(xigt_f, generate_xigt_corpus(num_instances=5, seed=1))
+            snap_dir = os.path.join(tmp_dir, 'snapshots')
+            imported = load_corpus(xigt_path, snap_dir)
+            self.assertTrue(os.path.exists(snapshot_path(xigt_path, snap_dir)))
+            loaded = load_corpus(xigt_path, snap_dir)
+            self.assertListEqual([_instance_state(i) for i in loaded],
+                                 [_instance_state(i) for i in imported])
+
+            # A snapshot is not used by imports with other options.
+            strict_path = snapshot_path(xigt_path, snap_dir, ignore_import_errors=False)
+            self.assertNotEqual(strict_path, snapshot_path(xigt_path, snap_dir))
+            self.assertFalse(os.path.exists(strict_path))
+            load_corpus(xigt_path, snap_dir, ignore_import_errors=False)
+            self.assertTrue(os.path.exists(strict_path))
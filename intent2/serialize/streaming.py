@@ -0,0 +1,57 @@
+"""
+Module for reading and writing Xigt-XML one instance at
+a time, so that large files can be processed without
+holding the whole corpus in memory.
+"""
+from typing import Iterator, TextIO
+
+from lxml import etree
+import xigt.codecs.xigtxml
+from xigt.model import Igt
+
+import logging
+STREAM_LOG = logging.getLogger('stream')
+
+
+def iterparse_igts(path: str) -> Iterator[Igt]:
+    """
+    Read the instances of a Xigt-XML file one at a time.
+
+    Each <igt> element is decoded into a Xigt instance and then
+    cleared from the parse tree, along with any elements preceding
+    it, so memory use does not grow with the size of the file.
+    """
+    for event, elem in etree.iterparse(path, events=('end',), tag='igt'):
+        igt_str = etree.tostring(elem, encoding='unicode')
+
+        # Free the element, and the (already cleared)
+        # elements preceding it.
+        elem.clear()
+        while elem.getprevious() is not None:
+            del elem.getparent()[0]
+
+        xc = xigt.codecs.xigtxml.loads('<xigt-corpus>{}</xigt-corpus>'.format(igt_str))
+        yield xc[0]
+
+
+class XigtStreamWriter(object):
+    """
+    Write Xigt instances to a Xigt-XML file as
+    they are produced.
+    """
+    def __init__(self, out_f: TextIO, indent=2):
+        self.out_f = out_f
+        self.indent = indent
+        self.count = 0
+
+    def __enter__(self):
+        self.out_f.write('<xigt-corpus>\n')
+        return self
+
+    def write(self, igt: Igt):
+        self.out_f.write(xigt.codecs.xigtxml.encode_igt(igt, indent=self.indent))
+        self.out_f.write('\n')
+        self.count += 1
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.out_f.write('</xigt-corpus>\n')
@@ -0,0 +1,116 @@
+"""
+A table of the strings that repeat throughout a corpus, such as
+POS tags, dependency labels, gloss grams, morphs, and token ids.
+
+Interning these through a SymbolTable means each distinct string
+is stored once, however many tokens carry it, and that equal
+values are the same object, so comparing them is a pointer
+comparison. Each symbol is also given a small integer id, for
+representations (like intent2.columnar) that store ids in place
+of the strings themselves.
+"""
+from typing import Iterator, List
+
+NO_SYMBOL = -1
+
+class SymbolTable(object):
+    def __init__(self, symbols: List[str] = None):
+        self._symbols = []  # type: List[str]
+        self._ids = {}
+        for symbol in (symbols or []):
+            self.id(symbol)
+
+    def id(self, symbol: str) -> int:
+        """
+        Return the id for the symbol, adding it if it is new.
+        None is given the id NO_SYMBOL.
+        """
+        if symbol is None:
+            return NO_SYMBOL
+        symbol_id = self._ids.get(symbol)
+        if symbol_id is None:
+            symbol_id = self._ids[symbol] = len(self._symbols)
+            self._symbols.append(symbol)
+        return symbol_id
+
+    def symbol(self, symbol_id: int) -> str:
+        """
+        Return the symbol for the given id.
+        """
+        return None if symbol_id == NO_SYMBOL else self._symbols[symbol_id]
+
+    def intern(self, symbol: str) -> str:
+        """
+        Return the table's copy of the symbol, adding it if it is new.
+        """
+        if symbol is None:
+            return None
+        return self._symbols[self.id(symbol)]
+
+    def intern_phrase(self, phrase):
+        """
+        Replace the ids, strings, and POS tags of the words
+        and subwords in the phrase with their interned copies.
+
+        :type phrase: intent2.model.Phrase
+        """
+        intern = self.intern
+        for word in phrase:
+            word.id = intern(word.id)
+            word.pos = intern(word.pos)
+            for subword in word.subwords:
+                subword.string = intern(subword.string)
+                subword.id = intern(subword.id)
+                subword.pos = intern(subword.pos)
+
+    def __contains__(self, symbol: str):
+        return symbol in self._ids
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._symbols)
+
+    def __len__(self):
+        return len(self._symbols)
+
+# The table used when none is given; shared by every
+# corpus loaded in the process.
+SYMBOLS = SymbolTable()
+
+
+# -------------------------------------------
+# Test Cases
+# -------------------------------------------
+from unittest import TestCase
+
+
+class SymbolTableTests(TestCase):
+    def test_ids(self):
+        symbols = SymbolTable(['NOUN', 'VERB'])
+        self.assertEqual(symbols.id('VERB'), 1)
+        self.assertEqual(symbols.id('ADJ'), 2)
+        self.assertEqual(symbols.id(None), NO_SYMBOL)
+        self.assertEqual(symbols.symbol(2), 'ADJ')
+        self.assertIsNone(symbols.symbol(NO_SYMBOL))
+        self.assertListEqual(list(symbols), ['NOUN', 'VERB', 'ADJ'])
+
+    def test_intern(self):
+        symbols = SymbolTable()
+        a = ''.join(['NO', 'UN'])
+        b = ''.join(['NOU', 'N'])
+        self.assertIsNot(a, b)
+        self.assertIs(symbols.intern(a), symbols.intern(b))
+        self.assertIsNone(symbols.intern(None))
+        self.assertEqual(len(symbols), 1)
+
+    def test_import(self):
+        from intent2.benchmarks.synthetic import generate_xigt_corpus
+        from intent2.serialize.importers import parse_xigt_corpus
+        symbols = SymbolTable()
+        corp = parse_xigt_corpus(generate_xigt_corpus(num_instances=20, seed=0), symbols=symbols)
+        self.assertIs(corp.symbols, symbols)
+        first_ids = [inst.gloss[0].id for inst in corp]
+        self.assertTrue(all(gw_id is first_ids[0] for gw_id in first_ids))
+        grams = {}
+        for inst in corp:
+            for sw in inst.gloss.subwords:
+                self.assertIs(grams.setdefault(sw.string, sw.string), sw.string)
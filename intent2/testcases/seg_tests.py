@@ -33,3 +33,89 @@ class IkxTest(TestCase):
         inst = parse_xigt_instance(self.inst)
         self.assertEqual(len(inst.lang), 3)
         self.assertEqual(inst.lang[2].string, 'm̀ʉkà')
+
+class SegmentIndexTests(TestCase):
+    def setUp(self):
+        from intent2.serialize.importers import test_case_one
+        self.inst = xigtxml.loads(test_case_one)[0] # type: Igt
+
+    def test_index(self):
+        from intent2.serialize.importers import segment_index
+        index = segment_index(self.inst['m'])
+        self.assertListEqual([(word_id, [m.id for m in morphs]) for word_id, morphs in index.items()],
+                             [('w1', ['m1']), ('w2', ['m2', 'm3']), ('w3', ['m4'])])
+
+    def test_missing_refs(self):
+        from intent2.serialize.importers import segment_index, SegmentationTierException
+        del self.inst['m']['m3'].attributes['segmentation']
+        self.assertRaises(SegmentationTierException, segment_index, self.inst['m'])
+
+    def test_import(self):
+        inst = parse_xigt_instance(self.inst)
+        self.assertListEqual([[sw.id for sw in w.subwords] for w in inst.lang], [['m1'], ['m2', 'm3'], ['m4']])
+        self.assertListEqual([gw.hyphenated for gw in inst.gloss], ['be.Md', '3.loc-first', 'Md.ad'])
+
+class XigtFindTests(TestCase):
+    def setUp(self):
+        from intent2.serialize.importers import test_case_one
+        self.inst = xigtxml.loads(test_case_one)[0] # type: Igt
+
+    def test_find(self):
+        from intent2.xigt_helpers import xigt_findall
+        self.assertIs(xigt_find(self.inst, id='m3'), self.inst['m']['m3'])
+        self.assertIs(xigt_find(self.inst, type='odin', attributes={'state': 'normalized'}), self.inst['n'])
+        self.assertIs(xigt_find(self.inst['n'], tag='G'), self.inst['n']['n2'])
+        self.assertListEqual([item.id for item in xigt_findall(self.inst, alignment='m2')], ['g2', 'pos2'])
+        self.assertListEqual([item.id for item in xigt_findall(self.inst['g'], alignment='m2')], ['g2'])
+        self.assertIsNone(xigt_find(self.inst['g'], id='pos2'))
+
+    def test_updates(self):
+        from xigt import Tier, Item
+        from intent2.xigt_helpers import xigt_findall
+        self.assertIsNone(xigt_find(self.inst, id='x1'))
+        self.inst.append(Tier(id='x', type='pos', alignment='w', items=[Item(id='x1', alignment='w2')]))
+        self.assertListEqual([t.id for t in xigt_findall(self.inst, type='pos')], ['pos', 'x'])
+        self.assertIs(xigt_find(self.inst, alignment='w2'), self.inst['x']['x1'])
+
+        self.inst['g'].append(Item(id='g5', alignment='m4'))
+        self.assertListEqual([item.id for item in xigt_findall(self.inst, alignment='m4')], ['g4', 'g5', 'pos4'])
+
+        # Changes made in place are seen by the next search.
+        self.inst['g']['g5'].alignment = 'm1'
+        self.assertListEqual([item.id for item in xigt_findall(self.inst, alignment='m1')], ['g1', 'g5', 'pos1'])
+
+        tier = self.inst['x']
+        tier.id = 'x_a'
+        self.assertIsNone(xigt_find(self.inst, id='x'))
+        self.assertIs(xigt_find(self.inst, id='x_a'), tier)
+        self.assertIsNone(xigt_find(self.inst, id='x_a', type='words'))
+
+class TierIdTests(TestCase):
+    def setUp(self):
+        from intent2.serialize.importers import test_case_one
+        self.inst = xigtxml.loads(test_case_one)[0] # type: Igt
+
+    def test_registry(self):
+        from xigt import Tier
+        from intent2.xigt_helpers import TierIdRegistry, generate_tier_id
+        registry = TierIdRegistry(self.inst)
+        self.assertEqual(registry.generate('pos', 'w'), generate_tier_id(self.inst, 'pos', 'w'))
+        registry.append(Tier(id=registry.generate('pos', 'w'), type='pos', alignment='w'))
+        self.assertEqual(registry.generate('pos', 'w'), generate_tier_id(self.inst, 'pos', 'w'))
+        self.assertEqual(registry.generate('pos', 'g'), 'g_pos')
+
+        # Tiers appended to the Igt directly are counted as well.
+        self.inst.append(Tier(id='t_g_aln', type='bilingual-alignments', attributes={'source': 't', 'target': 'g'}))
+        self.assertEqual(registry.generate('bilingual-alignments', 't', 'g'), 't_g_aln_b')
+
+    def test_export_context(self):
+        from intent2.serialize.exporters import ExportContext, xigt_add_all_pos, DATA_TIME_KEY
+        inst = parse_xigt_instance(self.inst)
+        for word in list(inst.lang) + list(inst.trans):
+            word.pos = 'NOUN'
+        igt = Igt(id=inst.id)
+        context = ExportContext(igt, timestamp='2017-01-01 00:00:00')
+        xigt_add_all_pos(inst, igt, 'test', context=context)
+        xigt_add_all_pos(inst, igt, 'test', context=context)
+        self.assertListEqual([tier.id for tier in igt], ['w_pos', 'tw_pos', 'w_pos_b', 'tw_pos_b'])
+        self.assertTrue(all(tier.attributes[DATA_TIME_KEY] == context.timestamp for tier in igt))
@@ -0,0 +1,32 @@
+from unittest import TestCase
+from io import StringIO
+import os
+
+my_dir = os.path.dirname(__file__)
+seg_tests_path = os.path.join(my_dir, 'seg_tests.xml')
+
+from xigt.codecs import xigtxml
+
+from intent2.serialize.streaming import iterparse_igts, XigtStreamWriter
+
+# -------------------------------------------
+# TestCases
+# -------------------------------------------
+class StreamingTests(TestCase):
+    def test_iterparse(self):
+        with open(seg_tests_path, 'r') as seg_tests_f:
+            xc = xigtxml.load(seg_tests_f)
+
+        igts = list(iterparse_igts(seg_tests_path))
+        self.assertListEqual([igt.id for igt in igts], [igt.id for igt in xc])
+        self.assertListEqual([len(igt) for igt in igts], [len(igt) for igt in xc])
+
+    def test_roundtrip(self):
+        out_f = StringIO()
+        with XigtStreamWriter(out_f) as writer:
+            for igt in iterparse_igts(seg_tests_path):
+                writer.write(igt)
+
+        xc = xigtxml.loads(out_f.getvalue())
+        self.assertEqual(writer.count, 2)
+        self.assertListEqual([igt.id for igt in xc], ['esu-58', 'ikx-2'])
@@ -0,0 +1,72 @@
+"""
+Helpers for measuring the memory use of the
+running process, and for managing the garbage
+collector.
+"""
+import gc
+import os
+import resource
+import sys
+from contextlib import contextmanager
+
+
+def current_rss() -> int:
+    """
+    Return the current resident set size of this process, in bytes.
+
+    On platforms without /proc, fall back to the peak RSS.
+    """
+    try:
+        with open('/proc/self/statm', 'r') as statm_f:
+            return int(statm_f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        return peak_rss()
+
+
+def peak_rss() -> int:
+    """
+    Return the peak resident set size of this process, in bytes.
+    """
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is given in bytes on macOS, but in kilobytes elsewhere.
+    return maxrss if sys.platform == 'darwin' else maxrss * 1024
+
+
+def format_bytes(num_bytes: int) -> str:
+    """
+    Format a number of bytes in human-readable units.
+    """
+    size = float(num_bytes)
+    for unit in ['B', 'KB', 'MB']:
+        if abs(size) < 1024:
+            return '{:.1f}{}'.format(size, unit)
+        size /= 1024
+    return '{:.1f}GB'.format(size)
+
+
+@contextmanager
+def gc_paused():
+    """
+    Pause the cyclic garbage collector within the block, and
+    restore its previous state afterwards.
+
+    While many long-lived objects are being created (as when a
+    corpus is loaded), each collection only rescans the objects
+    created so far, without finding anything to free.
+
+    Afterwards, the objects created are moved straight to the oldest
+    generation (by freezing and unfreezing them), so that the first
+    collection once the collector is running again does not have to
+    scan them all either. This is skipped if objects have been frozen
+    with gc.freeze() elsewhere, as unfreezing would undo that.
+    """
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if gc.get_freeze_count() == 0:
+            gc.freeze()
+            gc.unfreeze()
+        if gc_enabled:
+            gc.enable()
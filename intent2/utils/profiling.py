@@ -0,0 +1,164 @@
+"""
+Per-stage profiling of the INTENT2 pipeline.
+
+Each stage of the pipeline is wrapped with profile_stage(name).
+Once profiling has been turned on with start_profiling(), each
+stage is recorded by its own profiler, and finish_profiling() writes
+one .pstats file per stage. Otherwise, profile_stage() does nothing.
+"""
+import cProfile
+import os
+import pstats
+import time
+from collections import OrderedDict
+from contextlib import contextmanager, nullcontext
+
+import logging
+PROFILE_LOG = logging.getLogger('profile')
+
+
+class StageProfiler(object):
+    """
+    Keep a separate profile for each named stage.
+
+    Entering the same stage again adds to its existing
+    profile. When stages are nested, the outer stage is paused
+    while the inner one runs, so each function call is only
+    counted toward the innermost stage.
+    """
+    def __init__(self, out_dir: str):
+        self.out_dir = out_dir
+        self.profiles = OrderedDict()
+        self.times = OrderedDict()
+        self._stack = []
+
+    def _pause(self):
+        name, prof, start = self._stack[-1]
+        prof.disable()
+        self.times[name] += time.perf_counter() - start
+
+    def _resume(self):
+        name, prof, start = self._stack[-1]
+        self._stack[-1] = (name, prof, time.perf_counter())
+        prof.enable()
+
+    @contextmanager
+    def stage(self, name: str):
+        if self._stack:
+            self._pause()
+
+        if name not in self.profiles:
+            self.profiles[name] = cProfile.Profile()
+            self.times[name] = 0.0
+
+        self._stack.append((name, self.profiles[name], None))
+        self._resume()
+        try:
+            yield
+        finally:
+            self._pause()
+            self._stack.pop()
+            if self._stack:
+                self._resume()
+
+    def dump(self):
+        """
+        Write each stage's profile to "<out_dir>/<stage>.pstats"
+        """
+        os.makedirs(self.out_dir, exist_ok=True)
+        for name, prof in self.profiles.items():
+            prof.dump_stats(os.path.join(self.out_dir, '{}.pstats'.format(name)))
+
+    def summary(self, top: int = 10) -> str:
+        """
+        Return a table of the functions with the highest
+        cumulative time in each stage.
+        """
+        ret_str = ''
+        row_format = '{:>10} {:>10} {:>10}  {}\n'
+        for name, prof in self.profiles.items():
+            stats = pstats.Stats(prof)
+            ret_str += '=== Stage "{}": {:.3f}s ({} calls) ===\n'.format(name, self.times[name], stats.total_calls)
+            ret_str += row_format.format('cumtime', 'tottime', 'ncalls', 'function')
+
+            rows = sorted(stats.stats.items(), key=lambda item: item[1][3], reverse=True)
+            for func, (cc, nc, tt, ct, callers) in rows[:top]:
+                ret_str += row_format.format('{:.3f}'.format(ct), '{:.3f}'.format(tt), nc,
+                                             pstats.func_std_string(func))
+            ret_str += '\n'
+        return ret_str
+
+
+# -------------------------------------------
+# The profiler for the current run, if
+# profiling has been enabled.
+# -------------------------------------------
+PROFILER = None  # type: StageProfiler
+
+
+def start_profiling(out_dir: str) -> StageProfiler:
+    global PROFILER
+    PROFILE_LOG.info('Profiling pipeline stages into "{}"'.format(out_dir))
+    PROFILER = StageProfiler(out_dir)
+    return PROFILER
+
+
+def profile_stage(name: str):
+    """
+    Return a context in which the named stage is profiled,
+    if profiling is enabled.
+    """
+    if PROFILER is None:
+        return nullcontext()
+    return PROFILER.stage(name)
+
+
+def finish_profiling(top: int = 10) -> str:
+    """
+    Write out the per-stage profiles, stop profiling,
+    and return the summary table.
+    """
+    global PROFILER
+    if PROFILER is None:
+        return ''
+    PROFILER.dump()
+    summary = PROFILER.summary(top=top)
+    PROFILER = None
+    return summary
+
+
+# -------------------------------------------
+# Test Cases
+# -------------------------------------------
+import tempfile
+from unittest import TestCase
+
+
+def _inner_work():
+    return sorted(range(1000), reverse=True)
+
+
+class StageProfilerTests(TestCase):
+    def test_nested_stages(self):
+        with tempfile.TemporaryDirectory() as out_dir:
+            start_profiling(out_dir)
+            for i in range(3):
+                with profile_stage('outer'):
+                    with profile_stage('inner'):
+                        _inner_work()
+            summary = finish_profiling()
+
+            self.assertSetEqual(set(os.listdir(out_dir)), {'outer.pstats', 'inner.pstats'})
+
+            # The inner work should only be counted in the inner stage.
+            inner_stats = pstats.Stats(os.path.join(out_dir, 'inner.pstats'))
+            outer_stats = pstats.Stats(os.path.join(out_dir, 'outer.pstats'))
+            self.assertTrue(any(func[2] == '_inner_work' for func in inner_stats.stats))
+            self.assertFalse(any(func[2] == '_inner_work' for func in outer_stats.stats))
+            self.assertIn('_inner_work', summary)
+
+    def test_disabled(self):
+        self.assertIsNone(PROFILER)
+        with profile_stage('unused'):
+            _inner_work()
+        self.assertEqual(finish_profiling(), '')
@@ -0,0 +1,289 @@
+"""
+A table of the word vectors used throughout a corpus, such as those
+of translation tokens and gloss parts, as one float32 matrix.
+
+Each distinct string is given a single row, however many tokens carry
+it, and tokens keep just the number of their row (see Word.vector_row).
+Keeping the vectors in one matrix means the similarities between many
+of them can be computed with a single matrix product (see
+VectorTable.similarities).
+
+A table can be saved, and loaded again memory-mapped, so that worker
+processes share one read-only copy of it. Vectors added to a loaded
+table are kept in memory, apart from the mapped rows.
+"""
+from typing import Dict, Iterable, List
+
+import numpy as np
+
+NO_VECTOR_ROW = -1
+
+# The dtype of the vectors in a table.
+VECTOR_DTYPE = np.float32
+
+class VectorException(Exception): pass
+
+
+class VectorTable(object):
+    def __init__(self, width: int = None):
+        """
+        :param width: The number of dimensions of the vectors. If not
+                      given, it is taken from the first vector added.
+        """
+        self.width = width
+        self._rows = {}  # type: Dict[str, int]
+        self._strings = []  # type: List[str]
+
+        # The rows loaded from a file (possibly memory-mapped), and
+        # those added since, which are grown as needed.
+        self._base = None  # type: np.ndarray
+        self._extra = None  # type: np.ndarray
+        self._num_extra = 0
+
+    def __len__(self):
+        return len(self._strings)
+
+    def __contains__(self, string: str):
+        return string in self._rows
+
+    @property
+    def strings(self) -> List[str]:
+        return self._strings
+
+    def _num_base(self) -> int:
+        return 0 if self._base is None else len(self._base)
+
+    def row(self, string: str) -> int:
+        """
+        Return the row of the string's vector, or NO_VECTOR_ROW.
+        """
+        return self._rows.get(string, NO_VECTOR_ROW)
+
+    def vector(self, row: int):
+        """
+        Return the vector at the given row (as a read-only view
+        of the table), or None for NO_VECTOR_ROW.
+
+        :rtype: np.ndarray
+        """
+        if row == NO_VECTOR_ROW:
+            return None
+        num_base = self._num_base()
+        if row < num_base:
+            vector = self._base[row]
+        elif row < len(self):
+            vector = self._extra[row - num_base]
+        else:
+            raise IndexError('No vector at row {}'.format(row))
+        vector = vector.view()
+        vector.flags.writeable = False
+        return vector
+
+    @property
+    def matrix(self) -> np.ndarray:
+        """
+        All of the vectors, one row each. (If vectors have been
+        added to a loaded table, this is a copy.)
+        """
+        num_base = self._num_base()
+        if not self._num_extra:
+            return self._base if num_base else np.empty((0, self.width or 0), dtype=VECTOR_DTYPE)
+        extra = self._extra[:self._num_extra]
+        return np.concatenate([self._base, extra]) if num_base else extra
+
+    def _reserve(self, num_new: int):
+        """
+        Make room for num_new more rows among the added rows,
+        doubling their capacity when it runs out.
+        """
+        needed = self._num_extra + num_new
+        if self._extra is None or needed > len(self._extra):
+            capacity = max(needed, 2 * (0 if self._extra is None else len(self._extra)), 64)
+            extra = np.zeros((capacity, self.width), dtype=VECTOR_DTYPE)
+            if self._num_extra:
+                extra[:self._num_extra] = self._extra[:self._num_extra]
+            self._extra = extra
+
+    def add(self, string: str, vector) -> int:
+        """
+        Add the vector for the string, if the string has none yet,
+        and return its row.
+        """
+        return self.add_rows([string], np.asarray(vector).reshape(1, -1), [0])[0]
+
+    def add_rows(self, strings: Iterable[str], source, source_rows: Iterable[int]) -> List[int]:
+        """
+        Add the vectors for any of the strings not yet in the table,
+        copying them from the given rows of a source matrix (such as the
+        vectors of a spaCy vocabulary) in a single batch, and return
+        the row of each string. Strings whose source row is
+        NO_VECTOR_ROW are not added.
+        """
+        strings, source_rows = list(strings), list(source_rows)
+        rows = [self._rows.get(s, NO_VECTOR_ROW) for s in strings]
+
+        # The strings to add, each only once.
+        new = {}  # type: Dict[str, int]
+        for string, row, source_row in zip(strings, rows, source_rows):
+            if row == NO_VECTOR_ROW and source_row != NO_VECTOR_ROW and string not in new:
+                new[string] = source_row
+
+        if new:
+            source = np.asarray(source)
+            if self.width is None:
+                self.width = source.shape[1]
+            elif source.shape[1] != self.width:
+                raise VectorException('Vectors of width {} cannot be added to a table of width {}.'.format(
+                    source.shape[1], self.width))
+
+            self._reserve(len(new))
+            start = self._num_extra
+            self._extra[start:start + len(new)] = source[list(new.values())]
+            self._num_extra += len(new)
+
+            for string in new:
+                self._rows[string] = len(self._strings)
+                self._strings.append(string)
+            rows = [self._rows.get(s, NO_VECTOR_ROW) for s in strings]
+        return rows
+
+    def add_from_vocab(self, strings: Iterable[str], vocab) -> List[int]:
+        """
+        Add the vectors of any of the strings not yet in the table
+        from a spaCy vocabulary, and return the row of each string.
+        Strings the vocabulary has no vector for are not added.
+
+        :type vocab: spacy.vocab.Vocab
+        """
+        strings = list(strings)
+        vectors = vocab.vectors
+        if not vectors.size or getattr(vectors, 'mode', 'default') != 'default':
+            return [self.row(s) for s in strings]
+
+        missing = [s for s in strings if s not in self._rows]
+        source_rows = {}
+        if missing:
+            keys = [vocab.strings[s] for s in missing]
+            source_rows = dict(zip(missing, (int(r) for r in vectors.find(keys=keys))))
+        return self.add_rows(strings, vectors.data, [source_rows.get(s, NO_VECTOR_ROW) for s in strings])
+
+    def _gather(self, rows: List[int]) -> np.ndarray:
+        """
+        Return the vectors at the given rows, as one matrix, with
+        rows of zeros for NO_VECTOR_ROW.
+        """
+        rows = np.asarray(rows, dtype=np.int64)
+        gathered = np.zeros((len(rows), self.width or 0), dtype=VECTOR_DTYPE)
+        num_base = self._num_base()
+        in_base = (rows >= 0) & (rows < num_base)
+        in_extra = rows >= num_base
+        if in_base.any():
+            gathered[in_base] = self._base[rows[in_base]]
+        if in_extra.any():
+            gathered[in_extra] = self._extra[rows[in_extra] - num_base]
+        return gathered
+
+    def similarities(self, rows_a: List[int], rows_b: List[int]) -> np.ndarray:
+        """
+        Return the cosine similarity of the vector at each of
+        rows_a with the vector at each of rows_b, as a matrix,
+        computed in a single product. Similarities involving
+        NO_VECTOR_ROW (or a vector of zeros) are 0.
+        """
+        a, b = self._gather(rows_a), self._gather(rows_b)
+        for vectors in (a, b):
+            norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+            np.divide(vectors, norms, out=vectors, where=norms > 0)
+        return a @ b.T
+
+    # -------------------------------------------
+    # Saving and loading
+    # -------------------------------------------
+    def save(self, path: str):
+        """
+        Save the table to the given path (as a .npy file of the
+        vectors), with its strings in a "<path>.strings" file.
+        """
+        if any('\n' in s for s in self._strings):
+            raise VectorException('Strings with line breaks cannot be saved.')
+        with open(path, 'wb') as npy_f:
+            np.save(npy_f, self.matrix)
+        with open(path + '.strings', 'w', encoding='utf-8') as strings_f:
+            strings_f.write('\n'.join(self._strings))
+
+    def load(self, path: str, mmap: bool = False):
+        """
+        Replace the contents of the table with the table saved
+        at the given path.
+
+        :param mmap: Whether to memory-map the vectors, read-only, rather
+                     than read them into memory, so that processes loading
+                     the same table share one copy of it.
+        """
+        base = np.load(path, mmap_mode='r' if mmap else None)
+        with open(path + '.strings', 'r', encoding='utf-8') as strings_f:
+            text = strings_f.read()
+        strings = text.split('\n') if text else []
+        if len(strings) != len(base):
+            raise VectorException('"{}" holds {} vectors, but {} strings.'.format(path, len(base), len(strings)))
+
+        self.__init__(width=base.shape[1])
+        self._base = base
+        self._strings = strings
+        self._rows = {s: row for row, s in enumerate(strings)}
+
+    def __repr__(self):
+        return '<VectorTable of {} vectors of width {}>'.format(len(self), self.width)
+
+# The table used when none is given; shared by every
+# corpus loaded in the process.
+VECTORS = VectorTable()
+
+
+# -------------------------------------------
+# Test Cases
+# -------------------------------------------
+import os
+import tempfile
+from unittest import TestCase
+
+
+class VectorTableTests(TestCase):
+    def setUp(self):
+        self.table = VectorTable()
+        self.source = np.array([[1, 0], [0, 2], [3, 3]], dtype=VECTOR_DTYPE)
+
+    def test_dedup(self):
+        rows = self.table.add_rows(['dog', 'hill', 'dog', 'cat'], self.source, [0, 1, 0, NO_VECTOR_ROW])
+        self.assertListEqual(rows, [0, 1, 0, NO_VECTOR_ROW])
+        self.assertEqual(len(self.table), 2)
+        self.assertEqual(self.table.add('hill', [5, 5]), 1)
+        self.assertListEqual(self.table.vector(1).tolist(), [0, 2])
+        self.assertIsNone(self.table.vector(NO_VECTOR_ROW))
+        self.assertEqual(self.table.matrix.dtype, VECTOR_DTYPE)
+
+    def test_similarities(self):
+        self.table.add_rows(['dog', 'hill', 'mountain'], self.source, [0, 1, 2])
+        sims = self.table.similarities([0, 2, NO_VECTOR_ROW], [0, 1])
+        self.assertEqual(sims.shape, (3, 2))
+        self.assertAlmostEqual(sims[0, 0], 1.0, places=5)
+        self.assertAlmostEqual(sims[0, 1], 0.0, places=5)
+        self.assertAlmostEqual(sims[1, 1], 2 ** -0.5, places=5)
+        self.assertListEqual(sims[2].tolist(), [0, 0])
+
+    def test_save_load(self):
+        self.table.add_rows(['dog', 'hill'], self.source, [0, 1])
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, 'vectors.npy')
+            self.table.save(path)
+
+            loaded = VectorTable()
+            loaded.load(path, mmap=True)
+            self.assertIsInstance(loaded.matrix, np.memmap)
+            self.assertListEqual(loaded.strings, ['dog', 'hill'])
+
+            # New vectors are kept apart from the mapped rows.
+            self.assertEqual(loaded.add('mountain', [3, 3]), 2)
+            self.assertListEqual(loaded.matrix.tolist(), [[1, 0], [0, 2], [3, 3]])
+            self.assertAlmostEqual(loaded.similarities([2], [1])[0, 0], 2 ** -0.5, places=5)
+            del loaded
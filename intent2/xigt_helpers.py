@@ -1,5 +1,7 @@
 import string
-from typing import List, Union, Sized
+from itertools import chain
+from collections import defaultdict, OrderedDict
+from typing import Dict, List, Union
 
 import xigt
 import re
@@ -81,6 +83,38 @@ def _build_filterlist(**kwargs):
 
     return filters
 
+def _scan_find(obj, filters: list):
+    if _find_in_self(obj, filters) is not None:
+        return obj
+    if isinstance(obj, xigt.mixins.XigtContainerMixin):
+        for child in obj:
+            found = _scan_find(child, filters)
+            if found is not None:
+                return found
+    return None
+
+def _scan_findall(obj, filters: list, found: list):
+    if _find_in_self(obj, filters) is not None:
+        found.append(obj)
+    if isinstance(obj, xigt.mixins.XigtContainerMixin):
+        for child in obj:
+            _scan_findall(child, filters, found)
+    return found
+
+def _igt_candidates(igt: xigt.Igt, kwargs: dict):
+    """
+    Yield the Igt, then each of its tiers followed by its items (the
+    order they are searched in), skipping those whose id or type differ
+    from the ones searched for without running the filters on them.
+    """
+    check_id, check_type = 'id' in kwargs, 'type' in kwargs
+    id_, type_ = kwargs.get('id'), kwargs.get('type')
+    for obj in chain([igt], *([tier] + tier.items for tier in igt)):
+        if (check_id and obj.id != id_) or (check_type and obj.type != type_):
+            continue
+        yield obj
+
+
 def xigt_find(obj: Union[xigt.Item, xigt.Tier, xigt.Igt, xigt.XigtCorpus],
               **kwargs) -> Union[xigt.Item, xigt.Tier, None]:
     """
@@ -96,60 +130,139 @@ def xigt_find(obj: Union[xigt.Item, xigt.Tier, xigt.Igt, xigt.XigtCorpus],
         * tag
         * others [function evaluate truth on searched items]
     """
-    found = _find_in_self(obj, _build_filterlist(**kwargs))
-    if found is not None:
-        return obj
+    filters = _build_filterlist(**kwargs)
+    assert len(filters) > 0, "Must have selected some attribute to filter."
 
-    # If we are working on a container object, iterate
-    # over its children.
-    elif isinstance(obj, xigt.mixins.XigtContainerMixin):
-        found = None
-        for child in obj:
-            found = xigt_find(child, **kwargs)
-            if found is not None:
-                break
-        return found
+    # Searches of an Igt by id or type compare those
+    # directly, before the rest of the filters.
+    if isinstance(obj, xigt.Igt) and ('id' in kwargs or 'type' in kwargs):
+        for candidate in _igt_candidates(obj, kwargs):
+            if _find_in_self(candidate, filters) is not None:
+                return candidate
+        return None
+
+    return _scan_find(obj, filters)
 
 def xigt_findall(obj: Union[xigt.Item, xigt.Tier, xigt.Igt, xigt.XigtCorpus],
                  **kwargs) -> List[Union[xigt.Item, xigt.Tier]]:
     """
     List-returning version of the xigt_find function.
     """
-    found = []
-    found_item = _find_in_self(obj, _build_filterlist(**kwargs))
-    if found_item is not None:
-        found = [found_item]
+    filters = _build_filterlist(**kwargs)
+    assert len(filters) > 0, "Must have selected some attribute to filter."
 
-    # If we are working on a container object, iterate over
-    # the children.
-    if isinstance(obj, xigt.mixins.XigtContainerMixin):
-        for child in obj:
-            found += xigt_findall(child, **kwargs)
+    if isinstance(obj, xigt.Igt) and ('id' in kwargs or 'type' in kwargs):
+        return [candidate for candidate in _igt_candidates(obj, kwargs)
+                if _find_in_self(candidate, filters) is not None]
 
+    return _scan_findall(obj, filters, [])
 
-    return found
+def ref_index(tier: xigt.Tier, *ref_types: str) -> Dict[str, List[xigt.Item]]:
+    """
+    Index the items of a tier by the ids they refer to, in a single
+    pass over the tier: map each referenced id to the items that refer
+    to it, in the order of the tier.
+
+    Each item's references are read from the first of ref_types it
+    has (e.g. xigt.consts.CONTENT, then xigt.consts.SEGMENTATION).
+    Items that have none of them are listed under None.
+    """
+    index = defaultdict(list)
+    for item in tier:
+        for ref_type in ref_types:
+            ref = item.attributes.get(ref_type)
+            if ref:
+                for ref_id in OrderedDict.fromkeys(xigt.ref.ids(ref)):
+                    index[ref_id].append(item)
+                break
+        else:
+            index[None].append(item)
+    return index
 
-def unique_id_str(id_base: str, existing_tiers: Sized):
-    if not existing_tiers:
+def unique_id_str(id_base: str, num_existing: int):
+    if not num_existing:
         return id_base
     else:
-        return id_base + '_{}'.format(string.ascii_letters[len(existing_tiers)])
+        return id_base + '_{}'.format(string.ascii_letters[num_existing])
+
+
+class TierIdRegistry(object):
+    """
+    The annotation tiers of an Igt, counted by their type and the
+    tier(s) they annotate, so that new tiers can be given unique
+    ids without searching the Igt.
+
+    Tiers added through the registry are counted as they are added;
+    if the Igt's tiers have otherwise been added or removed, they
+    are counted again.
+    """
+    # The base of the ids of each type of tier, given the
+    # tier(s) it annotates.
+    ID_BASES = {'bilingual-alignments': '{}_{}_aln',
+                'pos': '{}_pos',
+                'dependencies': '{}_ds'}
+
+    def __init__(self, igt: xigt.Igt):
+        self.igt = igt
+        self._counts = defaultdict(int)  # type: Dict[tuple, int]
+        self._num_counted = 0
+        self._count_tiers()
+
+    @staticmethod
+    def tier_key(tier: xigt.Tier) -> Union[tuple, None]:
+        """
+        Return the (type, annotated, annotated) key of the
+        tier, or None if it is not an annotation tier.
+        """
+        attributes = tier.attributes
+        if tier.type == 'bilingual-alignments':
+            return tier.type, attributes.get('source'), attributes.get('target')
+        elif tier.type == 'pos':
+            return tier.type, attributes.get(xigt.consts.ALIGNMENT), None
+        elif tier.type == 'dependencies':
+            return tier.type, attributes.get('dep'), None
+        return None
+
+    def _count_tiers(self):
+        self._counts.clear()
+        for tier in self.igt:
+            key = self.tier_key(tier)
+            if key is not None:
+                self._counts[key] += 1
+        self._num_counted = len(self.igt)
+
+    def generate(self, tier_type: str, tier_annotating_1: str, tier_annotating_2: str = None) -> str:
+        """
+        Return a unique id for a new tier of the given type,
+        annotating the given tier(s).
+        """
+        if tier_type not in self.ID_BASES:
+            raise Exception('Not implemented')
+        if len(self.igt) != self._num_counted:
+            self._count_tiers()
+        id_base = self.ID_BASES[tier_type].format(tier_annotating_1, tier_annotating_2)
+        return unique_id_str(id_base, self._counts[(tier_type, tier_annotating_1, tier_annotating_2)])
+
+    def append(self, tier: xigt.Tier):
+        """
+        Append the tier to the Igt, and count it.
+        """
+        if len(self.igt) != self._num_counted:
+            self._count_tiers()
+        self.igt.append(tier)
+        key = self.tier_key(tier)
+        if key is not None:
+            self._counts[key] += 1
+        self._num_counted += 1
+
 
 def generate_tier_id(inst: xigt.Igt, tier_type: str,
                      tier_annotating_1: str, tier_annotating_2: str=None) -> str:
     """
     Given an instance, and some information about the tier type
     and what other tier(s) it is annotating, return a unique id.
+
+    (To give ids to several tiers of the same instance,
+    use a TierIdRegistry.)
     """
-    if tier_type == 'bilingual-alignments':
-        existing_tiers = xigt_findall(inst, type=tier_type, attributes={'source':tier_annotating_1,
-                                                                        'target':tier_annotating_2})
-        return unique_id_str('{}_{}_aln'.format(tier_annotating_1, tier_annotating_2), existing_tiers)
-    elif tier_type == 'pos':
-        existing_tiers = xigt_findall(inst, type=tier_type, alignment=tier_annotating_1)
-        return unique_id_str('{}_pos'.format(tier_annotating_1), existing_tiers)
-    elif tier_type == 'dependencies':
-        existing_tiers = xigt_findall(inst, type=tier_type, attributes={'dep':tier_annotating_1})
-        return unique_id_str('{}_ds'.format(tier_annotating_1), existing_tiers)
-    else:
-        raise Exception('Not implemented')
\ No newline at end of file
+    return TierIdRegistry(inst).generate(tier_type, tier_annotating_1, tier_annotating_2)
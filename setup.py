@@ -9,5 +9,6 @@ setup(
              'scripts/merge-xigt',
              'scripts/intent-train-classifier',
              'scripts/intent-filter',
-             'scripts/intent-eval-pos']
+             'scripts/intent-eval-pos',
+             'scripts/intent-benchmark']
 )